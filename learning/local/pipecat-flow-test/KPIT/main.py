@@ -8,7 +8,13 @@ Run the example:
 uv run hello_world.py
 """
 
+import asyncio
 import os
+import sys
+from pathlib import Path
+
+# Shared helpers (utils/) live at the pipecat-flow-test workspace root.
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 import aiohttp
 from dotenv import load_dotenv
 from loguru import logger
@@ -16,18 +22,25 @@ from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
-from pipecat.processors.aggregators.llm_context import LLMContext
-from pipecat.processors.aggregators.llm_response_universal import LLMContextAggregatorPair
 from pipecat.runner.types import RunnerArguments
 from pipecat.runner.utils import create_transport
 from pipecat.services.cartesia.stt import CartesiaSTTService
 from pipecat.services.cartesia.tts import CartesiaTTSService
-from pipecat.services.google.llm import GoogleLLMService
 from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.daily.transport import DailyParams
 from pipecat.transports.websocket.fastapi import FastAPIWebsocketParams
 from pipecat.utils.text.markdown_text_filter import MarkdownTextFilter
 from pipecat.frames.frames import TTSSpeakFrame,TTSUpdateSettingsFrame
+from utils.admission import AdmissionRejected, admission, reject_connection
+from utils.hedged_llm import HedgedGoogleLLMService
+from utils.language_id import LanguageIdDeepgramSTTService, languages_from_env
+from utils.loop_watchdog import loop_watchdog
+from utils.output_pacing import OutputPacingMonitor
+from utils.pipeline_pool import PipelineTemplate, PipelineTemplatePool
+from utils.session_memory import SessionMemory
+from utils.sessions import Session, sessions
+from utils.telephony import telephony_audio_params, use_native_telephony_audio
+from utils.usage_accounting import SessionUsage, UsageBudget
 from pipecat.services.deepgram import DeepgramSTTService
 from cartesia import Cartesia
 from deepgram import LiveOptions
@@ -39,22 +52,29 @@ from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage,Huma
 
 load_dotenv()
 
-llm_temp  = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.6,
-    api_key=os.getenv('GEMINI_API_KEY')
-)
+# Clients shared by every call in this worker (see utils.sessions).
+def get_llm_temp() -> ChatGoogleGenerativeAI:
+    return sessions.shared("llm_temp", lambda: ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0.6,
+        api_key=os.getenv('GEMINI_API_KEY')
+    ))
 
+def get_cartesia_client() -> Cartesia:
+    return sessions.shared("cartesia_client", lambda: Cartesia(api_key=os.getenv('CARTESIA_API_KEY')))
 
-cartesia_client=Cartesia(api_key=os.getenv('CARTESIA_API_KEY'))
+def get_http_session() -> aiohttp.ClientSession:
+    return sessions.shared("http_session", aiohttp.ClientSession, close=lambda s: s.close())
 
-# Track when important message is playing
+# Track when important message is playing. One per session, registered on the
+# call's Session and shared with the flow functions through
+# flow_manager.state["message_state"].
 class MessageState:
+    __slots__ = ("is_important",)
+
     def __init__(self):
         self.is_important = False
 
-state = MessageState()
-
 
 from pipecat_flows import (
     FlowArgs,
@@ -64,16 +84,23 @@ from pipecat_flows import (
 )
 
 
-# Custom callback to decide when to mute
-async def custom_mute_logic(stt_filter: STTMuteFilter) -> bool:
-    return state.is_important  # Mute only when important
+def create_stt_mute_filter(state: MessageState) -> STTMuteFilter:
+    """Build a session's STT mute filter, muted while its important message plays.
 
-stt_mute_filter = STTMuteFilter(
-    config=STTMuteConfig(
-        strategies={STTMuteStrategy.CUSTOM},
-        should_mute_callback=custom_mute_logic
+    The filter only asks the callback when the bot starts or stops speaking and
+    checks its own cached flag for every other frame.
+    """
+
+    # Custom callback to decide when to mute
+    async def custom_mute_logic(stt_filter: STTMuteFilter) -> bool:
+        return state.is_important  # Mute only when important
+
+    return STTMuteFilter(
+        config=STTMuteConfig(
+            strategies={STTMuteStrategy.CUSTOM},
+            should_mute_callback=custom_mute_logic
+        )
     )
-)
 
 
 
@@ -92,6 +119,11 @@ live_options = LiveOptions(
 #    language=Language.MR,  # Marathi
 #)
 
+# Other languages callers may speak. Each gets its own Deepgram stream until the
+# first utterance shows which one it is (see utils.language_id); set
+# STT_CANDIDATE_LANGUAGES="" to transcribe Hindi only.
+candidate_languages = languages_from_env("STT_CANDIDATE_LANGUAGES", [Language.MR])
+
 #voice_clone_id ="4dc749cd-6668-4316-9779-fad3159b2eb8" #suhana
 
 async def send_email(args:FlowArgs,flow_manager:FlowManager)->tuple[str,NodeConfig]:
@@ -102,7 +134,7 @@ async def send_email(args:FlowArgs,flow_manager:FlowManager)->tuple[str,NodeConf
     }
 
     """
-    state.is_important=True
+    flow_manager.state["message_state"].is_important=True
     await flow_manager.task.queue_frame( 
       TTSSpeakFrame("Email sent to the requested user")
     )
@@ -133,12 +165,12 @@ async def send_telegram_voice(args:FlowArgs,flow_manager:FlowManager):
     from prompts import telegram_voice_tool_system_prompt
     system_prompt = SystemMessage(content=telegram_voice_tool_system_prompt)
 
-    response = llm_temp.invoke([system_prompt,HumanMessage(content=f"user_request is : {args['user_request']}")])
+    response = get_llm_temp().invoke([system_prompt,HumanMessage(content=f"user_request is : {args['user_request']}")])
 
     print(f'Response form llm : {response}')
 
     audio_data = bytearray()
-    audio_itr = cartesia_client.tts.bytes(
+    audio_itr = get_cartesia_client().tts.bytes(
         model_id="sonic-3",
         transcript=response.content,  # Fixed: use response.content
         voice={"mode": "id", "id": "d80254ad-227a-428e-a5c5-2f3dcd12206b"},
@@ -155,16 +187,15 @@ async def send_telegram_voice(args:FlowArgs,flow_manager:FlowManager):
         audio_data.extend(chunk)
 
     # Send to Telegram endpoint
-    async with aiohttp.ClientSession() as session:
-        try:
-            form = aiohttp.FormData()
-            form.add_field('audio', bytes(audio_data), filename='voice.wav', content_type='audio/wav')
-    
-            async with session.post('https://vaishnavi196.app.n8n.cloud/webhook-test/b590e6cb-eb54-454f-8ea0-7cd3a6e3f264', data=form) as resp:
-                result = await resp.json()
-                print(f'result from n8n : {result}')
-        except Exception as e:
-            print('ERROR sending generated audio over telegram : ',e)
+    try:
+        form = aiohttp.FormData()
+        form.add_field('audio', bytes(audio_data), filename='voice.wav', content_type='audio/wav')
+
+        async with get_http_session().post('https://vaishnavi196.app.n8n.cloud/webhook-test/b590e6cb-eb54-454f-8ea0-7cd3a6e3f264', data=form) as resp:
+            result = await resp.json()
+            print(f'result from n8n : {result}')
+    except Exception as e:
+        print('ERROR sending generated audio over telegram : ',e)
 
    #state.is_important=True
     await flow_manager.task.queue_frame( 
@@ -287,13 +318,14 @@ def create_node1()->NodeConfig:
         "functions": [send_email_tool,send_telegram_message_tool,send_telegram_voice_message_tool]
     }
 
-async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
+def create_template() -> PipelineTemplate:
     #stt = CartesiaSTTService(api_key=os.getenv("CARTESIA_API_KEY"))
     #stt = DeepgramSTTService(api_key=os.getenv("DEEPGRAM_API_KEY"))
 
-    stt = DeepgramSTTService(
+    stt = LanguageIdDeepgramSTTService(
         api_key=os.getenv("DEEPGRAM_API_KEY"),
         live_options=live_options,
+        candidates=candidate_languages,
     )
     tts = CartesiaTTSService(
         api_key=os.getenv("CARTESIA_API_KEY"),
@@ -302,11 +334,26 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
         text_filters=[MarkdownTextFilter()],
     )
 #    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-1.5-flash-8b")
-    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-2.0-flash-lite")
+    # Races gemini-2.0-flash when flash-lite's first token is late (see utils.hedged_llm).
+    llm = HedgedGoogleLLMService(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-2.0-flash-lite",
+        backup_model="gemini-2.0-flash",
+    )
+
+    return PipelineTemplate(stt=stt, llm=llm, tts=tts)
 
+# Services built ahead of time, so calls don't wait on them.
+templates = PipelineTemplatePool(create_template)
 
-    context = LLMContext()
-    context_aggregator = LLMContextAggregatorPair(context)
+async def run_bot(transport: BaseTransport, runner_args: RunnerArguments, session: Session):
+    template = await templates.acquire(session)
+    stt, llm, tts = template.stt, template.llm, template.tts
+    context_aggregator = template.context_aggregator
+
+    state = session.add("message_state", MessageState())
+    stt_mute_filter = session.add("stt_mute_filter", create_stt_mute_filter(state))
+    pacing = session.add("pacing", OutputPacingMonitor())
 
     pipeline = Pipeline(
         [
@@ -316,12 +363,24 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
             context_aggregator.user(),  # User responses
             llm,  # LLM
             tts,  # TTS
+            pacing.arrivals(),  # Bot audio queued for output
             transport.output(),  # Transport bot output
+            pacing.playout(),  # Bot audio played (pacing metrics)
             context_aggregator.assistant(),  # Assistant spoken responses
         ]
     )
 
-    task = PipelineTask(pipeline, params=PipelineParams(allow_interruptions=True))
+    task = PipelineTask(
+        pipeline,
+        params=PipelineParams(
+            allow_interruptions=True,
+            enable_metrics=True,
+            enable_usage_metrics=True,
+            **telephony_audio_params(transport),
+        ),
+    )
+    session.add("pipeline_task", task)
+    SessionMemory(session, task, pipeline, context=template.context, transport=transport)
 
     flow_manager = FlowManager(
         task=task,
@@ -329,6 +388,15 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
         context_aggregator=context_aggregator,
         transport=transport,
     )
+    SessionUsage(
+        session,
+        task,
+        flow_manager=flow_manager,
+        context=template.context,
+        llm=llm,
+        budget=UsageBudget.from_env(),
+    )
+    flow_manager.state["message_state"] = state
 
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
@@ -350,11 +418,24 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
 
 async def bot(runner_args: RunnerArguments):
     """Main bot entry point compatible with Pipecat Cloud."""
-    transport = await create_transport(runner_args, transport_params)
-    await run_bot(transport, runner_args)
+    loop_watchdog.start()
+    templates.start()
+    try:
+        async with admission.admit():
+            transport = await create_transport(runner_args, transport_params)
+            use_native_telephony_audio(transport)
+            async with sessions.open("kpit") as session:
+                await run_bot(transport, runner_args, session)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejecting call: {e}")
+        await reject_connection(runner_args)
 
 if __name__ == "__main__":
     from pipecat.runner.run import main
 
-    main()
+    try:
+        main()
+    finally:
+        # The runner's server has shut down: close the clients calls shared.
+        asyncio.run(sessions.close_shared())
 
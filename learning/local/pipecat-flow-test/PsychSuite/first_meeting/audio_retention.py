@@ -0,0 +1,268 @@
+"""Bounded rolling retention of call audio for PsychSuite sessions.
+
+PsychSuite promises that no raw audio is kept longer than 60 seconds, but
+session notes still need the most recent stretch of the conversation.
+``AudioRetentionProcessor`` keeps exactly that: the last ``window_secs`` of
+the call (user on the left channel, bot on the right) in two preallocated
+rings, so memory per call is fixed no matter how long the call runs.
+
+Nothing is written to disk unless asked. Queue a ``RetentionSpillFrame`` (or
+call ``spill()``) and the current window is copied out and encoded to FLAC or
+Opus on a background thread, off the event loop. Segments are raw audio too,
+so they're deleted ``segment_ttl_secs`` after they're spilled (60 seconds by
+default), and when the call ends, whichever comes first: whatever reads them
+(session notes) has to do it within that time.
+
+Place the processor right after ``transport.output()``, which forwards both the
+user's input audio and the bot audio it has just played::
+
+    pipeline = Pipeline([..., tts, transport.output(), audio_retention, ...])
+    ...
+    await task.queue_frame(RetentionSpillFrame(reason="handoff"))
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import av
+import numpy as np
+from loguru import logger
+from pipecat.audio.utils import create_stream_resampler
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    Frame,
+    InputAudioRawFrame,
+    OutputAudioRawFrame,
+    StartFrame,
+    SystemFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+RETENTION_WINDOW_SECS = 60
+
+# How long a spilled segment stays on disk.
+SEGMENT_TTL_SECS = 60
+
+# Container format and PyAV encoder for each supported spill codec.
+SPILL_CODECS = {
+    "flac": ("flac", "flac"),
+    "opus": ("ogg", "libopus"),
+}
+
+# One encoder thread for the whole process: spills are rare and the number of
+# threads shouldn't grow with the number of calls.
+_spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-spill")
+
+
+@dataclass
+class RetentionSpillFrame(SystemFrame):
+    """Ask ``AudioRetentionProcessor`` to write its current window to disk.
+
+    A system frame, so an interruption can't drop the request.
+
+    Parameters:
+        reason: Short tag added to the segment file name (e.g. "handoff").
+    """
+
+    reason: str = ""
+
+
+class _TrackRing:
+    """Fixed-size mono int16 ring holding the newest ``capacity`` samples."""
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._capacity = capacity
+        self.end = 0
+
+    def write(self, samples: np.ndarray):
+        count = len(samples)
+        if count > self._capacity:
+            self.end += count - self._capacity
+            samples = samples[-self._capacity :]
+            count = self._capacity
+        offset = self.end % self._capacity
+        head = min(count, self._capacity - offset)
+        self._data[offset : offset + head] = samples[:head]
+        self._data[: count - head] = samples[head:]
+        self.end += count
+
+    def pad_to(self, position: int):
+        """Advance to ``position`` with silence (the track was quiet meanwhile)."""
+        if position <= self.end:
+            return
+        count = min(position - self.end, self._capacity)
+        self.end = position - count
+        self.write(np.zeros(count, dtype=np.int16))
+
+    def copy_window(self, end: int, count: int) -> np.ndarray:
+        """Copy of the ``count`` samples before ``end``, zero-filled where not held."""
+        window = np.zeros(count, dtype=np.int16)
+        start = max(end - count, self.end - self._capacity, 0)
+        stop = min(end, self.end)
+        if stop <= start:
+            return window
+        offset = start % self._capacity
+        head = min(stop - start, self._capacity - offset)
+        tail = stop - start - head
+        dst = start - (end - count)
+        window[dst : dst + head] = self._data[offset : offset + head]
+        window[dst + head : dst + head + tail] = self._data[:tail]
+        return window
+
+
+class AudioRetentionProcessor(FrameProcessor):
+    """Keeps a rolling window of call audio and spills it to disk on request."""
+
+    def __init__(
+        self,
+        *,
+        window_secs: float = RETENTION_WINDOW_SECS,
+        spill_dir: str = "audio_spill",
+        codec: str = "flac",
+        session_id: Optional[str] = None,
+        segment_ttl_secs: float = SEGMENT_TTL_SECS,
+        **kwargs,
+    ):
+        """Initialize the processor.
+
+        Args:
+            window_secs: Seconds of audio kept in memory.
+            spill_dir: Directory segments are written to.
+            codec: "flac" or "opus".
+            session_id: Prefix for segment file names. Defaults to a random id.
+            segment_ttl_secs: Seconds a spilled segment is kept before it's
+                deleted. Segments still on disk are deleted when the call ends.
+            **kwargs: Additional arguments passed to FrameProcessor.
+        """
+        super().__init__(**kwargs)
+        if codec not in SPILL_CODECS:
+            raise ValueError(f"Unsupported spill codec {codec!r}, use one of {list(SPILL_CODECS)}")
+        self._window_secs = window_secs
+        self._spill_dir = spill_dir
+        self._codec = codec
+        self._session_id = session_id or uuid.uuid4().hex[:8]
+        self._segment_ttl_secs = segment_ttl_secs
+        self._expiries: Dict[str, asyncio.TimerHandle] = {}
+
+        self._sample_rate = 0
+        self._user: Optional[_TrackRing] = None
+        self._bot: Optional[_TrackRing] = None
+        self._bot_resampler = create_stream_resampler()
+        self._spill_count = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        """Record input/output audio and handle spill requests."""
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, StartFrame):
+            self._allocate(frame.audio_in_sample_rate)
+        elif isinstance(frame, InputAudioRawFrame) and self._user:
+            self._user.write(np.frombuffer(frame.audio, dtype=np.int16))
+        elif isinstance(frame, OutputAudioRawFrame) and self._bot:
+            await self._record_bot_audio(frame)
+        elif isinstance(frame, RetentionSpillFrame):
+            self.spill(frame.reason)
+        elif isinstance(frame, (EndFrame, CancelFrame)):
+            self._user = self._bot = None
+            self._delete_segments()
+
+        await self.push_frame(frame, direction)
+
+    def spill(self, reason: str = "") -> Optional[Future]:
+        """Write the current window to a compressed segment in the background.
+
+        Returns:
+            The background write's future, or None if there's no audio yet.
+        """
+        if self._user is None or self._user.end == 0:
+            return None
+
+        end = self._user.end
+        count = min(end, int(self._window_secs * self._sample_rate))
+        self._bot.pad_to(end)
+        stereo = np.column_stack(
+            (self._user.copy_window(end, count), self._bot.copy_window(end, count))
+        )
+
+        self._spill_count += 1
+        tag = f"-{reason}" if reason else ""
+        container_format, _ = SPILL_CODECS[self._codec]
+        path = os.path.join(
+            self._spill_dir, f"{self._session_id}-{self._spill_count:03d}{tag}.{container_format}"
+        )
+
+        future = _spill_executor.submit(self._write_segment, path, stereo, self._sample_rate)
+        future.add_done_callback(self._on_spill_done)
+        self._expiries[path] = asyncio.get_running_loop().call_later(
+            self._segment_ttl_secs, self._delete_segment, path
+        )
+        return future
+
+    def _delete_segment(self, path: str):
+        self._expiries.pop(path, None)
+        # On the spill thread, so it runs after the segment's write.
+        _spill_executor.submit(_remove, path)
+
+    def _delete_segments(self):
+        for path, expiry in list(self._expiries.items()):
+            expiry.cancel()
+            self._delete_segment(path)
+
+    def _allocate(self, sample_rate: int):
+        self._sample_rate = sample_rate
+        capacity = int(self._window_secs * sample_rate)
+        self._user = _TrackRing(capacity)
+        self._bot = _TrackRing(capacity)
+
+    async def _record_bot_audio(self, frame: OutputAudioRawFrame):
+        audio = await self._bot_resampler.resample(
+            frame.audio, frame.sample_rate, self._sample_rate
+        )
+        samples = np.frombuffer(audio, dtype=np.int16)
+        # Bot audio is played in real time alongside the user's input, so line
+        # it up with the user track before appending.
+        self._bot.pad_to(self._user.end - len(samples))
+        self._bot.write(samples)
+
+    def _write_segment(self, path: str, stereo: np.ndarray, sample_rate: int) -> str:
+        container_format, encoder = SPILL_CODECS[self._codec]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        start_time = time.perf_counter()
+
+        with av.open(path, "w", format=container_format) as container:
+            stream = container.add_stream(encoder, rate=sample_rate, layout="stereo")
+            audio_frame = av.AudioFrame.from_ndarray(
+                stereo.reshape(1, -1), format="s16", layout="stereo"
+            )
+            audio_frame.sample_rate = sample_rate
+            for packet in stream.encode(audio_frame):
+                container.mux(packet)
+            for packet in stream.encode(None):
+                container.mux(packet)
+
+        logger.debug(
+            f"{self}: wrote {len(stereo) / sample_rate:.1f}s of audio to {path} "
+            f"in {(time.perf_counter() - start_time) * 1000:.0f}ms"
+        )
+        return path
+
+    def _on_spill_done(self, future: Future):
+        if future.exception():
+            logger.error(f"{self}: failed to write audio segment: {future.exception()}")
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+        logger.debug(f"Deleted audio segment {path}")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Failed to delete audio segment {path}: {e}")
@@ -9,6 +9,11 @@ uv run hello_world.py
 """
 
 import os
+import sys
+from pathlib import Path
+
+# Shared helpers (utils/) live at the pipecat-flow-test workspace root.
+sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 from dotenv import load_dotenv
 from loguru import logger
@@ -16,18 +21,28 @@ from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
-from pipecat.processors.aggregators.llm_context import LLMContext
-from pipecat.processors.aggregators.llm_response_universal import LLMContextAggregatorPair
 from pipecat.runner.types import RunnerArguments
 from pipecat.runner.utils import create_transport
-from pipecat.services.cartesia.stt import CartesiaSTTService
 from pipecat.services.cartesia.tts import CartesiaTTSService
-from pipecat.services.google.llm import GoogleLLMService
 from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.daily.transport import DailyParams
 from pipecat.transports.websocket.fastapi import FastAPIWebsocketParams
 from pipecat.utils.text.markdown_text_filter import MarkdownTextFilter
 from pipecat.frames.frames import TTSSpeakFrame,TTSUpdateSettingsFrame
+from utils.admission import AdmissionRejected, admission, reject_connection
+from utils.handoff import hand_off
+from utils.hedged_llm import HedgedGoogleLLMService
+from utils.loop_watchdog import loop_watchdog
+from utils.output_pacing import OutputPacingMonitor
+from utils.pipeline_pool import PipelineTemplate, PipelineTemplatePool
+from utils.semantic_cache import SemanticCache
+from utils.session_memory import SessionMemory
+from utils.sessions import Session, sessions
+from utils.stt_prewarm import PrewarmedCartesiaSTTService
+from utils.telephony import telephony_audio_params, use_native_telephony_audio
+from utils.usage_accounting import SessionUsage, UsageBudget
+
+from audio_retention import AudioRetentionProcessor, RetentionSpillFrame
 
 from pipecat_flows import (
     FlowArgs,
@@ -97,22 +112,29 @@ async def transfer_control(args:FlowArgs,flow_manager:FlowManager)->tuple[str,No
     #current_node=flow_manager.state['current_node']
     
     next_node = args['next_node']  
+
+    # Keep the last minute of the call for the session notes before the persona
+    # changes, only where callers have consented to recording (AUDIO_SPILL_ON_HANDOFF=1).
+    if os.getenv("AUDIO_SPILL_ON_HANDOFF") == "1":
+        await flow_manager.task.queue_frame(RetentionSpillFrame(reason=f"handoff-{next_node}"))
     
+    # The next persona starts from notes on the call so far, written while this
+    # reply plays, rather than the whole transcript (see utils.handoff).
     if next_node == 'personalizer_bot':
         await flow_manager.task.queue_frame(
             TTSUpdateSettingsFrame({"voice": voice_ids['personalizer_bot'][gender_of_bots['personalizer_bot']]})
         )
-        return "done",create_personalizer_bot()
+        return "done",hand_off(flow_manager, create_personalizer_bot())
     elif next_node =='general_bot':
         await flow_manager.task.queue_frame(
             TTSUpdateSettingsFrame({"voice": voice_ids['general_bot'][gender_of_bots['general_bot']]})
         )
-        return "done",create_generalbot()
+        return "done",hand_off(flow_manager, create_generalbot())
     elif next_node=='pre_onboarding_bot':
         await flow_manager.task.queue_frame(
             TTSUpdateSettingsFrame({"voice": voice_ids['pre_onboarding_bot'][gender_of_bots['pre_onboarding_bot']]})
         )
-        return "done",create_pre_onboarding_bot()
+        return "done",hand_off(flow_manager, create_pre_onboarding_bot())
     else:
         return "invalid next_node name",None
 
@@ -128,7 +150,7 @@ def create_pre_onboarding_bot()->NodeConfig:
     from prompts import pre_onboarding_bot_system_prompt
     
     return {
-        "name": "initial",
+        "name": "pre_onboarding_bot",
         "role_messages": [
             {
                 "role": "system",
@@ -148,7 +170,7 @@ def create_personalizer_bot()->NodeConfig:
     from prompts import personalizer_bot_system_prompt
     
     return {
-        "name": "initial",
+        "name": "personalizer_bot",
         "role_messages": [
             {
                 "role": "system",
@@ -168,7 +190,7 @@ def create_generalbot()->NodeConfig:
     from prompts import general_bot_system_prompt
     
     return {
-        "name": "initial",
+        "name": "general_bot",
         "role_messages": [
             {
                 "role": "system",
@@ -184,33 +206,80 @@ def create_generalbot()->NodeConfig:
         "functions": [transfer_control_tool]
     }
 
-async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
-    stt = CartesiaSTTService(api_key=os.getenv("CARTESIA_API_KEY"))
+def create_template() -> PipelineTemplate:
+    stt = PrewarmedCartesiaSTTService(api_key=os.getenv("CARTESIA_API_KEY"))
     tts = CartesiaTTSService(
         api_key=os.getenv("CARTESIA_API_KEY"),
         voice_id=voice_ids["general_bot"][gender_of_bots['general_bot']],
         text_filters=[MarkdownTextFilter()],
     )
 #    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-1.5-flash-8b")
-    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-2.0-flash-lite")
+    # Races gemini-2.0-flash when flash-lite's first token is late (see utils.hedged_llm).
+    llm = HedgedGoogleLLMService(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-2.0-flash-lite",
+        backup_model="gemini-2.0-flash",
+    )
+
+    return PipelineTemplate(stt=stt, llm=llm, tts=tts)
 
+# Services built ahead of time, so calls don't wait on them.
+templates = PipelineTemplatePool(create_template)
 
-    context = LLMContext()
-    context_aggregator = LLMContextAggregatorPair(context)
+def create_faq_cache() -> SemanticCache:
+    # Only the general bot answers product FAQs; the other bots' turns are personal.
+    return SemanticCache(nodes={"general_bot"})
+
+async def run_bot(transport: BaseTransport, runner_args: RunnerArguments, session: Session):
+    template = await templates.acquire(session)
+    stt, llm, tts = template.stt, template.llm, template.tts
+    context_aggregator = template.context_aggregator
+
+    audio_retention = session.add(
+        "audio_retention",
+        AudioRetentionProcessor(
+            spill_dir=os.getenv("AUDIO_SPILL_DIR", "audio_spill"),
+            session_id=session.session_id,
+        ),
+    )
+
+    pacing = session.add("pacing", OutputPacingMonitor())
+
+    faq_cache = sessions.shared("faq_cache", create_faq_cache)
+    cache = session.add(
+        "faq_cache",
+        faq_cache.session(lambda: flow_manager.current_node, caller_state=lambda: flow_manager.state),
+    )
 
     pipeline = Pipeline(
         [
             transport.input(),  # Transport user input
             stt,  # STT
             context_aggregator.user(),  # User responses
+            cache.lookup(),  # Answers repeated FAQs from the cache
             llm,  # LLM
+            cache.responses(),  # Records FAQ answers
             tts,  # TTS
+            cache.audio(),  # Records FAQ answer audio
+            pacing.arrivals(),  # Bot audio queued for output
             transport.output(),  # Transport bot output
+            pacing.playout(),  # Bot audio played (pacing metrics)
+            audio_retention,  # Last 60s of call audio
             context_aggregator.assistant(),  # Assistant spoken responses
         ]
     )
 
-    task = PipelineTask(pipeline, params=PipelineParams(allow_interruptions=True))
+    task = PipelineTask(
+        pipeline,
+        params=PipelineParams(
+            allow_interruptions=True,
+            enable_metrics=True,
+            enable_usage_metrics=True,
+            **telephony_audio_params(transport),
+        ),
+    )
+    session.add("pipeline_task", task)
+    SessionMemory(session, task, pipeline, context=template.context, transport=transport)
 
     flow_manager = FlowManager(
         task=task,
@@ -218,6 +287,14 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
         context_aggregator=context_aggregator,
         transport=transport,
     )
+    SessionUsage(
+        session,
+        task,
+        flow_manager=flow_manager,
+        context=template.context,
+        llm=llm,
+        budget=UsageBudget.from_env(),
+    )
 
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
@@ -235,8 +312,17 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
 
 async def bot(runner_args: RunnerArguments):
     """Main bot entry point compatible with Pipecat Cloud."""
-    transport = await create_transport(runner_args, transport_params)
-    await run_bot(transport, runner_args)
+    loop_watchdog.start()
+    templates.start()
+    try:
+        async with admission.admit():
+            transport = await create_transport(runner_args, transport_params)
+            use_native_telephony_audio(transport)
+            async with sessions.open("psychsuite") as session:
+                await run_bot(transport, runner_args, session)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejecting call: {e}")
+        await reject_connection(runner_args)
 
 if __name__ == "__main__":
     from pipecat.runner.run import main
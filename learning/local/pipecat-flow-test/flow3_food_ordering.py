@@ -15,8 +15,9 @@ conversation paths are determined at runtime. The flow handles:
 4. Confirmation and booking
 
 Multi-LLM Support:
-Set LLM_PROVIDER environment variable to choose your LLM provider.
-Supported: openai (default), anthropic, google, aws
+Set LLM_PROVIDERS (comma-separated) to the LLM providers to route between.
+Supported: google (default), openai, anthropic, aws. Each turn goes to the
+provider that best fits the node's route policy (see utils.llm_router).
 
 Requirements:
 - CARTESIA_API_KEY (for TTS)
@@ -45,10 +46,11 @@ from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.daily.transport import DailyParams
 from pipecat.transports.websocket.fastapi import FastAPIWebsocketParams
 from pipecat.utils.text.markdown_text_filter import MarkdownTextFilter
-#from utils import create_llm
-from pipecat.services.google.llm import GoogleLLMService
 
 from pipecat_flows import FlowArgs, FlowManager, FlowResult, FlowsFunctionSchema, NodeConfig
+from utils.function_args import validated
+from utils.llm_router import create_router, route_policy
+from utils.response_templates import templated
 
 load_dotenv(override=True)
 
@@ -152,27 +154,38 @@ async def end_conversation(args: FlowArgs) -> tuple[None, NodeConfig]:
 
 
 # Create function schemas
-party_size_schema = FlowsFunctionSchema(
-    name="collect_party_size",
-    description="Record the number of people in the party",
-    properties={"size": {"type": "integer", "minimum": 1, "maximum": 12}},
-    required=["size"],
-    handler=collect_party_size,
+# Arguments are checked against the schema, and fixed where possible, before the
+# handler runs (see utils.function_args). The next node's reply is rendered from
+# its response_template when it can be (see utils.response_templates).
+party_size_schema = validated(
+    templated(
+        FlowsFunctionSchema(
+            name="collect_party_size",
+            description="Record the number of people in the party",
+            properties={"size": {"type": "integer", "minimum": 1, "maximum": 12}},
+            required=["size"],
+            handler=collect_party_size,
+        )
+    )
 )
 
-availability_schema = FlowsFunctionSchema(
-    name="check_availability",
-    description="Check availability for requested time",
-    properties={
-        "time": {
-            "type": "string",
-            "pattern": "^([5-9]|10):00 PM$",  # Matches "5:00 PM" through "10:00 PM"
-            "description": "Reservation time (e.g., '6:00 PM')",
-        },
-        "party_size": {"type": "integer"},
-    },
-    required=["time", "party_size"],
-    handler=check_availability,
+availability_schema = validated(
+    templated(
+        FlowsFunctionSchema(
+            name="check_availability",
+            description="Check availability for requested time",
+            properties={
+                "time": {
+                    "type": "string",
+                    "pattern": "^([5-9]|10):00 PM$",  # Matches "5:00 PM" through "10:00 PM"
+                    "description": "Reservation time (e.g., '6:00 PM')",
+                },
+                "party_size": {"type": "integer"},
+            },
+            required=["time", "party_size"],
+            handler=check_availability,
+        )
+    )
 )
 
 end_conversation_schema = FlowsFunctionSchema(
@@ -202,6 +215,8 @@ def create_initial_node(wait_for_user: bool) -> NodeConfig:
             }
         ],
         "functions": [party_size_schema],
+        # The greeting is the first thing the caller hears.
+        "pre_actions": [route_policy(max_ttft_ms=800)],
         "respond_immediately": not wait_for_user,
     }
 
@@ -218,6 +233,11 @@ def create_time_selection_node() -> NodeConfig:
             }
         ],
         "functions": [availability_schema],
+        "pre_actions": [route_policy(max_ttft_ms=1000, max_cost_per_mtok=0.5)],
+        "response_template": (
+            "Great, a table for {size}. What time would you like to come in? "
+            "We're open from 5 to 10 PM."
+        ),
     }
 
 
@@ -232,6 +252,10 @@ def create_confirmation_node() -> NodeConfig:
             }
         ],
         "functions": [end_conversation_schema],
+        "response_template": (
+            "Good news, {time} is available. You're booked for {party_size} at {time}. "
+            "Is there anything else I can help you with?"
+        ),
     }
 
 
@@ -251,6 +275,10 @@ def create_no_availability_node(alternative_times: list[str]) -> NodeConfig:
             }
         ],
         "functions": [availability_schema, end_conversation_schema],
+        "response_template": (
+            "I'm sorry, {time} is fully booked. We do have {alternative_times}. "
+            "Would one of those work for you?"
+        ),
     }
 
 
@@ -279,10 +307,8 @@ async def run_bot(
         voice_id="71a7ad14-091c-4e8e-a314-022ece01c121",  # British Reading Lady
         text_filters=[MarkdownTextFilter()],
     )
-    # LLM service is created using the create_llm function from utils.py
-    # Default is OpenAI; can be changed by setting LLM_PROVIDER environment variable
-    #llm = create_llm()
-    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-2.0-flash-lite")
+    # Routes each turn between the providers in LLM_PROVIDERS (default: google)
+    llm = create_router()
 
 
     context = LLMContext()
@@ -309,6 +335,7 @@ async def run_bot(
         context_aggregator=context_aggregator,
         transport=transport,
     )
+    llm.attach(flow_manager)
 
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
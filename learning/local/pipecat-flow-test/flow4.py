@@ -21,18 +21,24 @@ from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
-from pipecat.processors.aggregators.llm_context import LLMContext
-from pipecat.processors.aggregators.llm_response_universal import LLMContextAggregatorPair
 from pipecat.runner.types import RunnerArguments
 from pipecat.runner.utils import create_transport
-from pipecat.services.cartesia.stt import CartesiaSTTService
 from pipecat.services.cartesia.tts import CartesiaTTSService
-from pipecat.services.google.llm import GoogleLLMService
 from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.daily.transport import DailyParams
 from pipecat.transports.websocket.fastapi import FastAPIWebsocketParams
 from pipecat.utils.text.markdown_text_filter import MarkdownTextFilter
 from pipecat.frames.frames import TTSSpeakFrame,TTSUpdateSettingsFrame
+from utils.admission import AdmissionRejected, admission, reject_connection
+from utils.hedged_llm import HedgedGoogleLLMService
+from utils.loop_watchdog import loop_watchdog
+from utils.output_pacing import OutputPacingMonitor
+from utils.pipeline_pool import PipelineTemplate, PipelineTemplatePool
+from utils.session_memory import SessionMemory
+from utils.sessions import Session, sessions
+from utils.stt_prewarm import PrewarmedCartesiaSTTService
+from utils.telephony import telephony_audio_params, use_native_telephony_audio
+from utils.usage_accounting import SessionUsage, UsageBudget
 
 from pipecat_flows import (
     FlowArgs,
@@ -177,18 +183,33 @@ Keep everything friendly, concise, and human. Never repeat explanations about wh
     }
 
 
-async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
-    stt = CartesiaSTTService(api_key=os.getenv("CARTESIA_API_KEY"))
+def create_template() -> PipelineTemplate:
+    stt = PrewarmedCartesiaSTTService(api_key=os.getenv("CARTESIA_API_KEY"))
     tts = CartesiaTTSService(
         api_key=os.getenv("CARTESIA_API_KEY"),
 #        voice_id="6a8a40f7-9284-4f1d-b839-16e205174254",  #soham - english
         voice_id="d01294a0-1ddd-4b92-80c9-6dbb7d40e564",    #soham - english + marathi
         text_filters=[MarkdownTextFilter()],
     )
-    llm = GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model="gemini-2.0-flash-lite")
+    # Races gemini-2.0-flash when flash-lite's first token is late (see utils.hedged_llm).
+    llm = HedgedGoogleLLMService(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-2.0-flash-lite",
+        backup_model="gemini-2.0-flash",
+    )
+
+    return PipelineTemplate(stt=stt, llm=llm, tts=tts)
+
+# Services built ahead of time, so calls don't wait on them.
+templates = PipelineTemplatePool(create_template)
+
 
-    context = LLMContext()
-    context_aggregator = LLMContextAggregatorPair(context)
+async def run_bot(transport: BaseTransport, runner_args: RunnerArguments, session: Session):
+    template = await templates.acquire(session)
+    stt, llm, tts = template.stt, template.llm, template.tts
+    context_aggregator = template.context_aggregator
+
+    pacing = session.add("pacing", OutputPacingMonitor())
 
     pipeline = Pipeline(
         [
@@ -197,12 +218,24 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
             context_aggregator.user(),  # User responses
             llm,  # LLM
             tts,  # TTS
+            pacing.arrivals(),  # Bot audio queued for output
             transport.output(),  # Transport bot output
+            pacing.playout(),  # Bot audio played (pacing metrics)
             context_aggregator.assistant(),  # Assistant spoken responses
         ]
     )
 
-    task = PipelineTask(pipeline, params=PipelineParams(allow_interruptions=True))
+    task = PipelineTask(
+        pipeline,
+        params=PipelineParams(
+            allow_interruptions=True,
+            enable_metrics=True,
+            enable_usage_metrics=True,
+            **telephony_audio_params(transport),
+        ),
+    )
+    session.add("pipeline_task", task)
+    SessionMemory(session, task, pipeline, context=template.context, transport=transport)
 
     # Initialize flow manager
     flow_manager = FlowManager(
@@ -211,6 +244,14 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
         context_aggregator=context_aggregator,
         transport=transport,
     )
+    SessionUsage(
+        session,
+        task,
+        flow_manager=flow_manager,
+        context=template.context,
+        llm=llm,
+        budget=UsageBudget.from_env(),
+    )
 
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
@@ -229,8 +270,17 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
 
 async def bot(runner_args: RunnerArguments):
     """Main bot entry point compatible with Pipecat Cloud."""
-    transport = await create_transport(runner_args, transport_params)
-    await run_bot(transport, runner_args)
+    loop_watchdog.start()
+    templates.start()
+    try:
+        async with admission.admit():
+            transport = await create_transport(runner_args, transport_params)
+            use_native_telephony_audio(transport)
+            async with sessions.open("flow4") as session:
+                await run_bot(transport, runner_args, session)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejecting call: {e}")
+        await reject_connection(runner_args)
 
 
 if __name__ == "__main__":
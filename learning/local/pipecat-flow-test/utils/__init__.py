@@ -0,0 +1,6 @@
+"""Shared helpers for the Pipecat Flows bots in this workspace.
+
+The bots at the workspace root import this package directly; the workspace
+members (``KPIT``, ``PsychSuite/first_meeting``) add the workspace root to
+``sys.path`` before importing it.
+"""
@@ -0,0 +1,257 @@
+"""Admission control for incoming calls.
+
+A worker that takes every call it is offered degrades for everybody once it
+runs out of CPU: the event loop falls behind and every call's audio comes out
+late. ``AdmissionController`` gates ``bot()`` on live load signals:
+
+- event-loop lag, sampled by a background task,
+- process CPU (Silero VAD and smart turn run in worker threads of this
+  process, so their cost shows up here),
+- the number of calls already admitted.
+
+When the worker is over any limit a new call waits up to
+``queue_timeout_secs`` for headroom, and is rejected right away if too many
+calls are already waiting. Current headroom is logged and, when
+``ADMISSION_HEADROOM_FILE`` is set, written there as JSON for the scheduler::
+
+    async def bot(runner_args: RunnerArguments):
+        try:
+            async with admission.admit():
+                transport = await create_transport(runner_args, transport_params)
+                ...
+        except AdmissionRejected as e:
+            logger.warning(f"Rejecting call: {e}")
+            await reject_connection(runner_args)
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+from loguru import logger
+from pipecat.runner.types import (
+    DailyRunnerArguments,
+    RunnerArguments,
+    SmallWebRTCRunnerArguments,
+    WebSocketRunnerArguments,
+)
+from pipecat.transports.daily.utils import DailyRESTHelper
+
+MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "50"))
+MAX_LOOP_LAG_SECS = 0.05
+MAX_CPU_PERCENT = 85.0
+QUEUE_TIMEOUT_SECS = 3.0
+MAX_QUEUED = 10
+SAMPLE_SECS = 0.25
+PUBLISH_SECS = 5.0
+
+# Smoothing for the lag and CPU samples, so one slow tick doesn't reject calls.
+_EWMA_ALPHA = 0.3
+
+# WebSocket close code for "try again later".
+_WS_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionRejected(Exception):
+    """Raised by ``AdmissionController.admit()`` when a call can't be taken."""
+
+
+class AdmissionController:
+    """Admits calls while the worker has headroom, queues or rejects the rest."""
+
+    def __init__(
+        self,
+        *,
+        max_sessions: int = MAX_SESSIONS,
+        max_loop_lag_secs: float = MAX_LOOP_LAG_SECS,
+        max_cpu_percent: float = MAX_CPU_PERCENT,
+        queue_timeout_secs: float = QUEUE_TIMEOUT_SECS,
+        max_queued: int = MAX_QUEUED,
+        headroom_file: Optional[str] = None,
+    ):
+        """Initialize the controller.
+
+        Args:
+            max_sessions: Most calls admitted at once.
+            max_loop_lag_secs: Smoothed event-loop lag above which no call is admitted.
+            max_cpu_percent: Smoothed process CPU (percent of all cores) above which
+                no call is admitted.
+            queue_timeout_secs: How long a call waits for headroom before rejection.
+            max_queued: Calls allowed to wait at once; beyond that they're rejected
+                immediately.
+            headroom_file: Where to publish headroom as JSON. Defaults to the
+                ``ADMISSION_HEADROOM_FILE`` environment variable, if set.
+        """
+        self._max_sessions = max_sessions
+        self._max_loop_lag_secs = max_loop_lag_secs
+        self._max_cpu_percent = max_cpu_percent
+        self._queue_timeout_secs = queue_timeout_secs
+        self._max_queued = max_queued
+        self._headroom_file = headroom_file or os.getenv("ADMISSION_HEADROOM_FILE")
+
+        self._active = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._loop_lag_secs = 0.0
+        self._cpu_percent = 0.0
+        self._cpu_count = os.cpu_count() or 1
+
+        self._changed: Optional[asyncio.Condition] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def headroom(self) -> Dict[str, Any]:
+        """Current load and how many more calls this worker would admit now."""
+        return {
+            "accepting": self._overload_reason() is None,
+            "free_sessions": max(0, self._max_sessions - self._active),
+            "active_sessions": self._active,
+            "queued": self._queued,
+            "loop_lag_ms": round(self._loop_lag_secs * 1000, 1),
+            "cpu_percent": round(self._cpu_percent, 1),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+        }
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold a call slot for the duration of the ``async with`` block.
+
+        Raises:
+            AdmissionRejected: If the worker stays overloaded for the whole queue
+                timeout, or the queue is already full.
+        """
+        self._ensure_monitor()
+
+        reason = self._overload_reason()
+        if reason:
+            await self._wait_for_headroom(reason)
+
+        self._active += 1
+        self._admitted += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            await self._notify()
+
+    def _overload_reason(self) -> Optional[str]:
+        if self._active >= self._max_sessions:
+            return f"{self._active} sessions active (max {self._max_sessions})"
+        if self._loop_lag_secs > self._max_loop_lag_secs:
+            return f"event loop lag {self._loop_lag_secs * 1000:.0f}ms"
+        if self._cpu_percent > self._max_cpu_percent:
+            return f"CPU at {self._cpu_percent:.0f}%"
+        return None
+
+    async def _wait_for_headroom(self, reason: str):
+        if self._queued >= self._max_queued:
+            self._rejected += 1
+            raise AdmissionRejected(f"{reason}, {self._queued} calls already queued")
+
+        self._queued += 1
+        try:
+            async with self._changed:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._overload_reason() is None),
+                    timeout=self._queue_timeout_secs,
+                )
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise AdmissionRejected(
+                f"{self._overload_reason() or reason} after {self._queue_timeout_secs}s in queue"
+            )
+        finally:
+            self._queued -= 1
+
+    async def _notify(self):
+        if self._changed:
+            async with self._changed:
+                self._changed.notify_all()
+
+    def _ensure_monitor(self):
+        if self._monitor_task and not self._monitor_task.done():
+            return
+        self._changed = asyncio.Condition()
+        self._monitor_task = asyncio.get_running_loop().create_task(self._monitor())
+
+    async def _monitor(self):
+        """Sample loop lag and CPU every ``SAMPLE_SECS`` and publish headroom."""
+        last_wall = time.monotonic()
+        last_cpu = time.process_time()
+        last_publish = 0.0
+
+        while True:
+            await asyncio.sleep(SAMPLE_SECS)
+
+            now = time.monotonic()
+            cpu = time.process_time()
+            wall_elapsed = now - last_wall
+            lag = max(0.0, wall_elapsed - SAMPLE_SECS)
+            cpu_percent = (cpu - last_cpu) / wall_elapsed / self._cpu_count * 100
+            last_wall, last_cpu = now, cpu
+
+            self._loop_lag_secs += _EWMA_ALPHA * (lag - self._loop_lag_secs)
+            self._cpu_percent += _EWMA_ALPHA * (cpu_percent - self._cpu_percent)
+            await self._notify()
+
+            if now - last_publish >= PUBLISH_SECS:
+                last_publish = now
+                self._publish()
+
+    def _publish(self):
+        headroom = self.headroom()
+        logger.debug(f"Admission headroom: {headroom}")
+        if not self._headroom_file:
+            return
+        try:
+            tmp_path = f"{self._headroom_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({**headroom, "timestamp": time.time()}, f)
+            os.replace(tmp_path, self._headroom_file)
+        except OSError as e:
+            logger.warning(f"Couldn't publish admission headroom: {e}")
+
+
+async def reject_connection(runner_args: RunnerArguments):
+    """Turn away a call that wasn't admitted.
+
+    No transport was created, but the caller is already connected:
+
+    - WebSocket (telephony) callers get a "try again later" close;
+    - WebRTC callers' peer connection is closed;
+    - Daily callers are in a room the runner created for the call: it's
+      deleted, which ejects them, when ``DAILY_API_KEY`` is set. Otherwise
+      they're left in the room until it expires, and that's logged.
+    """
+    try:
+        if isinstance(runner_args, WebSocketRunnerArguments):
+            await runner_args.websocket.close(code=_WS_TRY_AGAIN_LATER)
+        elif isinstance(runner_args, SmallWebRTCRunnerArguments):
+            await runner_args.webrtc_connection.disconnect()
+        elif isinstance(runner_args, DailyRunnerArguments):
+            await _delete_daily_room(runner_args.room_url)
+    except Exception as e:
+        logger.debug(f"Error tearing down rejected connection: {e}")
+
+
+async def _delete_daily_room(room_url: str):
+    api_key = os.getenv("DAILY_API_KEY")
+    if not api_key:
+        logger.warning(f"Rejected caller left in {room_url} until it expires (no DAILY_API_KEY)")
+        return
+    async with aiohttp.ClientSession() as session:
+        helper = DailyRESTHelper(
+            daily_api_key=api_key,
+            daily_api_url=os.getenv("DAILY_API_URL", "https://api.daily.co/v1"),
+            aiohttp_session=session,
+        )
+        await helper.delete_room_by_url(room_url)
+
+
+# The admission controller for this worker process.
+admission = AdmissionController()
@@ -0,0 +1,386 @@
+"""Run a bot's live pipeline over recorded calls, faster than real time.
+
+``run_bot`` only needs a transport, so the same pipeline that serves live
+calls can run over recordings (QA, session notes) with a
+``RecordingTransport`` in place of Daily or Twilio:
+
+- the input pushes the recording's audio as fast as the pipeline takes it
+  (each chunk once the previous one has been through VAD), instead of in
+  20 ms real-time steps. While the bot answers a turn, it holds the rest of
+  the recording, as the user would have;
+- the output doesn't play the bot's audio, and frames timed against it (word
+  timestamps) are sent in order with the audio instead of at their
+  presentation time, so they go out as soon as the audio before them has.
+
+Time in the pipeline is the recording's own: VAD and turn detection count
+audio frames, not seconds, so turns end where they ended in the call.
+
+Recordings can be any format PyAV reads. Stereo recordings are read as
+``AudioRetentionProcessor`` writes them: the user on the left channel.
+
+Files are fanned out over a process pool, one event loop per process, and
+each file's real-time factor (processing time / audio duration) is
+reported; below 1 is faster than real time::
+
+    uv run python -m utils.batch PsychSuite/first_meeting/main.py recordings/*.flac \\
+        --workers 4 --out batch_out
+"""
+
+import argparse
+import asyncio
+import glob
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import av
+import numpy as np
+from loguru import logger
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    Frame,
+    InputAudioRawFrame,
+    OutputAudioRawFrame,
+    StartFrame,
+    TranscriptionFrame,
+    TTSTextFrame,
+    VADUserStoppedSpeakingFrame,
+)
+from pipecat.observers.base_observer import BaseObserver, FramePushed
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.runner.types import RunnerArguments
+from pipecat.services.stt_service import STTService
+from pipecat.transports.base_input import BaseInputTransport
+from pipecat.transports.base_output import BaseOutputTransport
+from pipecat.transports.base_transport import BaseTransport, TransportParams
+
+from utils.sessions import Session, sessions
+
+CHUNK_MS = 20
+
+# How long the bot has to stay quiet after a turn before the recording goes on.
+BOT_SETTLE_SECS = 0.5
+
+# Longest the recording waits for the bot to answer a turn.
+TURN_TIMEOUT_SECS = 5.0
+
+RunBot = Callable[[BaseTransport, RunnerArguments, Session], Awaitable[None]]
+
+
+def load_audio(path: str, sample_rate: int) -> bytes:
+    """Decode ``path`` to 16-bit mono PCM at ``sample_rate``: the left channel if stereo."""
+    chunks = []
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        stereo = stream.codec_context.channels > 1
+        resampler = av.AudioResampler(
+            format="s16", layout="stereo" if stereo else "mono", rate=sample_rate
+        )
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+    samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+    if stereo:
+        # Packed s16 stereo interleaves left and right.
+        samples = samples[0::2]
+    return samples.astype(np.int16).tobytes()
+
+
+class RecordingInputTransport(BaseInputTransport):
+    """Feeds a recording into the pipeline as fast as it takes it."""
+
+    def __init__(self, transport: "RecordingTransport", params: TransportParams):
+        super().__init__(params)
+        self._transport = transport
+        self._feed_task: Optional[asyncio.Task] = None
+        self._bot_speaking = False
+        self._bot_quiet_since = time.monotonic()
+        self._turn_started: Optional[float] = None
+        self._bot_answered = True
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        await self.set_transport_ready(frame)
+        if not self._feed_task:
+            self._feed_task = self.create_task(self._feed())
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._feed_task:
+            await self.cancel_task(self._feed_task)
+            self._feed_task = None
+
+    async def push_frame(self, frame: Frame, direction: FrameDirection = FrameDirection.DOWNSTREAM):
+        if isinstance(frame, VADUserStoppedSpeakingFrame):
+            self._turn_started = time.monotonic()
+            self._bot_answered = False
+        await super().push_frame(frame, direction)
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, BotStartedSpeakingFrame):
+            self._bot_speaking = True
+            self._bot_answered = True
+        elif isinstance(frame, BotStoppedSpeakingFrame):
+            self._bot_speaking = False
+            self._bot_quiet_since = time.monotonic()
+
+    async def _wait_for_bot(self):
+        """Wait until the bot has answered the last turn and gone quiet."""
+        while True:
+            now = time.monotonic()
+            if self._bot_answered:
+                if not self._bot_speaking and now - self._bot_quiet_since >= BOT_SETTLE_SECS:
+                    return
+            elif now - self._turn_started >= TURN_TIMEOUT_SECS:
+                logger.debug(f"{self}: no answer after {TURN_TIMEOUT_SECS}s, going on")
+                return
+            await asyncio.sleep(0.05)
+
+    async def _feed(self):
+        await self._transport._call_event_handler("on_client_connected", self)
+        # The bot usually opens the call: let it.
+        self._turn_started = time.monotonic()
+        self._bot_answered = False
+
+        audio = await asyncio.to_thread(load_audio, self._transport.path, self.sample_rate)
+        self._transport.audio_secs = len(audio) / 2 / self.sample_rate
+        chunk_bytes = self.sample_rate * CHUNK_MS // 1000 * 2
+        for offset in range(0, len(audio), chunk_bytes):
+            if self._turn_started is not None:
+                await self._wait_for_bot()
+                self._turn_started = None
+            await self.push_audio_frame(
+                InputAudioRawFrame(
+                    audio=audio[offset : offset + chunk_bytes],
+                    sample_rate=self.sample_rate,
+                    num_channels=1,
+                )
+            )
+            # Backpressure: the next chunk goes in once VAD has taken this one.
+            await self._audio_in_queue.join()
+
+        if self._turn_started is not None:
+            await self._wait_for_bot()
+        await self._transport._call_event_handler("on_client_disconnected", self)
+
+
+class RecordingOutputTransport(BaseOutputTransport):
+    """Drops the bot's audio instead of playing it."""
+
+    def __init__(self, transport: "RecordingTransport", params: TransportParams):
+        super().__init__(params)
+        self._transport = transport
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        await self.set_transport_ready(frame)
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        if direction == FrameDirection.DOWNSTREAM and frame.pts:
+            # Timed frames would wait for their presentation time in real
+            # time; without pts they're queued behind the audio before them.
+            frame.pts = None
+        await super().process_frame(frame, direction)
+
+    async def write_audio_frame(self, frame: OutputAudioRawFrame) -> bool:
+        samples = len(frame.audio) // (2 * frame.num_channels)
+        self._transport.bot_audio_secs += samples / frame.sample_rate
+        return True
+
+
+class RecordingTransport(BaseTransport):
+    """A transport whose user is a recording."""
+
+    def __init__(self, path: str, params: TransportParams):
+        """Initialize the transport.
+
+        Args:
+            path: The recording to play as the user.
+            params: Transport parameters, as the bot uses for live calls
+                (VAD, turn analyzer).
+        """
+        super().__init__()
+        self.path = path
+        self.audio_secs = 0.0
+        self.bot_audio_secs = 0.0
+        self._params = params
+        self._input: Optional[RecordingInputTransport] = None
+        self._output: Optional[RecordingOutputTransport] = None
+        self._register_event_handler("on_client_connected")
+        self._register_event_handler("on_client_disconnected")
+
+    def input(self) -> FrameProcessor:
+        if not self._input:
+            self._input = RecordingInputTransport(self, self._params)
+        return self._input
+
+    def output(self) -> FrameProcessor:
+        if not self._output:
+            self._output = RecordingOutputTransport(self, self._params)
+        return self._output
+
+
+class _TranscriptObserver(BaseObserver):
+    """Collects what the user said (STT) and what the bot played (TTS words)."""
+
+    def __init__(self, output: FrameProcessor):
+        super().__init__()
+        self._output = output
+        self._bot_line: Optional[Dict[str, str]] = None
+        self.lines: List[Dict[str, str]] = []
+
+    async def on_push_frame(self, data: FramePushed):
+        frame = data.frame
+        if isinstance(frame, TranscriptionFrame) and isinstance(data.source, STTService):
+            self.lines.append({"role": "user", "text": frame.text})
+        elif data.source is not self._output:
+            return
+        elif isinstance(frame, BotStoppedSpeakingFrame):
+            self._bot_line = None
+        elif isinstance(frame, TTSTextFrame):
+            if self._bot_line is None:
+                self._bot_line = {"role": "assistant", "text": frame.text}
+                self.lines.append(self._bot_line)
+            else:
+                self._bot_line["text"] += " " + frame.text
+
+
+@dataclass
+class BatchResult:
+    """One recording's run."""
+
+    path: str
+    audio_secs: float = 0.0
+    bot_audio_secs: float = 0.0
+    wall_secs: float = 0.0
+    transcript: List[Dict[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def rtf(self) -> Optional[float]:
+        """Real-time factor: processing time over audio duration."""
+        return self.wall_secs / self.audio_secs if self.audio_secs else None
+
+
+async def run_recording(
+    run_bot: RunBot, path: str, params: TransportParams, bot: str
+) -> BatchResult:
+    """Run one bot's pipeline over one recording."""
+    transport = RecordingTransport(path, params)
+    observer = _TranscriptObserver(transport.output())
+    result = BatchResult(path=path)
+    start_time = time.perf_counter()
+    session_id = os.path.splitext(os.path.basename(path))[0]
+    try:
+        async with sessions.open(bot, session_id=session_id) as session:
+
+            @transport.event_handler("on_client_connected")
+            async def on_client_connected(transport, client):
+                session.get("pipeline_task").add_observer(observer)
+
+            await run_bot(transport, RunnerArguments(), session)
+    except Exception as e:
+        logger.exception(f"Batch run of {path} failed")
+        result.error = str(e)
+    result.wall_secs = time.perf_counter() - start_time
+    result.audio_secs = transport.audio_secs
+    result.bot_audio_secs = transport.bot_audio_secs
+    result.transcript = observer.lines
+    return result
+
+
+# Per worker process: the bot module and the event loop every file runs on,
+# so process-wide resources (template pool, shared clients) outlive a file.
+_bot: Dict[str, Any] = {}
+
+
+def load_bot(path: str):
+    """Import a bot's main module by path, with its directory first on sys.path."""
+    path = os.path.abspath(path)
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location("batch_bot", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _init_worker(bot_path: str, bot: str):
+    module = load_bot(bot_path)
+    _bot.update(
+        module=module,
+        bot=bot,
+        params=module.transport_params["webrtc"](),
+        loop=asyncio.new_event_loop(),
+    )
+
+
+def _run_file(path: str) -> BatchResult:
+    run = run_recording(_bot["module"].run_bot, path, _bot["params"], _bot["bot"])
+    return _bot["loop"].run_until_complete(run)
+
+
+def run_batch(
+    bot_path: str, paths: List[str], *, workers: int, bot: str = "batch"
+) -> List[BatchResult]:
+    """Run the bot at ``bot_path`` over ``paths`` on ``workers`` processes."""
+    # spawn: the workers import the bot (and its models) themselves.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(bot_path, bot),
+    ) as pool:
+        return list(pool.map(_run_file, paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a bot over recorded calls")
+    parser.add_argument("bot", help="The bot's main module, e.g. PsychSuite/first_meeting/main.py")
+    parser.add_argument("recordings", nargs="+", help="Audio files or glob patterns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", help="Directory for one JSON result per recording")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in args.recordings for p in glob.glob(pattern)})
+    if not paths:
+        parser.error("no recordings found")
+
+    workers = min(args.workers, len(paths))
+    start_time = time.perf_counter()
+    results = run_batch(args.bot, paths, workers=workers)
+    elapsed = time.perf_counter() - start_time
+
+    for result in results:
+        if result.error:
+            print(f"{'failed':>24}  {result.path}: {result.error}")
+        else:
+            print(
+                f"{result.audio_secs:>7.1f}s audio {result.wall_secs:>7.1f}s "
+                f"RTF {result.rtf or 0:.2f}  {result.path}"
+            )
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            name = os.path.splitext(os.path.basename(result.path))[0] + ".json"
+            with open(os.path.join(args.out, name), "w") as f:
+                json.dump({**asdict(result), "rtf": result.rtf}, f, indent=2)
+
+    audio_secs = sum(r.audio_secs for r in results)
+    print(
+        f"{len(results)} recordings, {audio_secs:.1f}s of audio in {elapsed:.1f}s: "
+        f"{audio_secs / elapsed:.1f}x real time on {workers} workers"
+    )
+
+
+if __name__ == "__main__":
+    main()
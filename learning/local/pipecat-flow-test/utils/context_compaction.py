@@ -0,0 +1,133 @@
+"""Shrink a call's LLM context by summarizing its older messages.
+
+Flows keep appending to one ``LLMContext``, so every turn re-sends the whole
+call. ``compact_context()`` replaces everything but the first system
+messages (the bot's role), the latest node instructions and the last
+``keep_last`` messages with a short summary written by the call's LLM::
+
+    await compact_context(context, llm, keep_last=6)
+
+The summary request runs out of band (``run_inference()``) and only sends
+the transcript being replaced. Messages added while it runs are kept: the
+context is only rewritten if its older part hasn't changed in the meantime.
+"""
+
+from typing import Any, List, Optional
+
+from loguru import logger
+from pipecat.processors.aggregators.llm_context import LLMContext
+from pipecat.services.llm_service import LLMService
+
+KEEP_LAST = 6
+
+SUMMARY_PROMPT = (
+    "Summarize this voice call transcript for the assistant who will continue it. "
+    "Keep names, numbers, decisions and anything the user asked for. "
+    "Write at most 120 words of plain text."
+)
+
+
+def _is_dict(message: Any) -> bool:
+    # Provider-specific messages (LLMSpecificMessage) aren't dicts.
+    return isinstance(message, dict)
+
+
+def _role(message: Any) -> Optional[str]:
+    return message.get("role") if _is_dict(message) else None
+
+
+def transcript(messages: List[Any]) -> str:
+    """User and assistant text of ``messages``, one "role: text" line each."""
+    lines = []
+    for message in messages:
+        content = message.get("content") if _is_dict(message) else None
+        if _role(message) in ("user", "assistant") and isinstance(content, str) and content:
+            lines.append(f"{message['role']}: {content}")
+    return "\n".join(lines)
+
+
+def split_point(messages: List[Any], keep_last: int) -> int:
+    """Index where the kept tail starts, without splitting a tool call from its result."""
+    cut = max(len(messages) - keep_last, 0)
+    while 0 < cut < len(messages) and _role(messages[cut]) == "tool":
+        cut -= 1
+    return cut
+
+
+def _head(messages: List[Any]) -> List[Any]:
+    """The leading system messages: the bot's role, set when the flow started."""
+    head = []
+    for message in messages:
+        if _role(message) != "system":
+            break
+        head.append(message)
+    return head
+
+
+def rebuild(messages: List[Any], cut: int, summary_message: dict) -> List[Any]:
+    """``messages`` with everything before ``cut`` replaced by ``summary_message``.
+
+    The bot's role and the latest system message before ``cut`` (the current
+    node's instructions) are kept.
+    """
+    head = _head(messages[:cut])
+    older = messages[len(head) : cut]
+    latest_system = next((m for m in reversed(older) if _role(m) == "system"), None)
+    rebuilt = [*head, summary_message]
+    if latest_system is not None:
+        rebuilt.append(latest_system)
+    return rebuilt + messages[cut:]
+
+
+async def summarize(llm: LLMService, messages: List[Any], prompt: str = SUMMARY_PROMPT) -> str:
+    """Have ``llm`` summarize the transcript of ``messages``."""
+    context = LLMContext(
+        [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": transcript(messages)},
+        ]
+    )
+    return ((await llm.run_inference(context)) or "").strip()
+
+
+async def compact_context(
+    context: LLMContext, llm: LLMService, *, keep_last: int = KEEP_LAST
+) -> bool:
+    """Replace ``context``'s older messages with a summary.
+
+    Args:
+        context: The call's LLM context. Updated in place.
+        llm: Writes the summary.
+        keep_last: Most recent messages kept as they are.
+
+    Returns:
+        Whether the context was compacted.
+    """
+    # get_messages() is the live list: keep a copy to compare against later.
+    messages = list(context.get_messages())
+    cut = split_point(messages, keep_last)
+    older = messages[len(_head(messages[:cut])) : cut]
+    if not transcript(older):
+        return False
+
+    try:
+        summary = await summarize(llm, older)
+    except Exception as e:
+        logger.warning(f"Couldn't summarize the context: {e}")
+        return False
+    if not summary:
+        return False
+
+    current = list(context.get_messages())
+    if len(current) < cut or any(a is not b for a, b in zip(current[:cut], messages[:cut])):
+        # The flow reset or rewrote the context meanwhile.
+        logger.debug("Context changed while summarizing, not compacting")
+        return False
+
+    summary_message = {"role": "system", "content": f"Summary of the call so far: {summary}"}
+    context.set_messages(rebuild(current, cut, summary_message))
+    logger.info(
+        f"Compacted context from {len(current)} to {len(context.get_messages())} messages "
+        f"({len(transcript(older))} chars summarized in {len(summary)})"
+    )
+    return True
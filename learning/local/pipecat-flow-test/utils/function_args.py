@@ -0,0 +1,299 @@
+"""Local validation and normalization of flow function arguments.
+
+Pipecat Flows hands the LLM's arguments to a function's handler as they
+come, so a ``time`` of "7 pm" against a ``pattern`` of ``H:00 PM``, or a
+``size`` of "four" for an integer, is only caught once the handler or the
+LLM notices, which costs another full LLM turn. ``validated()`` wraps a
+``FlowsFunctionSchema`` so its handler only sees arguments that match the
+schema:
+
+1. Each property's checks (type, ``pattern``, ``minimum``/``maximum``,
+   ``enum``) are compiled once, when the schema is wrapped.
+2. Common near-misses are fixed locally: times ("7 pm", "7pm", "19:00" ->
+   "7:00 PM", for properties with ``"format": "time"`` or an AM/PM
+   ``pattern``), numbers as digits or words, enum values in the wrong case.
+3. Values that still can't be parsed are repaired with a small out-of-band
+   LLM request: the property schemas, the bad arguments and the user's last
+   message, not the whole conversation.
+4. Arguments that are well formed but not allowed (a party of 20, a time
+   outside opening hours) aren't repaired: the function returns a short error
+   result and the LLM explains it to the user in its next turn, as it would
+   anyway.
+
+``validation_stats.snapshot()`` has, per function, how many calls passed,
+were normalized, were repaired or were rejected::
+
+    party_size_schema = validated(
+        FlowsFunctionSchema(
+            name="collect_party_size",
+            properties={"size": {"type": "integer", "minimum": 1, "maximum": 12}},
+            required=["size"],
+            handler=collect_party_size,
+        )
+    )
+"""
+
+import inspect
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pipecat.processors.aggregators.llm_context import LLMContext
+from pipecat_flows import FlowArgs, FlowManager, FlowsFunctionSchema
+
+_NUMBER_WORDS = {
+    word: number
+    for number, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve".split()
+    )
+}
+
+_TIME = re.compile(
+    r"^(?P<hour>\d{1,2}|[a-z]+)(?:[:.](?P<minute>\d{2}))?\s*(?P<meridiem>[ap])?\.?\s*(?:m\.?)?$",
+    re.IGNORECASE,
+)
+
+
+class _Invalid(Exception):
+    """An argument that doesn't match its schema.
+
+    ``repairable`` is set when the value couldn't be parsed at all, as opposed
+    to a well-formed value the schema doesn't allow.
+    """
+
+    def __init__(self, message: str, repairable: bool):
+        super().__init__(message)
+        self.repairable = repairable
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        # "nan" and "inf" parse, but no argument means them.
+        return value if math.isfinite(value) else None
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _NUMBER_WORDS:
+            return _NUMBER_WORDS[text]
+        try:
+            return _as_number(float(text))
+        except ValueError:
+            return None
+    return None
+
+
+def _time_candidates(value: str) -> List[str]:
+    """Spellings of a clock time in "H:MM AM/PM" form, most likely first."""
+    match = _TIME.match(value.strip())
+    if not match:
+        return []
+    hour = _as_number(match["hour"])
+    if hour is None or hour != int(hour) or not 0 <= hour <= 23:
+        return []
+    hour = int(hour)
+    minute = match["minute"] or "00"
+    if match["meridiem"]:
+        meridiems = [match["meridiem"].upper() + "M"]
+        if hour > 12:
+            return []
+    elif hour > 12 or hour == 0:
+        meridiems = ["PM" if hour >= 12 else "AM"]
+    else:
+        # No AM/PM given: let the pattern decide.
+        meridiems = ["PM", "AM"]
+    twelve_hour = hour % 12 or 12
+    return [f"{twelve_hour}:{minute} {meridiem}" for meridiem in meridiems]
+
+
+def _compile_property(name: str, spec: Dict[str, Any]) -> Callable[[Any], Tuple[Any, bool]]:
+    """Build a checker returning ``(value, normalized)`` or raising ``_Invalid``."""
+    kind = spec.get("type")
+    pattern = re.compile(spec["pattern"]) if "pattern" in spec else None
+    # Only clock times get the time spellings tried; other patterns (codes,
+    # IDs) are just checked.
+    is_time = spec.get("format") == "time" or bool(
+        pattern and re.search(r"AM|PM", pattern.pattern, re.IGNORECASE)
+    )
+    minimum = spec.get("minimum")
+    maximum = spec.get("maximum")
+    enum = spec.get("enum")
+    hint = f": {spec['description']}" if spec.get("description") else ""
+
+    def check_range(value: float):
+        if minimum is not None and value < minimum:
+            raise _Invalid(f"{name} must be at least {minimum}, got {value}", repairable=False)
+        if maximum is not None and value > maximum:
+            raise _Invalid(f"{name} must be at most {maximum}, got {value}", repairable=False)
+
+    def check(value: Any) -> Tuple[Any, bool]:
+        normalized = value
+        if kind in ("integer", "number"):
+            number = _as_number(value)
+            if number is None or (kind == "integer" and number != int(number)):
+                raise _Invalid(f"{name} must be an {kind}, got {value!r}", repairable=True)
+            normalized = int(number) if kind == "integer" else number
+            check_range(normalized)
+        elif kind == "boolean" and not isinstance(value, bool):
+            text = str(value).strip().lower()
+            if text not in ("true", "false", "yes", "no"):
+                raise _Invalid(f"{name} must be true or false, got {value!r}", repairable=True)
+            normalized = text in ("true", "yes")
+        elif kind == "string":
+            if not isinstance(value, str):
+                value = str(value)
+            normalized = value.strip()
+            if pattern and not pattern.search(normalized):
+                candidates = _time_candidates(normalized) if is_time else []
+                matching = [c for c in candidates if pattern.search(c)]
+                if matching:
+                    normalized = matching[0]
+                elif candidates:
+                    raise _Invalid(
+                        f"{name} {candidates[0]!r} is not allowed{hint}", repairable=False
+                    )
+                else:
+                    raise _Invalid(
+                        f"{name} {value!r} is not in the expected format{hint}", repairable=True
+                    )
+        if enum is not None and normalized not in enum:
+            folded = {str(option).lower(): option for option in enum}
+            key = str(normalized).strip().lower()
+            if key not in folded:
+                raise _Invalid(f"{name} must be one of {enum}, got {value!r}", repairable=True)
+            normalized = folded[key]
+        return normalized, normalized != value
+
+    return check
+
+
+class ValidationStats:
+    """How arguments fared, per function, for every validated function in the process."""
+
+    def __init__(self):
+        """Initialize empty counts."""
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, function: str, outcome: str):
+        """Count one call's ``outcome``."""
+        self._counts[function][outcome] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Outcome counts per function."""
+        return {function: dict(counts) for function, counts in self._counts.items()}
+
+
+# The stats for this worker process.
+validation_stats = ValidationStats()
+
+
+class _ArgumentValidator:
+    """The compiled checks for one function's arguments."""
+
+    def __init__(self, schema: FlowsFunctionSchema):
+        self.name = schema.name
+        self.properties = schema.properties
+        self.required = list(schema.required)
+        self._checks = {
+            name: _compile_property(name, spec) for name, spec in schema.properties.items()
+        }
+
+    def check(self, args: FlowArgs) -> Tuple[Dict[str, Any], List[_Invalid], bool]:
+        """Normalize ``args``; returns them, what's still wrong, and whether anything changed."""
+        checked: Dict[str, Any] = dict(args)
+        errors: List[_Invalid] = []
+        changed = False
+        for name in self.required:
+            if args.get(name) is None:
+                errors.append(_Invalid(f"{name} is required", repairable=True))
+        for name, value in args.items():
+            if name not in self._checks or value is None:
+                continue
+            try:
+                checked[name], normalized = self._checks[name](value)
+                changed = changed or normalized
+            except _Invalid as e:
+                errors.append(e)
+        return checked, errors, changed
+
+    async def repair(
+        self, args: FlowArgs, errors: List[_Invalid], flow_manager: FlowManager
+    ) -> Optional[Dict[str, Any]]:
+        """Ask the LLM, out of band, for corrected arguments."""
+        # FlowManager doesn't expose its LLM; it's the call's LLM service (or router).
+        llm = getattr(flow_manager, "_llm", None)
+        if llm is None:
+            return None
+        user_text = next(
+            (
+                m.get("content")
+                for m in reversed(flow_manager.get_current_context())
+                if m.get("role") == "user" and isinstance(m.get("content"), str)
+            ),
+            "",
+        )
+        prompt = (
+            f"Fix the arguments for the function `{self.name}`.\n"
+            f"Parameters (JSON schema): {json.dumps(self.properties)}\n"
+            f"Required: {self.required}\n"
+            f"The user said: {user_text!r}\n"
+            f"Arguments given: {json.dumps(args, default=str)}\n"
+            f"Problems: {'; '.join(str(e) for e in errors)}\n"
+            "Reply with only the corrected arguments as a JSON object, or {} if "
+            "the user's request can't be expressed with these parameters."
+        )
+        try:
+            reply = await llm.run_inference(LLMContext([{"role": "user", "content": prompt}]))
+            repaired = json.loads(re.sub(r"^```(?:json)?|```$", "", (reply or "").strip()).strip())
+        except Exception as e:
+            logger.warning(f"Couldn't repair arguments for {self.name}: {e}")
+            return None
+        return repaired if isinstance(repaired, dict) and repaired else None
+
+
+async def call_handler(handler: Callable, args: FlowArgs, flow_manager: FlowManager) -> Any:
+    """Call a flow function handler with (), (args) or (args, flow_manager), as FlowManager does."""
+    params = len(inspect.signature(handler).parameters)
+    if params == 0:
+        return await handler()
+    if params == 1:
+        return await handler(args)
+    return await handler(args, flow_manager)
+
+
+def validated(schema: FlowsFunctionSchema) -> FlowsFunctionSchema:
+    """Return ``schema`` with its arguments validated and normalized before the handler."""
+    if schema.handler is None:
+        return schema
+    validator = _ArgumentValidator(schema)
+    handler = schema.handler
+
+    async def validating_handler(args: FlowArgs, flow_manager: FlowManager):
+        checked, errors, changed = validator.check(args)
+        outcome = "normalized" if changed else "passed"
+
+        if any(e.repairable for e in errors):
+            repaired = await validator.repair(args, errors, flow_manager)
+            if repaired is not None:
+                checked, errors, _ = validator.check(repaired)
+                outcome = "repaired"
+
+        if errors:
+            validation_stats.record(validator.name, "rejected")
+            message = "; ".join(str(e) for e in errors)
+            logger.info(f"Rejected {validator.name} arguments {args}: {message}")
+            # A plain result keeps the current node: the LLM reads it and asks again.
+            return {"status": "error", "error": message}
+
+        validation_stats.record(validator.name, outcome)
+        if outcome != "passed":
+            logger.debug(f"{validator.name} arguments {outcome}: {args} -> {checked}")
+        return await call_handler(handler, checked, flow_manager)
+
+    return replace(schema, handler=validating_handler)
@@ -0,0 +1,163 @@
+"""Compact handoffs between personas: a structured summary instead of the transcript.
+
+When ``transfer_control`` moves the call to another persona, Flows keeps the
+whole conversation in the context, so every persona after the first pays
+for a longer prompt on every turn. ``hand_off()`` starts the new node from
+handoff notes instead:
+
+- the facts collected so far, the open questions and the user's sentiment,
+  written by the call's LLM out of band (``run_inference()``);
+- the last ``KEEP_LAST`` user and assistant messages, as they are.
+
+The notes are written while the outgoing persona's last reply is still
+playing: the request starts when ``transfer_control`` runs, and the node
+only waits for it (at most ``HANDOFF_TIMEOUT``) when Flows switches to it.
+If the notes aren't ready in time, the node keeps the full context as
+before. Notes carry over from one handoff to the next, so the prompt stays
+the same size however many times the call changes hands::
+
+    async def transfer_control(args: FlowArgs, flow_manager: FlowManager):
+        ...
+        return "done", hand_off(flow_manager, create_personalizer_bot())
+"""
+
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from pipecat_flows import ContextStrategy, ContextStrategyConfig, FlowManager, NodeConfig
+
+from utils.context_compaction import summarize, transcript
+
+KEEP_LAST = 4
+
+# Longest the new node waits for the notes before keeping the full context.
+HANDOFF_TIMEOUT = 3.0
+
+HANDOFF_PROMPT = (
+    "You are handing this voice call over to a colleague. From the transcript "
+    "(and the earlier notes, if any), reply with only a JSON object: "
+    '{"facts": [...], "open_questions": [...], "sentiment": "..."}. '
+    "facts: what we know about the user and what was agreed, with names and numbers. "
+    "open_questions: what the user still wants or hasn't answered. "
+    "sentiment: a few words on the user's mood. Keep every item short."
+)
+
+# flow_manager.state key for the latest notes, carried to the next handoff.
+STATE_KEY = "handoff_notes"
+
+
+def _text_messages(messages: List[Any]) -> List[dict]:
+    """User and assistant messages with plain text content."""
+    return [
+        message
+        for message in messages
+        if isinstance(message, dict)
+        and message.get("role") in ("user", "assistant")
+        and isinstance(message.get("content"), str)
+        and message["content"]
+    ]
+
+
+def _parse_notes(reply: str) -> Dict[str, Any]:
+    text = re.sub(r"^```(?:json)?|```$", "", reply.strip()).strip()
+    try:
+        notes = json.loads(text)
+    except ValueError:
+        notes = None
+    if not isinstance(notes, dict):
+        # Not JSON: keep the text as the only fact rather than lose it.
+        return {"facts": [reply.strip()], "open_questions": [], "sentiment": ""}
+    return notes
+
+
+def format_notes(notes: Dict[str, Any], from_node: Optional[str] = None) -> str:
+    """The notes as one short system message."""
+
+    def items(key: str) -> str:
+        value = notes.get(key) or []
+        return "; ".join(str(v) for v in value) if isinstance(value, list) else str(value)
+
+    lines = [f"Handoff notes from {from_node}:" if from_node else "Handoff notes:"]
+    if facts := items("facts"):
+        lines.append(f"Facts: {facts}")
+    if questions := items("open_questions"):
+        lines.append(f"Open questions: {questions}")
+    if sentiment := notes.get("sentiment"):
+        lines.append(f"User sentiment: {sentiment}")
+    lines.append("The most recent messages follow.")
+    return "\n".join(lines)
+
+
+class Handoff:
+    """One handoff's notes, written in the background for the node taking over."""
+
+    def __init__(self, flow_manager: FlowManager, node: NodeConfig):
+        self._flow_manager = flow_manager
+        self._node = node
+        self._from_node = flow_manager.current_node
+        messages = _text_messages(flow_manager.get_current_context())
+        # The messages the notes replace; the rest are carried over as they are.
+        self._summarized = max(len(messages) - KEEP_LAST, 0)
+        self._task: Optional[asyncio.Task] = None
+        if self._summarized:
+            self._task = asyncio.create_task(self._write_notes(messages[: self._summarized]))
+
+    async def _write_notes(self, messages: List[dict]) -> Optional[Dict[str, Any]]:
+        # FlowManager doesn't expose its LLM; it's the call's LLM service.
+        llm = getattr(self._flow_manager, "_llm", None)
+        if llm is None:
+            return None
+        prompt = HANDOFF_PROMPT
+        if previous := self._flow_manager.state.get(STATE_KEY):
+            prompt += f"\nEarlier notes: {json.dumps(previous)}"
+        try:
+            reply = await summarize(llm, messages, prompt)
+        except Exception as e:
+            logger.warning(f"Couldn't write handoff notes: {e}")
+            return None
+        return _parse_notes(reply) if reply else None
+
+    async def apply(self):
+        """Start the node from the notes and the latest messages, if the notes are ready."""
+        if self._task is None:
+            return
+        try:
+            notes = await asyncio.wait_for(self._task, timeout=HANDOFF_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Handoff notes took over {HANDOFF_TIMEOUT}s, keeping the full context")
+            return
+        if not notes:
+            return
+
+        messages = _text_messages(self._flow_manager.get_current_context())
+        recent = messages[self._summarized :] if len(messages) >= self._summarized else []
+        self._flow_manager.state[STATE_KEY] = notes
+        notes_message = {"role": "system", "content": format_notes(notes, self._from_node)}
+        # Flows reads the node's messages and strategy after its pre-actions run.
+        self._node["task_messages"][:0] = [notes_message, *recent]
+        self._node["context_strategy"] = ContextStrategyConfig(strategy=ContextStrategy.RESET)
+        logger.info(
+            f"Handoff from {self._from_node}: {self._summarized} messages "
+            f"({len(transcript(messages[: self._summarized]))} chars) replaced by "
+            f"{len(notes_message['content'])} chars of notes"
+        )
+
+
+async def _apply_handoff(action: dict, flow_manager: FlowManager):
+    await action["handoff"].apply()
+
+
+def hand_off(flow_manager: FlowManager, node: NodeConfig) -> NodeConfig:
+    """Return ``node`` set to start from handoff notes instead of the full transcript.
+
+    Call it from the function that transfers control, so the notes are
+    written while the outgoing persona's reply plays.
+    """
+    node = {**node, "task_messages": list(node["task_messages"])}
+    handoff = Handoff(flow_manager, node)
+    action = {"type": "handoff_notes", "handler": _apply_handoff, "handoff": handoff}
+    node["pre_actions"] = [action, *node.get("pre_actions", [])]
+    return node
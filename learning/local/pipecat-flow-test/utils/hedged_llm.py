@@ -0,0 +1,298 @@
+"""Hedged LLM requests: race a backup model when the primary is slow to start.
+
+A turn can't speak until the LLM's first token arrives, and Gemini's time to
+first token (TTFT) has a long tail: most requests start in a few hundred
+milliseconds, a few take seconds. ``HedgedGoogleLLMService`` is a drop-in
+``GoogleLLMService`` that sends each streaming request to the primary model
+and, if no chunk has arrived by an adaptive deadline, sends the same request
+to a backup model (or the same model on another endpoint/key). Whichever
+produces a chunk first is streamed; the other request is cancelled.
+
+The deadline is the primary model's p95 TTFT over its recent requests
+(``DEADLINE_PERCENTILE``, clamped to ``MIN_DEADLINE_SECS`` /
+``MAX_DEADLINE_SECS``), so only the slowest few percent of turns pay for a
+second request. Until a model has ``MIN_SAMPLES`` TTFTs, ``DEFAULT_DEADLINE_SECS``
+is used. Stats are per model and per worker process; ``ttft_stats.snapshot()``
+has TTFT percentiles, hedges and wins for each::
+
+    llm = HedgedGoogleLLMService(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-2.0-flash-lite",
+        backup_model="gemini-2.0-flash",
+    )
+
+Only streamed requests (the pipeline's turns) are hedged; ``run_inference()``
+goes to the primary alone.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from google import genai
+from google.genai.types import HttpOptions
+from loguru import logger
+from pipecat.services.google.llm import GoogleLLMService
+
+BACKUP_MODEL = "gemini-2.0-flash"
+
+# TTFTs kept per model for the deadline.
+TTFT_WINDOW = 50
+MIN_SAMPLES = 5
+
+DEADLINE_PERCENTILE = 0.95
+DEFAULT_DEADLINE_SECS = 1.0
+MIN_DEADLINE_SECS = 0.3
+MAX_DEADLINE_SECS = 3.0
+
+
+def _percentile(values: Deque[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class ModelStats:
+    """Rolling TTFTs and hedging outcomes for one model."""
+
+    def __init__(self, model: str):
+        """Initialize empty stats for ``model``."""
+        self.model = model
+        self.ttfts: Deque[float] = deque(maxlen=TTFT_WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self.errors = 0
+
+    def record_ttft(self, secs: float):
+        """Add a TTFT sample."""
+        self.ttfts.append(secs)
+
+    def deadline(self) -> float:
+        """How long to wait for this model's first chunk before hedging."""
+        if len(self.ttfts) < MIN_SAMPLES:
+            return DEFAULT_DEADLINE_SECS
+        deadline = _percentile(self.ttfts, DEADLINE_PERCENTILE)
+        return min(max(deadline, MIN_DEADLINE_SECS), MAX_DEADLINE_SECS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """TTFT percentiles and request outcomes."""
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "errors": self.errors,
+            "ttft_p50_ms": round(_percentile(self.ttfts, 0.5) * 1000) if self.ttfts else None,
+            "ttft_p95_ms": round(_percentile(self.ttfts, 0.95) * 1000) if self.ttfts else None,
+            "deadline_ms": round(self.deadline() * 1000),
+        }
+
+
+class TTFTStats:
+    """Per-model TTFT stats for every hedged service in the process."""
+
+    def __init__(self):
+        """Initialize with no models."""
+        self._models: Dict[str, ModelStats] = {}
+
+    def get(self, model: str) -> ModelStats:
+        """Stats for ``model``, created on first use."""
+        if model not in self._models:
+            self._models[model] = ModelStats(model)
+        return self._models[model]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Every model's stats."""
+        return {model: stats.snapshot() for model, stats in self._models.items()}
+
+
+# The stats for this worker process.
+ttft_stats = TTFTStats()
+
+
+class _Attempt:
+    """One model's request, up to its first chunk."""
+
+    def __init__(self, models: Any, model: str, contents: Any, config: Any):
+        self.model = model
+        self.started_at = time.monotonic()
+        self.task = asyncio.create_task(self._open(models, contents, config))
+
+    async def _open(self, models: Any, contents: Any, config: Any) -> Tuple[AsyncIterator, Any]:
+        stream = await models.generate_content_stream(
+            model=self.model, contents=contents, config=config
+        )
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await _aclose(stream)
+            raise
+        return stream, first
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def succeeded(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is None
+
+    async def discard(self):
+        """Cancel the request, or close its stream if it already started."""
+        self.task.cancel()
+        try:
+            stream, _ = await self.task
+        except BaseException:
+            return
+        await _aclose(stream)
+
+
+async def _aclose(stream: Any):
+    aclose = getattr(stream, "aclose", None)
+    if aclose:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+async def _chain(first: Any, stream: AsyncIterator) -> AsyncIterator:
+    try:
+        if first is not None:
+            yield first
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await _aclose(stream)
+
+
+class _HedgedModels:
+    """``client.aio.models`` with hedged ``generate_content_stream()``."""
+
+    def __init__(self, primary: Any, backup: Any, backup_model: str, stats: TTFTStats):
+        self._primary = primary
+        self._backup = backup
+        self._backup_model = backup_model
+        self._stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._primary, name)
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None):
+        primary_stats = self._stats.get(model)
+        primary_stats.requests += 1
+        deadline = primary_stats.deadline()
+
+        primary = _Attempt(self._primary, model, contents, config)
+        attempts = [primary]
+        winner: Optional[_Attempt] = None
+        try:
+            await asyncio.wait({primary.task}, timeout=deadline)
+            if not primary.succeeded():
+                reason = "failed" if primary.task.done() else f"no token in {deadline * 1000:.0f}ms"
+                logger.info(f"LLM {model} {reason}, hedging with {self._backup_model}")
+                primary_stats.hedges += 1
+                self._stats.get(self._backup_model).requests += 1
+                attempts.append(_Attempt(self._backup, self._backup_model, contents, config))
+
+            pending = {attempt.task for attempt in attempts if not attempt.task.done()}
+            while winner is None:
+                winner = next((attempt for attempt in attempts if attempt.succeeded()), None)
+                if winner or not pending:
+                    break
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # Interrupted (usually barge-in) before any first token: how long
+            # the attempts had waited says nothing about the models.
+            for attempt in attempts:
+                asyncio.create_task(attempt.discard())
+            raise
+
+        for attempt in attempts:
+            if attempt is winner:
+                continue
+            if attempt.task.done() and not attempt.succeeded():
+                self._stats.get(attempt.model).errors += 1
+            elif winner is not None:
+                # Lost the race while still waiting for its first token, so
+                # its TTFT is at least this long. Without it, slow models
+                # would look fast.
+                self._stats.get(attempt.model).record_ttft(attempt.elapsed())
+            asyncio.create_task(attempt.discard())
+
+        if winner is None:
+            # Every attempt failed: surface the primary's error.
+            return await primary.task
+
+        winner_stats = self._stats.get(winner.model)
+        winner_stats.record_ttft(winner.elapsed())
+        winner_stats.wins += 1
+        if winner is not primary:
+            logger.info(f"LLM hedge won by {winner.model} ({winner.elapsed() * 1000:.0f}ms)")
+        stream, first = winner.task.result()
+        return _chain(first, stream)
+
+
+class _HedgedAio:
+    def __init__(self, primary: Any, models: _HedgedModels):
+        self._primary = primary
+        self.models = models
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._primary, name)
+
+
+class _HedgedClient:
+    """A ``genai.Client`` whose async streaming requests are hedged."""
+
+    def __init__(
+        self, primary: genai.Client, backup: genai.Client, backup_model: str, stats: TTFTStats
+    ):
+        self._primary = primary
+        self.aio = _HedgedAio(
+            primary.aio, _HedgedModels(primary.aio.models, backup.aio.models, backup_model, stats)
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._primary, name)
+
+
+class HedgedGoogleLLMService(GoogleLLMService):
+    """``GoogleLLMService`` that hedges slow first tokens with a backup model."""
+
+    def __init__(
+        self,
+        *,
+        backup_model: Optional[str] = None,
+        backup_api_key: Optional[str] = None,
+        backup_http_options: Optional[HttpOptions] = None,
+        stats: Optional[TTFTStats] = None,
+        **kwargs,
+    ):
+        """Initialize the service.
+
+        Args:
+            backup_model: Model raced against the primary when it's slow.
+                Defaults to ``LLM_BACKUP_MODEL`` or ``BACKUP_MODEL``.
+            backup_api_key: API key for the backup. Defaults to the primary's.
+            backup_http_options: HTTP options (e.g. another endpoint) for the
+                backup. Defaults to the primary's.
+            stats: Where TTFTs are kept. Defaults to ``ttft_stats``.
+            **kwargs: Passed to ``GoogleLLMService``.
+        """
+        # Set before super().__init__(), which calls create_client().
+        self._backup_model = backup_model or os.getenv("LLM_BACKUP_MODEL", BACKUP_MODEL)
+        self._backup_api_key = backup_api_key
+        self._backup_http_options = backup_http_options
+        self._ttft_stats = stats or ttft_stats
+        super().__init__(**kwargs)
+
+    def create_client(self):
+        """Create the primary and backup clients, hedged behind one client."""
+        super().create_client()
+        backup = genai.Client(
+            api_key=self._backup_api_key or self._api_key,
+            http_options=self._backup_http_options or self._http_options,
+        )
+        self._client = _HedgedClient(self._client, backup, self._backup_model, self._ttft_stats)
@@ -0,0 +1,351 @@
+"""Pick the caller's language from their first utterance, with parallel Deepgram streams.
+
+``LiveOptions(language=...)`` fixes one language per deployment. For callers
+who may speak one of a few languages, ``LanguageIdDeepgramSTTService`` opens
+one extra Deepgram stream per candidate language next to the main one, and
+sends the caller's audio to all of them until it knows which language it is:
+
+- when the caller stops speaking (or after ``LID_WINDOW_SECS`` of speech),
+  every stream finalizes, and the language whose final transcripts have the
+  most confident words wins;
+- the winner's stream becomes the service's connection and its transcripts
+  so far are pushed; the other streams are closed.
+
+Transcripts are held back until then, so the first utterance reaches the LLM
+up to ``COMMIT_GRACE_SECS`` later than it would otherwise; later utterances
+aren't affected. ``language_id_stats.snapshot()`` has how long identification
+took, how often it switched language, and what the extra streams cost::
+
+    stt = LanguageIdDeepgramSTTService(
+        api_key=os.getenv("DEEPGRAM_API_KEY"),
+        live_options=LiveOptions(model="nova-2", language=Language.HI),
+        candidates=languages_from_env("STT_CANDIDATE_LANGUAGES", [Language.MR]),
+    )
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+
+from deepgram import AsyncListenWebSocketClient, LiveResultResponse, LiveTranscriptionEvents
+from loguru import logger
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    Frame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.services.deepgram.stt import DeepgramSTTService
+from pipecat.transcriptions.language import Language
+
+from utils.stt_prewarm import PrewarmedDeepgramSTTService
+
+# Longest the caller speaks before the language is picked anyway.
+LID_WINDOW_SECS = 3.0
+
+# Longest to wait for every stream's final transcript once the caller stops.
+COMMIT_GRACE_SECS = 0.4
+
+
+def languages_from_env(name: str, default: Sequence[Language]) -> List[Language]:
+    """Languages from a comma-separated environment variable ("mr,ta"), or ``default``."""
+    value = os.getenv(name)
+    if value is None:
+        return list(default)
+    return [Language(code.strip()) for code in value.split(",") if code.strip()]
+
+
+class _Score:
+    """One language's final transcripts while identifying."""
+
+    def __init__(self):
+        self.results: List[LiveResultResponse] = []
+        self.words = 0
+        self.confidence = 0.0
+
+    def add(self, result: LiveResultResponse):
+        self.results.append(result)
+        alternative = result.channel.alternatives[0] if result.channel.alternatives else None
+        if alternative and alternative.transcript:
+            words = len(alternative.words) or len(alternative.transcript.split())
+            self.words += words
+            self.confidence += alternative.confidence * words
+
+
+class LanguageIdStats:
+    """Language identification outcomes and costs, for every call in the process."""
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self.calls = 0
+        self.switches = 0
+        self._languages: Counter = Counter()
+        self._identify_secs = 0.0
+        self._max_identify_secs = 0.0
+        self._extra_audio_secs = 0.0
+        self._extra_send_secs = 0.0
+
+    def record(
+        self,
+        language: str,
+        switched: bool,
+        identify_secs: float,
+        extra_audio_secs: float,
+        extra_send_secs: float,
+    ):
+        """Add one call's identification."""
+        self.calls += 1
+        self.switches += switched
+        self._languages[language] += 1
+        self._identify_secs += identify_secs
+        self._max_identify_secs = max(self._max_identify_secs, identify_secs)
+        self._extra_audio_secs += extra_audio_secs
+        self._extra_send_secs += extra_send_secs
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Calls per language, switches, identification time and extra streaming.
+
+        ``extra_audio_secs`` is audio sent to the streams that were dropped (what
+        Deepgram bills on top); ``extra_send_ms`` is event loop time spent
+        sending it.
+        """
+        return {
+            "calls": self.calls,
+            "by_language": dict(self._languages),
+            "switches": self.switches,
+            "avg_identify_ms": round(self._identify_secs / self.calls * 1000)
+            if self.calls
+            else None,
+            "max_identify_ms": round(self._max_identify_secs * 1000),
+            "extra_audio_secs": round(self._extra_audio_secs, 1),
+            "extra_send_ms": round(self._extra_send_secs * 1000),
+        }
+
+
+# The stats for this worker process.
+language_id_stats = LanguageIdStats()
+
+
+class LanguageIdDeepgramSTTService(PrewarmedDeepgramSTTService):
+    """Deepgram STT that picks the caller's language among candidates on their first utterance.
+
+    The language in ``live_options`` is the main one: it wins ties, and is
+    used alone when there are no candidates.
+    """
+
+    def __init__(
+        self,
+        *,
+        candidates: Sequence[Language] = (),
+        window_secs: float = LID_WINDOW_SECS,
+        **kwargs,
+    ):
+        """Initialize the service.
+
+        Args:
+            candidates: Other languages the caller may speak.
+            window_secs: Longest the caller speaks before the language is picked.
+            **kwargs: Arguments for ``PrewarmedDeepgramSTTService``.
+        """
+        super().__init__(**kwargs)
+        self._primary = self._settings["language"]
+        self._candidates = [str(language) for language in candidates if language != self._primary]
+        self._window_secs = window_secs
+        self._streams: Dict[str, AsyncListenWebSocketClient] = {}
+        self._stream_rates: Dict[str, int] = {}
+        self._scores: Dict[str, _Score] = {}
+        self._finalized: set = set()
+        self._committed: Optional[str] = None if self._candidates else self._primary
+        self._speech_started: Optional[float] = None
+        self._commit_task: Optional[asyncio.Task] = None
+        self._extra_audio_bytes = 0
+        self._extra_send_secs = 0.0
+
+    @property
+    def language(self) -> str:
+        """The language transcribed: the main one until identification picks another."""
+        return self._committed or self._primary
+
+    async def prewarm(self) -> bool:
+        """Open the main connection and the candidate streams now."""
+        warm, _ = await asyncio.gather(
+            super().prewarm(), self._connect_candidates(self._prewarm_sample_rate)
+        )
+        return warm
+
+    async def close_warm(self):
+        """Close the connections opened by ``prewarm()``, if the call never took them."""
+        await super().close_warm()
+        await self._disconnect_candidates()
+
+    async def stop(self, frame: EndFrame):
+        """Stop the service and any candidate streams still open."""
+        await super().stop(frame)
+        await self._disconnect_candidates()
+
+    async def cancel(self, frame: CancelFrame):
+        """Cancel the service and any candidate streams still open."""
+        await super().cancel(frame)
+        await self._disconnect_candidates()
+
+    async def run_stt(self, audio: bytes) -> AsyncGenerator[Frame, None]:
+        """Send audio to the main connection and, while identifying, to every candidate."""
+        if self._committed is None and self._streams:
+            start_time = time.perf_counter()
+            for stream in list(self._streams.values()):
+                await stream.send(audio)
+            self._extra_send_secs += time.perf_counter() - start_time
+            self._extra_audio_bytes += len(audio) * len(self._streams)
+        async for frame in super().run_stt(audio):
+            yield frame
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        """Time the identification window from the caller's speech."""
+        await super().process_frame(frame, direction)
+        if self._committed is not None:
+            return
+        if isinstance(frame, UserStartedSpeakingFrame) and self._speech_started is None:
+            self._speech_started = time.monotonic()
+            self._commit_task = asyncio.create_task(self._commit_after(self._window_secs))
+        elif isinstance(frame, UserStoppedSpeakingFrame) and self._speech_started is not None:
+            # The main connection was finalized by the base class.
+            for stream in list(self._streams.values()):
+                await stream.finalize()
+            if self._commit_task:
+                self._commit_task.cancel()
+            self._commit_task = asyncio.create_task(self._commit_after(COMMIT_GRACE_SECS))
+
+    async def _connect(self):
+        await asyncio.gather(super()._connect(), self._connect_candidates())
+
+    async def _connect_candidates(self, sample_rate: Optional[int] = None):
+        if self._committed is not None:
+            return
+        sample_rate = sample_rate or self._settings["sample_rate"]
+
+        async def connect(language: str):
+            stream = self._streams.get(language)
+            if stream is not None:
+                if self._stream_rates[language] == sample_rate and await stream.is_connected():
+                    return
+                await stream.finish()
+            stream = self._client.listen.asyncwebsocket.v("1")
+            stream.on(LiveTranscriptionEvents(LiveTranscriptionEvents.Transcript), self._on_message)
+            stream.on(LiveTranscriptionEvents(LiveTranscriptionEvents.Error), self._on_error)
+            options = {**self._settings, "language": language, "sample_rate": sample_rate}
+            if not await stream.start(options=options, addons=self._addons):
+                logger.warning(f"{self}: couldn't open the {language} stream")
+                self._streams.pop(language, None)
+                return
+            self._streams[language] = stream
+            self._stream_rates[language] = sample_rate
+
+        await asyncio.gather(*(connect(language) for language in self._candidates))
+
+    async def _disconnect_candidates(self):
+        if self._commit_task:
+            self._commit_task.cancel()
+        streams = list(self._streams.values())
+        self._streams.clear()
+        for stream in streams:
+            if await stream.is_connected():
+                await stream.finish()
+
+    def _language_of(self, connection) -> Optional[str]:
+        if connection is self._connection:
+            return self._settings["language"]
+        for language, stream in self._streams.items():
+            if stream is connection:
+                return language
+        return None
+
+    async def _on_message(self, *args, **kwargs):
+        connection = args[0] if args else self._connection
+        if self._committed is not None:
+            # Late results from a dropped stream are ignored.
+            if connection is self._connection:
+                await super()._on_message(*args, **kwargs)
+            return
+        language = self._language_of(connection)
+        result: LiveResultResponse = kwargs["result"]
+        if language is None or not result.is_final:
+            return
+        self._scores.setdefault(language, _Score()).add(result)
+        if result.from_finalize:
+            self._finalized.add(language)
+            if len(self._finalized) > len(self._streams):
+                await self._commit("every stream finalized")
+
+    async def _on_error(self, *args, **kwargs):
+        connection = args[0] if args else self._connection
+        if connection is self._connection:
+            await super()._on_error(*args, **kwargs)
+            return
+        # A candidate stream failed: identify without it.
+        language = self._language_of(connection)
+        if language is not None:
+            logger.warning(f"{self}: {language} stream error, dropping it: {kwargs.get('error')}")
+            self._streams.pop(language, None)
+
+    async def _commit_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self._commit_task = None
+        await self._commit("timeout")
+
+    async def _commit(self, reason: str):
+        if self._committed is not None:
+            return
+        if self._commit_task and self._commit_task is not asyncio.current_task():
+            self._commit_task.cancel()
+
+        primary = self._settings["language"]
+        winner = primary
+        for language in self._streams:
+            score, best = self._scores.get(language), self._scores.get(winner)
+            if score and score.confidence > (best.confidence if best else 0.0):
+                winner = language
+        self._committed = winner
+
+        dropped = [stream for language, stream in self._streams.items() if language != winner]
+        if winner != primary:
+            # The winner's stream becomes the connection transcripts come from.
+            dropped.append(self._connection)
+            self._connection = self._streams[winner]
+            self._settings["language"] = winner
+            if self.vad_enabled:
+                self._connection.on(
+                    LiveTranscriptionEvents(LiveTranscriptionEvents.SpeechStarted),
+                    self._on_speech_started,
+                )
+                self._connection.on(
+                    LiveTranscriptionEvents(LiveTranscriptionEvents.UtteranceEnd),
+                    self._on_utterance_end,
+                )
+        self._streams.clear()
+
+        winner_score = self._scores.get(winner)
+        for result in winner_score.results if winner_score else []:
+            await DeepgramSTTService._on_message(self, result=result)
+
+        identify_secs = time.monotonic() - self._speech_started if self._speech_started else 0.0
+        extra_audio_secs = (
+            self._extra_audio_bytes / (2 * self.sample_rate) if self.sample_rate else 0
+        )
+        language_id_stats.record(
+            winner, winner != primary, identify_secs, extra_audio_secs, self._extra_send_secs
+        )
+        scores = {
+            language: f"{score.words} words, {score.confidence:.2f}"
+            for language, score in self._scores.items()
+        }
+        logger.info(
+            f"{self}: identified {winner} in {identify_secs * 1000:.0f}ms ({reason}; {scores})"
+        )
+
+        for stream in dropped:
+            if await stream.is_connected():
+                await stream.finish()
@@ -0,0 +1,421 @@
+"""Latency-aware routing of LLM turns across providers.
+
+``create_llm()`` builds one LLM service for a provider (``LLM_PROVIDER``:
+google, openai, anthropic or aws). ``create_router()`` builds an
+``LLMRouter`` holding a service for each provider in ``LLM_PROVIDERS`` whose
+credentials are set, and sends every turn to the provider that best fits the
+current node's policy:
+
+- providers above the policy's error rate or cost are skipped;
+- with a TTFT budget, the cheapest provider whose p95 TTFT fits it is used;
+- otherwise (or if none fits) the one with the lowest p95 TTFT is.
+
+TTFTs and errors are measured on every turn and kept per provider for the
+whole worker process (``router_stats``), so each call starts from what
+earlier calls saw. A small share of turns (``EXPLORE_RATE``) goes to another
+provider so stats for providers that aren't winning stay fresh.
+
+``LLMRouter`` is an ``LLMSwitcher``: functions registered by the flow manager
+are registered on every provider, and with the universal ``LLMContext`` each
+provider's adapter translates the context and function schemas itself.
+
+Nodes set their policy with a ``route_policy()`` pre-action. It holds for
+that node only; nodes without one use the router's default policy::
+
+    llm = create_router()
+    flow_manager = FlowManager(task=task, llm=llm, ...)
+    llm.attach(flow_manager)
+
+    def create_initial_node() -> NodeConfig:
+        return {
+            "name": "initial",
+            "pre_actions": [route_policy(max_ttft_ms=800)],
+            ...
+        }
+"""
+
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pipecat.frames.frames import (
+    ErrorFrame,
+    Frame,
+    FunctionCallsStartedFrame,
+    LLMContextFrame,
+    LLMFullResponseEndFrame,
+    LLMTextFrame,
+    ManuallySwitchServiceFrame,
+)
+from pipecat.pipeline.llm_switcher import LLMSwitcher
+from pipecat.pipeline.service_switcher import ServiceSwitcherStrategyManual
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.llm_service import LLMService
+from pipecat_flows import FlowManager
+from pipecat_flows.types import ActionConfig
+
+# TTFTs kept per provider, and how many are needed before they're trusted.
+TTFT_WINDOW = 50
+MIN_SAMPLES = 5
+
+# TTFT assumed for a provider without enough samples.
+DEFAULT_TTFT_SECS = 1.0
+
+# Errors older than this no longer count, so a failing provider gets retried.
+ERROR_WINDOW_SECS = 120.0
+MIN_ERROR_SAMPLES = 3
+
+EXPLORE_RATE = 0.02
+
+ROUTE_POLICY_ACTION = "llm_route_policy"
+
+
+def _google(model: str) -> LLMService:
+    from pipecat.services.google.llm import GoogleLLMService
+
+    return GoogleLLMService(api_key=os.getenv("GOOGLE_API_KEY"), model=model)
+
+
+def _openai(model: str) -> LLMService:
+    from pipecat.services.openai.llm import OpenAILLMService
+
+    return OpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model=model)
+
+
+def _anthropic(model: str) -> LLMService:
+    from pipecat.services.anthropic.llm import AnthropicLLMService
+
+    return AnthropicLLMService(api_key=os.getenv("ANTHROPIC_API_KEY"), model=model)
+
+
+def _aws(model: str) -> LLMService:
+    from pipecat.services.aws.llm import AWSBedrockLLMService
+
+    return AWSBedrockLLMService(model=model, aws_region=os.getenv("AWS_REGION", "us-east-1"))
+
+
+@dataclass
+class ProviderConfig:
+    """How to build one provider's LLM service.
+
+    Parameters:
+        factory: Builds the service for a model.
+        credentials_env: Environment variable that must be set to use it.
+        model: Default model.
+        cost_per_mtok: Input price of the default model, in USD per million
+            tokens, for cost budgets.
+    """
+
+    factory: Callable[[str], LLMService]
+    credentials_env: str
+    model: str
+    cost_per_mtok: float
+
+
+PROVIDERS: Dict[str, ProviderConfig] = {
+    "google": ProviderConfig(_google, "GOOGLE_API_KEY", "gemini-2.0-flash-lite", 0.075),
+    "openai": ProviderConfig(_openai, "OPENAI_API_KEY", "gpt-4.1-mini", 0.40),
+    "anthropic": ProviderConfig(_anthropic, "ANTHROPIC_API_KEY", "claude-3-5-haiku-latest", 0.80),
+    "aws": ProviderConfig(_aws, "AWS_ACCESS_KEY_ID", "us.amazon.nova-lite-v1:0", 0.06),
+}
+
+
+def create_llm(provider: Optional[str] = None, model: Optional[str] = None) -> LLMService:
+    """Create an LLM service for one provider.
+
+    Args:
+        provider: One of ``PROVIDERS``. Defaults to ``LLM_PROVIDER`` or "google".
+        model: Model to use. Defaults to the provider's default model.
+    """
+    provider = (provider or os.getenv("LLM_PROVIDER", "google")).lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{provider}', expected one of {list(PROVIDERS)}")
+    config = PROVIDERS[provider]
+    return config.factory(model or config.model)
+
+
+def _percentile(values: Deque[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class ProviderStats:
+    """Rolling TTFTs and errors for one provider."""
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self.ttfts: Deque[float] = deque(maxlen=TTFT_WINDOW)
+        # (time, failed) for recent turns.
+        self.outcomes: Deque[Tuple[float, bool]] = deque(maxlen=TTFT_WINDOW)
+        self.turns = 0
+
+    def record(self, ttft: Optional[float]):
+        """Record a finished turn; ``ttft`` is ``None`` if it produced nothing."""
+        self.turns += 1
+        self.outcomes.append((time.monotonic(), ttft is None))
+        if ttft is not None:
+            self.ttfts.append(ttft)
+
+    def record_error(self):
+        """Record a turn that failed."""
+        self.record(None)
+
+    def expected_ttft(self) -> float:
+        """p95 TTFT, or ``DEFAULT_TTFT_SECS`` without enough samples."""
+        if len(self.ttfts) < MIN_SAMPLES:
+            return DEFAULT_TTFT_SECS
+        return _percentile(self.ttfts, 0.95)
+
+    def error_rate(self) -> float:
+        """Share of recent turns that failed."""
+        since = time.monotonic() - ERROR_WINDOW_SECS
+        recent = [failed for at, failed in self.outcomes if at >= since]
+        if len(recent) < MIN_ERROR_SAMPLES:
+            return 0.0
+        return sum(recent) / len(recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """TTFT percentiles and error rate."""
+        return {
+            "turns": self.turns,
+            "ttft_p50_ms": round(_percentile(self.ttfts, 0.5) * 1000) if self.ttfts else None,
+            "ttft_p95_ms": round(_percentile(self.ttfts, 0.95) * 1000) if self.ttfts else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class RouterStats:
+    """Per-provider stats for every router in the process."""
+
+    def __init__(self):
+        """Initialize with no providers."""
+        self._providers: Dict[str, ProviderStats] = {}
+
+    def get(self, provider: str) -> ProviderStats:
+        """Stats for ``provider``, created on first use."""
+        if provider not in self._providers:
+            self._providers[provider] = ProviderStats()
+        return self._providers[provider]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Every provider's stats."""
+        return {name: stats.snapshot() for name, stats in self._providers.items()}
+
+
+# The stats for this worker process.
+router_stats = RouterStats()
+
+
+@dataclass
+class RoutePolicy:
+    """What a node needs from its LLM.
+
+    Parameters:
+        max_ttft_ms: TTFT budget. The cheapest provider within it is used.
+        max_cost_per_mtok: Most a provider may cost, in USD per million
+            input tokens.
+        max_error_rate: Providers failing more often than this are skipped.
+        providers: Only route to these providers. Defaults to all.
+    """
+
+    max_ttft_ms: Optional[float] = None
+    max_cost_per_mtok: Optional[float] = None
+    max_error_rate: float = 0.2
+    providers: List[str] = field(default_factory=list)
+
+
+def route_policy(**policy) -> ActionConfig:
+    """A node pre-action setting the router's policy for that node.
+
+    Args:
+        **policy: ``RoutePolicy`` fields.
+    """
+    return {
+        "type": ROUTE_POLICY_ACTION,
+        "handler": _apply_route_policy,
+        "policy": RoutePolicy(**policy),
+    }
+
+
+async def _apply_route_policy(action: dict, flow_manager: FlowManager):
+    router = flow_manager.state.get("llm_router")
+    if router is None:
+        logger.warning("Node has a route policy but no LLMRouter is attached to the flow")
+        return
+    router.set_node_policy(action["policy"])
+
+
+class _Turn:
+    """The provider's turn in progress."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ttft: Optional[float] = None
+
+
+class LLMRouter(LLMSwitcher):
+    """An ``LLMSwitcher`` that picks the provider for each turn from live stats."""
+
+    def __init__(
+        self,
+        services: Dict[str, LLMService],
+        *,
+        costs: Optional[Dict[str, float]] = None,
+        default_policy: Optional[RoutePolicy] = None,
+        stats: Optional[RouterStats] = None,
+    ):
+        """Initialize the router.
+
+        Args:
+            services: LLM service per provider name. The first is used until
+                there are stats to choose by.
+            costs: USD per million input tokens per provider. Defaults to
+                ``PROVIDERS``' prices.
+            default_policy: Policy for nodes without a ``route_policy()``.
+            stats: Where TTFTs and errors are kept. Defaults to ``router_stats``.
+        """
+        super().__init__(list(services.values()), ServiceSwitcherStrategyManual)
+        self._services = services
+        self._names = {id(service): name for name, service in services.items()}
+        self._costs = costs or {
+            name: PROVIDERS[name].cost_per_mtok for name in services if name in PROVIDERS
+        }
+        self._default_policy = default_policy or RoutePolicy()
+        self._stats = stats or router_stats
+        self._turns: Dict[str, _Turn] = {}
+
+        self._flow_manager: Optional[FlowManager] = None
+        self._node_policy: Optional[RoutePolicy] = None
+        self._policy_set_at: Optional[str] = None
+        self._policy_node: Optional[str] = None
+
+        for name, service in services.items():
+            service.add_event_handler("on_before_process_frame", self._on_service_input)
+            service.add_event_handler("on_before_push_frame", self._on_service_output)
+
+    def attach(self, flow_manager: FlowManager):
+        """Let nodes of ``flow_manager`` set policies with ``route_policy()``."""
+        self._flow_manager = flow_manager
+        flow_manager.state["llm_router"] = self
+
+    def set_node_policy(self, policy: RoutePolicy):
+        """Use ``policy`` for the node being entered."""
+        self._node_policy = policy
+        # Pre-actions run before the flow manager switches nodes: the policy
+        # belongs to whichever node is current at the next turn.
+        self._policy_set_at = self._current_node()
+        self._policy_node = None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Stats and cost of each of this router's providers."""
+        return {
+            name: {**self._stats.get(name).snapshot(), "cost_per_mtok": self._costs.get(name)}
+            for name in self._services
+        }
+
+    def _current_node(self) -> Optional[str]:
+        return self._flow_manager.current_node if self._flow_manager else None
+
+    def _policy(self) -> RoutePolicy:
+        if self._node_policy is None:
+            return self._default_policy
+        node = self._current_node()
+        if self._policy_node is None and node != self._policy_set_at:
+            self._policy_node = node
+        elif self._policy_node is not None and node != self._policy_node:
+            # A later node without a policy of its own.
+            self._node_policy = None
+            return self._default_policy
+        return self._node_policy
+
+    def _choose(self, policy: RoutePolicy) -> str:
+        names = [
+            name for name in self._services if not policy.providers or name in policy.providers
+        ]
+        names = names or list(self._services)
+        healthy = [
+            name for name in names if self._stats.get(name).error_rate() <= policy.max_error_rate
+        ] or names
+        affordable = [
+            name
+            for name in healthy
+            if policy.max_cost_per_mtok is None
+            or self._costs.get(name, 0.0) <= policy.max_cost_per_mtok
+        ] or [min(healthy, key=lambda name: self._costs.get(name, 0.0))]
+
+        if len(affordable) > 1 and random.random() < EXPLORE_RATE:
+            return random.choice(affordable)
+
+        if policy.max_ttft_ms is not None:
+            budget = policy.max_ttft_ms / 1000
+            within = [
+                name for name in affordable if self._stats.get(name).expected_ttft() <= budget
+            ]
+            if within:
+                return min(within, key=lambda name: self._costs.get(name, 0.0))
+        return min(affordable, key=lambda name: self._stats.get(name).expected_ttft())
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        """Route each context to the best provider before it reaches the LLMs."""
+        if isinstance(frame, LLMContextFrame) and direction == FrameDirection.DOWNSTREAM:
+            name = self._choose(self._policy())
+            service = self._services[name]
+            if service is not self.active_llm:
+                logger.info(
+                    f"LLM router: {name} for node {self._current_node()} "
+                    f"(p95 TTFT {self._stats.get(name).expected_ttft() * 1000:.0f}ms)"
+                )
+                await super().process_frame(ManuallySwitchServiceFrame(service=service), direction)
+
+        await super().process_frame(frame, direction)
+
+    def _on_service_input(self, service: FrameProcessor, frame: Frame):
+        if isinstance(frame, LLMContextFrame):
+            # A turn still open here was interrupted: it says nothing about the provider.
+            self._turns[self._names[id(service)]] = _Turn()
+
+    def _on_service_output(self, service: FrameProcessor, frame: Frame):
+        name = self._names[id(service)]
+        turn = self._turns.get(name)
+        if turn is None:
+            return
+        if isinstance(frame, (LLMTextFrame, FunctionCallsStartedFrame)) and turn.ttft is None:
+            turn.ttft = time.monotonic() - turn.started_at
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            # Some services log and swallow request errors, so an empty
+            # response counts as a failure too.
+            del self._turns[name]
+            self._stats.get(name).record(turn.ttft)
+        elif isinstance(frame, ErrorFrame):
+            del self._turns[name]
+            self._stats.get(name).record_error()
+
+
+def create_router(
+    providers: Optional[List[str]] = None, *, default_policy: Optional[RoutePolicy] = None
+) -> LLMRouter:
+    """Create an ``LLMRouter`` over every configured provider.
+
+    Args:
+        providers: Provider names, in order of preference. Defaults to
+            ``LLM_PROVIDERS`` (comma-separated) or ``LLM_PROVIDER``. Providers
+            without credentials are left out.
+        default_policy: Policy for nodes without a ``route_policy()``.
+    """
+    if providers is None:
+        providers = os.getenv("LLM_PROVIDERS", os.getenv("LLM_PROVIDER", "google")).split(",")
+    services = {}
+    for provider in (name.strip().lower() for name in providers):
+        if provider in PROVIDERS and not os.getenv(PROVIDERS[provider].credentials_env):
+            logger.warning(
+                f"LLM router: skipping {provider}, {PROVIDERS[provider].credentials_env} not set"
+            )
+            continue
+        services[provider] = create_llm(provider)
+    if not services:
+        raise ValueError(f"No LLM provider configured out of {providers}")
+    return LLMRouter(services, default_policy=default_policy)
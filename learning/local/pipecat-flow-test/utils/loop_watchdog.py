@@ -0,0 +1,183 @@
+"""Event-loop lag watchdog that catches blocking calls in the act.
+
+Every call in a worker shares one asyncio loop, so a synchronous call on it
+(an LLM ``invoke()``, a blocking TTS download, file I/O) freezes audio for all
+of them. ``LoopWatchdog`` has two halves:
+
+- A heartbeat task on the loop wakes every ``interval_secs`` and records how
+  late it woke up in a lag histogram.
+- A watcher thread checks the heartbeat. When it's more than
+  ``threshold_secs`` overdue, the loop is blocked right now, so the thread
+  grabs the loop thread's Python stack. It tags the stack with the pipeline
+  processor that's running (the innermost ``FrameProcessor`` on the stack) and
+  the session that processor belongs to.
+
+The stack is captured at most once per stall, so the cost in normal running
+is one short sleep per interval on each side::
+
+    async def bot(runner_args):
+        loop_watchdog.start()
+        ...
+        session.add("pipeline_task", task)  # lets stalls be tagged with the session
+"""
+
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from loguru import logger
+from pipecat.processors.frame_processor import FrameProcessor
+
+from utils.sessions import sessions
+
+INTERVAL_SECS = 0.05
+THRESHOLD_SECS = 0.1
+
+# Upper bounds of the lag histogram buckets, in milliseconds.
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+# How many recent stall reports to keep.
+MAX_REPORTS = 20
+
+
+@dataclass
+class StallReport:
+    """What the loop was doing when it stalled.
+
+    Parameters:
+        started_at: Wall-clock time the heartbeat was last seen on time.
+        blocked_secs: How long the loop was blocked, updated when it recovers.
+        session: The ``Session`` the blocking processor belongs to, if known.
+        processor: Name of the innermost pipeline processor on the stack.
+        task: Name of the asyncio task that was running.
+        stack: The loop thread's stack, outermost frame first.
+    """
+
+    started_at: float
+    blocked_secs: float
+    session: Optional[str]
+    processor: Optional[str]
+    task: Optional[str]
+    stack: List[str] = field(default_factory=list)
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and captures the stack of whatever blocks it."""
+
+    def __init__(
+        self, *, interval_secs: float = INTERVAL_SECS, threshold_secs: float = THRESHOLD_SECS
+    ):
+        """Initialize the watchdog.
+
+        Args:
+            interval_secs: Heartbeat period; also the lag measurement resolution.
+            threshold_secs: Heartbeat delay at which the blocking stack is captured.
+        """
+        self._interval_secs = interval_secs
+        self._threshold_secs = threshold_secs
+
+        self._histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self._max_lag_secs = 0.0
+        self._reports: Deque[StallReport] = deque(maxlen=MAX_REPORTS)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._stalled: Optional[StallReport] = None
+
+    def start(self):
+        """Start watching the running loop. Safe to call once per session."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Lag histogram and the most recent stalls."""
+        labels = [f"<={ms}ms" for ms in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        return {
+            "lag_histogram": dict(zip(labels, self._histogram)),
+            "max_lag_ms": round(self._max_lag_secs * 1000, 1),
+            "stalls": [
+                {
+                    "blocked_ms": round(report.blocked_secs * 1000),
+                    "session": report.session,
+                    "processor": report.processor,
+                    "task": report.task,
+                    "where": report.stack[-1].strip() if report.stack else None,
+                }
+                for report in self._reports
+            ],
+        }
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self._interval_secs)
+            now = time.monotonic()
+            self._last_beat = now
+            self._record_lag(max(0.0, now - before - self._interval_secs))
+
+            stalled = self._stalled
+            if stalled:
+                self._stalled = None
+                stalled.blocked_secs = now - before - self._interval_secs
+                logger.warning(
+                    f"Event loop was blocked for {stalled.blocked_secs * 1000:.0f}ms "
+                    f"(session {stalled.session}, processor {stalled.processor})"
+                )
+
+    def _record_lag(self, lag_secs: float):
+        self._histogram[bisect.bisect_left(LAG_BUCKETS_MS, lag_secs * 1000)] += 1
+        self._max_lag_secs = max(self._max_lag_secs, lag_secs)
+
+    def _watch(self):
+        while True:
+            time.sleep(self._interval_secs)
+            overdue = time.monotonic() - self._last_beat - self._interval_secs
+            if overdue > self._threshold_secs and self._stalled is None:
+                self._stalled = self._capture(overdue)
+
+    def _capture(self, overdue: float) -> StallReport:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame else []
+
+        processor = None
+        walker = frame
+        while walker is not None and processor is None:
+            candidate = walker.f_locals.get("self")
+            if isinstance(candidate, FrameProcessor):
+                processor = candidate
+            walker = walker.f_back
+
+        session = sessions.session_for_processor(processor) if processor else None
+        task = asyncio.tasks._current_tasks.get(self._loop)
+
+        report = StallReport(
+            started_at=time.time() - overdue,
+            blocked_secs=overdue,
+            session=str(session) if session else None,
+            processor=processor.name if processor else None,
+            task=task.get_name() if task else None,
+            stack=stack,
+        )
+        self._reports.append(report)
+        logger.warning(
+            f"Event loop blocked for {overdue * 1000:.0f}ms so far "
+            f"(session {report.session}, processor {report.processor}, task {report.task}):\n"
+            + "".join(stack)
+        )
+        return report
+
+
+# The watchdog for this worker process.
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,242 @@
+"""Pacing and jitter metrics for bot audio going through ``transport.output()``.
+
+When a worker runs short of CPU the first symptom is choppy bot audio:
+chunks leave the output transport late or the TTS can't keep its queue fed.
+``OutputPacingMonitor`` measures that per session with two pass-through taps
+around the output transport, used the same way as
+``LLMContextAggregatorPair``::
+
+    pacing = OutputPacingMonitor()
+    pipeline = Pipeline(
+        [
+            ...,
+            tts,
+            pacing.arrivals(),  # TTS audio reaching the output transport
+            transport.output(),
+            pacing.playout(),  # Audio the output transport has just played
+            ...,
+        ]
+    )
+
+The output transport pushes every chunk downstream right after writing it, so
+the playout tap sees the real playout times. At the end of each bot utterance
+(and every ``report_secs`` during long ones) the playout tap pushes a
+``MetricsFrame`` with ``OutputPacingMetricsData`` downstream, next to the
+services' TTFB and processing metrics. Like those, it's only emitted when
+``PipelineParams(enable_metrics=True)``.
+"""
+
+import time
+from collections import deque
+from typing import List
+
+from loguru import logger
+from pipecat.frames.frames import (
+    BotStoppedSpeakingFrame,
+    Frame,
+    InterruptionFrame,
+    MetricsFrame,
+    OutputAudioRawFrame,
+)
+from pipecat.metrics.metrics import MetricsData
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+# A chunk this much later than the previous chunk's duration counts as an underrun.
+UNDERRUN_THRESHOLD_SECS = 0.04
+REPORT_SECS = 5.0
+
+
+class OutputPacingMetricsData(MetricsData):
+    """Output audio pacing over one report window.
+
+    Parameters:
+        chunks: Number of audio chunks played in the window.
+        pacing_error_p50_ms: Median lateness of a chunk vs. the previous chunk's duration.
+        pacing_error_p95_ms: 95th percentile of the same.
+        pacing_error_max_ms: Worst lateness in the window.
+        underruns: Gaps longer than the underrun threshold while the bot was speaking.
+        queued_audio_ms: Audio waiting in the output transport at report time.
+        queued_audio_max_ms: Deepest the output queue got in the window.
+        playout_delay_avg_ms: Average time from TTS audio arriving to it being played.
+        playout_delay_max_ms: Worst such delay in the window.
+    """
+
+    chunks: int
+    pacing_error_p50_ms: float
+    pacing_error_p95_ms: float
+    pacing_error_max_ms: float
+    underruns: int
+    queued_audio_ms: float
+    queued_audio_max_ms: float
+    playout_delay_avg_ms: float
+    playout_delay_max_ms: float
+
+
+def _audio_secs(frame: OutputAudioRawFrame) -> float:
+    return len(frame.audio) / (frame.sample_rate * frame.num_channels * 2)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class OutputPacingMonitor:
+    """Per-session output audio pacing, queue depth and playout delay tracker."""
+
+    def __init__(
+        self,
+        *,
+        underrun_threshold_secs: float = UNDERRUN_THRESHOLD_SECS,
+        report_secs: float = REPORT_SECS,
+    ):
+        """Initialize the monitor.
+
+        Args:
+            underrun_threshold_secs: Extra gap between chunks counted as an underrun.
+            report_secs: Longest a bot utterance goes without a metrics report.
+        """
+        self._underrun_threshold_secs = underrun_threshold_secs
+        self._report_secs = report_secs
+
+        self._arrivals_tap = _ArrivalTap(self)
+        self._playout_tap = _PlayoutTap(self)
+
+        # Audio seconds handed to / played by the output transport, and when
+        # each TTS chunk arrived: (arrival time, offset of its first sample).
+        self._arrived_secs = 0.0
+        self._played_secs = 0.0
+        self._pending_arrivals = deque()
+
+        self._last_chunk_time = 0.0
+        self._last_chunk_secs = 0.0
+        self._reset_window()
+
+    def arrivals(self) -> FrameProcessor:
+        """Processor to place right before ``transport.output()``."""
+        return self._arrivals_tap
+
+    def playout(self) -> FrameProcessor:
+        """Processor to place right after ``transport.output()``."""
+        return self._playout_tap
+
+    @property
+    def queued_secs(self) -> float:
+        """Audio currently queued in the output transport."""
+        return max(0.0, self._arrived_secs - self._played_secs)
+
+    def _on_arrival(self, secs: float):
+        self._pending_arrivals.append((time.monotonic(), self._arrived_secs))
+        self._arrived_secs += secs
+        self._queued_max_secs = max(self._queued_max_secs, self.queued_secs)
+
+    def _on_playout(self, secs: float):
+        now = time.monotonic()
+
+        while self._pending_arrivals and self._pending_arrivals[0][1] <= self._played_secs:
+            arrival_time, _ = self._pending_arrivals.popleft()
+            self._playout_delays.append(now - arrival_time)
+
+        if self._last_chunk_time:
+            error = (now - self._last_chunk_time) - self._last_chunk_secs
+            self._pacing_errors.append(max(0.0, error))
+            if error > self._underrun_threshold_secs:
+                self._underruns += 1
+
+        self._chunks += 1
+        self._played_secs += secs
+        self._last_chunk_time = now
+        self._last_chunk_secs = secs
+        if not self._window_start:
+            self._window_start = now
+
+    def _on_interruption(self):
+        # The output transport drops whatever it had queued.
+        self._arrived_secs = self._played_secs
+        self._pending_arrivals.clear()
+        self._last_chunk_time = 0.0
+
+    def _on_bot_stopped_speaking(self):
+        self._last_chunk_time = 0.0
+
+    def _report_due(self) -> bool:
+        return bool(self._window_start) and (
+            time.monotonic() - self._window_start >= self._report_secs
+        )
+
+    def _collect(self, processor: str) -> OutputPacingMetricsData:
+        errors = sorted(self._pacing_errors)
+        delays = self._playout_delays
+        data = OutputPacingMetricsData(
+            processor=processor,
+            chunks=self._chunks,
+            pacing_error_p50_ms=_percentile(errors, 0.5) * 1000,
+            pacing_error_p95_ms=_percentile(errors, 0.95) * 1000,
+            pacing_error_max_ms=(errors[-1] if errors else 0.0) * 1000,
+            underruns=self._underruns,
+            queued_audio_ms=self.queued_secs * 1000,
+            queued_audio_max_ms=self._queued_max_secs * 1000,
+            playout_delay_avg_ms=(sum(delays) / len(delays) if delays else 0.0) * 1000,
+            playout_delay_max_ms=max(delays, default=0.0) * 1000,
+        )
+        self._reset_window()
+        return data
+
+    def _reset_window(self):
+        self._window_start = 0.0
+        self._chunks = 0
+        self._pacing_errors: List[float] = []
+        self._playout_delays: List[float] = []
+        self._underruns = 0
+        self._queued_max_secs = self.queued_secs
+
+
+class _ArrivalTap(FrameProcessor):
+    """Records bot audio as it's handed to the output transport."""
+
+    def __init__(self, monitor: OutputPacingMonitor, **kwargs):
+        super().__init__(**kwargs)
+        self._monitor = monitor
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.DOWNSTREAM:
+            if isinstance(frame, OutputAudioRawFrame):
+                self._monitor._on_arrival(_audio_secs(frame))
+            elif isinstance(frame, InterruptionFrame):
+                self._monitor._on_interruption()
+
+        await self.push_frame(frame, direction)
+
+
+class _PlayoutTap(FrameProcessor):
+    """Records played bot audio and reports the pacing metrics."""
+
+    def __init__(self, monitor: OutputPacingMonitor, **kwargs):
+        super().__init__(**kwargs)
+        self._monitor = monitor
+
+    def can_generate_metrics(self) -> bool:
+        return True
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        report = False
+        if direction == FrameDirection.DOWNSTREAM:
+            if isinstance(frame, OutputAudioRawFrame):
+                self._monitor._on_playout(_audio_secs(frame))
+                report = self._monitor._report_due()
+            elif isinstance(frame, BotStoppedSpeakingFrame):
+                self._monitor._on_bot_stopped_speaking()
+                report = bool(self._monitor._window_start)
+
+        await self.push_frame(frame, direction)
+
+        if report:
+            data = self._monitor._collect(self.name)
+            logger.debug(f"{self}: {data}")
+            if self.metrics_enabled:
+                await self.push_frame(MetricsFrame(data=[data]))
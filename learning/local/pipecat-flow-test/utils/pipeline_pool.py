@@ -0,0 +1,186 @@
+"""Pool of pre-built pipeline parts, so a call doesn't wait on service setup.
+
+``run_bot`` builds the STT, LLM and TTS services and the LLM context before it
+can run anything, and that happens after the transport is created, on the
+call's critical path. ``PipelineTemplatePool`` keeps ``size`` of those
+already constructed; a call takes one, builds its ``Pipeline`` and
+``PipelineTask`` around it (cheap), and the pool builds a replacement in a
+worker thread in the background.
+
+Templates are single use: services keep per-call state (voice, context,
+websocket), so a template is never returned to the pool.
+
+Most services open their websockets when the pipeline starts, because they
+need the call's audio settings from the ``StartFrame``. STT services that can
+connect ahead of time (``prewarm()``, see ``utils.stt_prewarm``) are
+connected as soon as their template is built, so the first words of a caller
+who speaks straight away aren't lost while STT connects. Every
+``KEEP_WARM_INTERVAL`` the pool reconnects ready templates whose connection
+dropped or is getting old; a call that gets a template whose connection isn't
+warm simply connects at start, as before. Pass the call's session to
+``acquire()`` so a warm connection the call never used is closed with it::
+
+    def create_template() -> PipelineTemplate:
+        return PipelineTemplate(stt=..., llm=..., tts=...)
+
+    templates = PipelineTemplatePool(create_template)
+
+    async def run_bot(transport, runner_args, session):
+        template = await templates.acquire(session)
+        pipeline = Pipeline([transport.input(), template.stt, ...])
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Optional
+
+from loguru import logger
+from pipecat.processors.aggregators.llm_context import LLMContext
+from pipecat.processors.aggregators.llm_response_universal import LLMContextAggregatorPair
+from pipecat.services.llm_service import LLMService
+from pipecat.services.stt_service import STTService
+from pipecat.services.tts_service import TTSService
+
+from utils.sessions import Session
+
+POOL_SIZE = 2
+
+# How often ready templates' STT connections are checked and re-warmed.
+KEEP_WARM_INTERVAL = 30
+
+
+@dataclass
+class PipelineTemplate:
+    """The transport-independent parts of one call's pipeline.
+
+    Parameters:
+        stt: Speech-to-text service.
+        llm: LLM service.
+        tts: Text-to-speech service.
+        context: LLM context for the call.
+        context_aggregator: User/assistant aggregators over ``context``.
+    """
+
+    stt: STTService
+    llm: LLMService
+    tts: TTSService
+    context: LLMContext = field(default_factory=LLMContext)
+    context_aggregator: Optional[LLMContextAggregatorPair] = None
+
+    def __post_init__(self):
+        if self.context_aggregator is None:
+            self.context_aggregator = LLMContextAggregatorPair(self.context)
+
+    @property
+    def prewarms(self) -> bool:
+        """Whether the STT service can connect ahead of the call."""
+        return hasattr(self.stt, "prewarm")
+
+    async def prewarm(self) -> bool:
+        """Connect the STT service now, if it supports it. Returns whether it's warm."""
+        if not self.prewarms:
+            return False
+        try:
+            return await self.stt.prewarm()
+        except Exception as e:
+            logger.warning(f"Couldn't prewarm {self.stt}: {e}")
+            return False
+
+    async def is_warm(self) -> bool:
+        """Whether the STT service holds a connection ready for the call."""
+        return self.prewarms and await self.stt.is_warm()
+
+    async def close(self):
+        """Close a warm STT connection the call never used."""
+        if self.prewarms:
+            await self.stt.close_warm()
+
+
+class PipelineTemplatePool:
+    """Keeps ``size`` pipeline templates built ahead of the calls that need them."""
+
+    def __init__(self, factory: Callable[[], PipelineTemplate], *, size: int = POOL_SIZE):
+        """Initialize the pool. Templates are built on first use, in the background.
+
+        Args:
+            factory: Builds one template. Runs in a worker thread.
+            size: Templates to keep ready.
+        """
+        self._factory = factory
+        self._size = size
+        self._ready: Deque[PipelineTemplate] = deque()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._keep_warm_task: Optional[asyncio.Task] = None
+        self._hits = 0
+        self._misses = 0
+        self._cold = 0
+
+    @property
+    def ready(self) -> int:
+        """Templates ready to hand out right now."""
+        return len(self._ready)
+
+    async def acquire(self, session: Optional[Session] = None) -> PipelineTemplate:
+        """Take a ready template, or build one now if the pool is empty.
+
+        Args:
+            session: The call's session. The template is attached to it, so
+                a warm STT connection the call never used is closed with it.
+        """
+        if self._ready:
+            self._hits += 1
+            template = self._ready.popleft()
+            if template.prewarms and not await template.is_warm():
+                # Still usable: the STT service connects when the pipeline starts.
+                self._cold += 1
+                logger.debug(f"Pipeline template's STT isn't warm ({self._cold} so far)")
+        else:
+            self._misses += 1
+            start_time = time.perf_counter()
+            template = await asyncio.to_thread(self._factory)
+            logger.debug(
+                f"Pipeline template pool empty, built one in "
+                f"{(time.perf_counter() - start_time) * 1000:.0f}ms "
+                f"({self._hits} hits, {self._misses} misses)"
+            )
+        if session:
+            session.add("template", template, close=template.close)
+        self.start()
+        return template
+
+    def start(self):
+        """Start refilling the pool and keeping it warm in the background (if it isn't already)."""
+        loop = asyncio.get_running_loop()
+        if not self._keep_warm_task or self._keep_warm_task.done():
+            self._keep_warm_task = loop.create_task(self._keep_warm())
+        if self._refill_task and not self._refill_task.done():
+            return
+        self._refill_task = loop.create_task(self._refill())
+
+    async def _refill(self):
+        while len(self._ready) < self._size:
+            try:
+                template = await asyncio.to_thread(self._factory)
+            except Exception as e:
+                logger.error(f"Couldn't build pipeline template: {e}")
+                return
+            # Connected on this loop: the connection belongs to the loop the call runs on.
+            await template.prewarm()
+            self._ready.append(template)
+
+    async def _keep_warm(self):
+        while True:
+            await asyncio.sleep(KEEP_WARM_INTERVAL)
+            for template in list(self._ready):
+                if not template.prewarms or await template.is_warm():
+                    continue
+                if template not in self._ready:
+                    continue
+                # Dropped, or close to the provider's idle timeout: reconnect,
+                # out of the pool so no call takes it half connected.
+                self._ready.remove(template)
+                await template.close()
+                await template.prewarm()
+                self._ready.append(template)
@@ -0,0 +1,141 @@
+"""Prompt-size benchmark: flag prompts that grew since the recorded baseline.
+
+Every system prompt is re-sent on every turn of its node, so a prompt that
+grows by 500 tokens costs 500 tokens per turn for every call. This measures
+each prompt in ``PROMPT_MODULES`` (module-level strings, and functions
+whose arguments all have defaults, called with those defaults) and compares
+it with ``BASELINE``::
+
+    uv run python -m utils.prompt_sizes            # compare, exit 1 on regressions
+    uv run python -m utils.prompt_sizes --update   # record the current sizes
+
+Tokens are estimated from characters (``CHARS_PER_TOKEN``), which is enough
+to catch growth. ``--count-tokens`` asks Gemini for exact counts instead
+(needs ``GOOGLE_API_KEY``).
+"""
+
+import argparse
+import importlib.util
+import inspect
+import json
+import os
+import sys
+from typing import Callable, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROMPT_MODULES = [
+    "prompts/flows_prompts.py",
+    "PsychSuite/first_meeting/prompts.py",
+]
+
+BASELINE = os.path.join(ROOT, "prompts", "prompt_sizes.json")
+
+CHARS_PER_TOKEN = 4
+
+# Growth over the baseline that counts as a regression.
+TOLERANCE = 0.05
+
+
+def _load(path: str):
+    name = "_prompts_" + path.replace("/", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _takes_no_arguments(function: Callable) -> bool:
+    return all(
+        param.default is not inspect.Parameter.empty
+        or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD)
+        for param in inspect.signature(function).parameters.values()
+    )
+
+
+def collect_prompts() -> Dict[str, str]:
+    """Every prompt in ``PROMPT_MODULES``, by "module:name"."""
+    prompts = {}
+    for path in PROMPT_MODULES:
+        module = _load(path)
+        for name, value in vars(module).items():
+            if name.startswith("_"):
+                continue
+            if inspect.isfunction(value) and value.__module__ == module.__name__:
+                if not _takes_no_arguments(value):
+                    continue
+                value = value()
+            if isinstance(value, str):
+                prompts[f"{path}:{name}"] = value
+    return prompts
+
+
+def _gemini_counter(model: str) -> Callable[[str], int]:
+    from google import genai
+
+    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    return lambda text: client.models.count_tokens(model=model, contents=text).total_tokens
+
+
+def measure(count_tokens: Optional[Callable[[str], int]] = None) -> Dict[str, Dict[str, int]]:
+    """Characters and tokens of every prompt."""
+    count_tokens = count_tokens or (lambda text: len(text) // CHARS_PER_TOKEN)
+    return {
+        name: {"chars": len(text), "tokens": count_tokens(text)}
+        for name, text in sorted(collect_prompts().items())
+    }
+
+
+def compare(
+    sizes: Dict[str, Dict[str, int]], baseline: Dict[str, Dict[str, int]], tolerance: float
+) -> bool:
+    """Print each prompt against its baseline; return whether any regressed."""
+    regressed = False
+    for name, size in sizes.items():
+        before = baseline.get(name)
+        if before is None:
+            status = "new"
+        else:
+            growth = (size["tokens"] - before["tokens"]) / max(before["tokens"], 1)
+            status = f"{growth:+.1%}"
+            if growth > tolerance:
+                status += " REGRESSION"
+                regressed = True
+        print(f"{size['tokens']:>7} tokens {size['chars']:>7} chars  {status:<18} {name}")
+    for name in baseline.keys() - sizes.keys():
+        print(f"{'':>36}removed            {name}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag prompt-size regressions")
+    parser.add_argument("--update", action="store_true", help="Record the current sizes")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument(
+        "--count-tokens",
+        metavar="MODEL",
+        nargs="?",
+        const="gemini-2.0-flash-lite",
+        help="Count tokens with Gemini instead of estimating them",
+    )
+    args = parser.parse_args()
+
+    sizes = measure(_gemini_counter(args.count_tokens) if args.count_tokens else None)
+    if args.update:
+        with open(BASELINE, "w") as f:
+            json.dump(sizes, f, indent=2)
+            f.write("\n")
+        print(f"Recorded {len(sizes)} prompts in {BASELINE}")
+        return
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    if compare(sizes, baseline, args.tolerance):
+        print(f"Prompts grew more than {args.tolerance:.0%}; run with --update if intended")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
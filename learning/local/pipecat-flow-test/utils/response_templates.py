@@ -0,0 +1,104 @@
+"""Templated replies for nodes reached from a function result.
+
+After a function like ``check_availability`` transitions to its next node,
+Pipecat Flows runs the LLM just to phrase the result ("7:00 PM is
+available", "we have 6:00 PM or 9:00 PM instead"). When the reply is that
+predictable, the node can set ``response_template`` instead:
+
+- a ``str.format`` template over the function's result fields (falling back
+  to its arguments), e.g. ``"Sorry, {time} is taken. We have {alternative_times}."``;
+- or a callable taking those fields and returning the text, or ``None``.
+
+``templated()`` wraps a ``FlowsFunctionSchema`` so that, when the handler's
+next node has a template that renders, the reply is spoken straight away
+with a ``tts_say`` pre-action, added to the context as the assistant's
+message, and the node's LLM turn is skipped. If a field is missing or empty,
+or the callable returns ``None``, the node runs its LLM turn as usual.
+
+Lists are read out as "a, b or c"::
+
+    availability_schema = templated(FlowsFunctionSchema(..., handler=check_availability))
+
+    def create_no_availability_node() -> NodeConfig:
+        return {
+            "name": "no_availability",
+            "task_messages": [...],
+            "response_template": "Sorry, {time} is booked. We have {alternative_times}.",
+        }
+"""
+
+import string
+from dataclasses import replace
+from typing import Any, Callable, Dict, Mapping, Optional, Union
+
+from loguru import logger
+from pipecat_flows import FlowArgs, FlowManager, FlowsFunctionSchema, NodeConfig
+
+from utils.function_args import call_handler
+
+ResponseTemplate = Union[str, Callable[[Dict[str, Any]], Optional[str]]]
+
+
+def _spoken(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        items = [str(item) for item in value]
+        return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} or {items[-1]}"
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == ()
+
+
+def render(template: ResponseTemplate, fields: Mapping[str, Any]) -> Optional[str]:
+    """Render ``template`` over ``fields``, or ``None`` if it doesn't apply."""
+    if callable(template):
+        text = template(dict(fields))
+        return text.strip() if text else None
+
+    values = {}
+    for _, name, _, _ in string.Formatter().parse(template):
+        if name is None:
+            continue
+        key = name.split(".")[0].split("[")[0]
+        if _is_empty(fields.get(key)):
+            return None
+        values[key] = _spoken(fields[key])
+    return template.format_map(values).strip()
+
+
+def apply_template(node: NodeConfig, fields: Mapping[str, Any]) -> NodeConfig:
+    """``node`` with its templated reply in place of its LLM turn, if it renders."""
+    template = node.get("response_template")
+    if template is None or node.get("respond_immediately") is False:
+        return node
+    text = render(template, fields)
+    if not text:
+        logger.debug(f"Template for node {node.get('name')} doesn't apply, using the LLM")
+        return node
+    logger.debug(f"Templated reply for node {node.get('name')}: {text}")
+    return {
+        **node,
+        "task_messages": [*node["task_messages"], {"role": "assistant", "content": text}],
+        "pre_actions": [*node.get("pre_actions", []), {"type": "tts_say", "text": text}],
+        "respond_immediately": False,
+    }
+
+
+def templated(schema: FlowsFunctionSchema) -> FlowsFunctionSchema:
+    """Return ``schema`` with its next node's ``response_template`` applied."""
+    if schema.handler is None:
+        return schema
+    handler = schema.handler
+
+    async def templating_handler(args: FlowArgs, flow_manager: FlowManager):
+        response = await call_handler(handler, args, flow_manager)
+        if not isinstance(response, tuple):
+            return response
+        result, next_node = response
+        if not isinstance(next_node, dict):
+            return response
+        fields = {**args, **(result or {})}
+        return result, apply_template(next_node, fields)
+
+    return replace(schema, handler=templating_handler)
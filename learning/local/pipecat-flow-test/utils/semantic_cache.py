@@ -0,0 +1,568 @@
+"""Semantic cache of bot answers to repeated FAQ turns.
+
+Many visitors ask a bot the same handful of questions in slightly different
+words, and each one costs a full LLM round trip. ``SemanticCache`` is a
+process-wide cache of answers keyed on the flow node and an embedding of the
+user's normalized utterance. A turn whose utterance is within
+``threshold`` cosine similarity of a cached one is answered straight from
+the cache, without calling the LLM, and with the cached TTS audio too when
+there is some.
+
+The embedding is local and cheap: hashed word, word-pair and character
+trigram features of the utterance's content words, so paraphrases that share
+most of their words match ("what does the voice clone do?" and "what does
+voice cloning do?" score 0.81) and unrelated questions don't (below 0.4).
+Pass ``embed=`` to use a real sentence-embedding model instead. Entries
+expire after ``ttl_secs`` and the least recently used entries of a node are
+evicted once it holds ``max_entries`` answers or ``max_audio_bytes`` of their
+audio.
+
+The cache is shared by every caller, so only turns that can't carry one
+caller's state to another go through it:
+
+- the utterance must be a self-contained question (a question word or a
+  question mark, and at least ``MIN_CONTENT_WORDS`` content words), so "yes",
+  "sure, go on" and the like are never looked up;
+- when the bot's previous message was a question, its hash is part of the key,
+  so answers to different bot questions never match each other;
+- an answer that mentions something the caller said earlier or the call's
+  flow state (their name, facts collected) is never stored.
+
+Each call gets three pass-through taps, used the same way as
+``LLMContextAggregatorPair``::
+
+    faq_cache = sessions.shared("faq_cache", lambda: SemanticCache(nodes={"general_bot"}))
+    cache = faq_cache.session(
+        lambda: flow_manager.current_node, caller_state=lambda: flow_manager.state
+    )
+    pipeline = Pipeline(
+        [
+            ...,
+            context_aggregator.user(),
+            cache.lookup(),  # Answers cached questions instead of the LLM
+            llm,
+            cache.responses(),  # Records the LLM's answers
+            tts,
+            cache.audio(),  # Records the answers' audio
+            transport.output(),
+            ...,
+        ]
+    )
+
+Only plain answers are cached: a turn that calls a function or is
+interrupted isn't. Cached audio is the bot's own voice, never the user's.
+"""
+
+import re
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+from pipecat.frames.frames import (
+    BotStoppedSpeakingFrame,
+    Frame,
+    FunctionCallsStartedFrame,
+    InterruptionFrame,
+    LLMContextFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMTextFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+SIMILARITY_THRESHOLD = 0.8
+TTL_SECS = 3600.0
+MAX_ENTRIES = 256
+EMBEDDING_DIM = 1024
+
+# Cached answer audio kept per node, and the most one answer may keep (about
+# 40s of 24kHz audio); longer answers are cached as text only.
+MAX_AUDIO_BYTES = 16 * 1024 * 1024
+MAX_ANSWER_AUDIO_BYTES = 2 * 1024 * 1024
+
+# Content words an utterance needs to count as a self-contained question.
+MIN_CONTENT_WORDS = 2
+
+_QUESTION_WORDS = {
+    "what", "what's", "whats", "how", "why", "when", "where", "who", "which", "can", "could",
+    "do", "does", "is", "are", "will", "would", "should", "tell", "explain",
+}  # fmt: skip
+
+# Words that don't change what's being asked.
+_FILLER_WORDS = {"um", "uh", "erm", "hmm", "like", "so", "well", "okay", "ok", "please", "just"}
+
+# Words left out of the embedding: they're in almost every question.
+_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "am", "be", "do", "does", "did", "can", "could", "would",
+    "will", "i", "me", "my", "you", "your", "it", "its", "this", "that", "there", "to", "of",
+    "for", "in", "on", "and", "about", "tell", "actually", "really", "any", "anywhere",
+}  # fmt: skip
+
+Embedder = Callable[[str], np.ndarray]
+
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, drop punctuation and filler words, and collapse whitespace."""
+    words = re.sub(r"[^\w\s']", " ", text.lower()).split()
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+def is_faq_question(text: str) -> bool:
+    """Whether ``text`` reads as a self-contained question, not a reply to the bot."""
+    utterance = normalize_utterance(text)
+    words = utterance.split()
+    if not words or ("?" not in text and words[0] not in _QUESTION_WORDS):
+        return False
+    content = [w for w in words if w not in _STOP_WORDS and w not in _QUESTION_WORDS]
+    return len(content) >= MIN_CONTENT_WORDS
+
+
+def context_key(assistant_text: Optional[str]) -> int:
+    """Key for the bot message a question follows: its hash if it asked something, else 0."""
+    if not assistant_text or "?" not in assistant_text:
+        return 0
+    return zlib.crc32(normalize_utterance(assistant_text).encode())
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def _features(text: str) -> Iterable[str]:
+    words = [_stem(word) for word in text.split() if word not in _STOP_WORDS] or text.split()
+    yield from (f"w:{word}" for word in words)
+    yield from (f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f" {word} "
+        yield from (f"c:{padded[i : i + 3]}" for i in range(len(padded) - 2))
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Unit-length hashed feature vector of a normalized utterance."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        vector[zlib.crc32(feature.encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class CachedAnswer:
+    """A cached bot answer.
+
+    Parameters:
+        utterance: The normalized user utterance it answered.
+        text: The answer text.
+        context: ``context_key()`` of the bot message the utterance followed.
+        audio: The answer's TTS audio chunks, if recorded.
+        sample_rate: Sample rate of ``audio``.
+        num_channels: Channel count of ``audio``.
+        created_at: When the answer was cached (monotonic).
+        hits: How often it has been served.
+    """
+
+    utterance: str
+    text: str
+    context: int = 0
+    audio: List[bytes] = field(default_factory=list)
+    sample_rate: int = 0
+    num_channels: int = 1
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+    @property
+    def audio_bytes(self) -> int:
+        return sum(len(chunk) for chunk in self.audio)
+
+
+class SemanticCache:
+    """Process-wide cache of answers, by flow node and utterance embedding."""
+
+    def __init__(
+        self,
+        *,
+        nodes: Optional[Set[str]] = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_secs: float = TTL_SECS,
+        max_entries: int = MAX_ENTRIES,
+        max_audio_bytes: int = MAX_AUDIO_BYTES,
+        embed: Embedder = hashed_embedding,
+    ):
+        """Initialize the cache.
+
+        Args:
+            nodes: Flow nodes whose answers may be cached. Defaults to all nodes.
+            threshold: Cosine similarity a new utterance needs to reuse an answer.
+            ttl_secs: How long an answer stays cached.
+            max_entries: Answers kept per node before the least recently used goes.
+            max_audio_bytes: Answer audio kept per node before the least
+                recently used answers go.
+            embed: Maps a normalized utterance to a unit-length vector.
+        """
+        self._nodes = nodes
+        self._threshold = threshold
+        self._ttl_secs = ttl_secs
+        self._max_entries = max_entries
+        self._max_audio_bytes = max_audio_bytes
+        self._embed = embed
+        self._entries: Dict[
+            str, "OrderedDict[Tuple[int, str], Tuple[np.ndarray, CachedAnswer]]"
+        ] = {}
+        self._audio_bytes: Dict[str, int] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def cacheable(self, node: Optional[str]) -> bool:
+        """Whether answers in ``node`` go through the cache."""
+        return node is not None and (self._nodes is None or node in self._nodes)
+
+    def lookup(
+        self, node: str, utterance: str, context: int = 0
+    ) -> Optional[Tuple[CachedAnswer, float]]:
+        """The closest fresh answer for ``utterance`` in ``node``, and its similarity.
+
+        Only answers given after the same bot message (``context_key()``) match.
+        """
+        entries = self._entries.get(node)
+        if not entries:
+            self._misses += 1
+            return None
+        self._expire(node)
+
+        vector = self._embed(utterance)
+        best_key, best_similarity = None, self._threshold
+        for key, (cached_vector, answer) in entries.items():
+            if answer.context != context:
+                continue
+            similarity = float(np.dot(vector, cached_vector))
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+
+        if best_key is None:
+            self._misses += 1
+            return None
+        entries.move_to_end(best_key)
+        answer = entries[best_key][1]
+        answer.hits += 1
+        self._hits += 1
+        return answer, best_similarity
+
+    def store(self, node: str, answer: CachedAnswer):
+        """Cache ``answer``, evicting the node's least recently used ones if full."""
+        if answer.audio_bytes > MAX_ANSWER_AUDIO_BYTES:
+            answer.audio = []
+        entries = self._entries.setdefault(node, OrderedDict())
+        key = (answer.context, answer.utterance)
+        self._remove(node, key)
+        entries[key] = (self._embed(answer.utterance), answer)
+        self._audio_bytes[node] = self._audio_bytes.get(node, 0) + answer.audio_bytes
+        while len(entries) > self._max_entries or self._audio_bytes[node] > self._max_audio_bytes:
+            self._remove(node, next(iter(entries)))
+            self._evictions += 1
+
+    def session(
+        self,
+        current_node: Callable[[], Optional[str]],
+        *,
+        caller_state: Optional[Callable[[], Any]] = None,
+    ) -> "SemanticCacheSession":
+        """Taps for one call.
+
+        Args:
+            current_node: Returns the flow node the call is in.
+            caller_state: Returns the call's state (e.g. ``flow_manager.state``);
+                answers mentioning any of its strings aren't cached.
+        """
+        return SemanticCacheSession(self, current_node, caller_state)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit rate and size of the cache."""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+            "evictions": self._evictions,
+            "entries": {node: len(entries) for node, entries in self._entries.items()},
+            "audio_bytes": dict(self._audio_bytes),
+        }
+
+    def _remove(self, node: str, key: Tuple[int, str]):
+        entry = self._entries[node].pop(key, None)
+        if entry:
+            self._audio_bytes[node] -= entry[1].audio_bytes
+
+    def _expire(self, node: str):
+        now = time.monotonic()
+        entries = self._entries[node]
+        for key in [k for k, (_, a) in entries.items() if now - a.created_at > self._ttl_secs]:
+            self._remove(node, key)
+
+
+def _text(message: Any) -> Optional[str]:
+    content = message.get("content") if isinstance(message, dict) else None
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content if isinstance(content, str) else None
+
+
+def _last_user_turn(frame: LLMContextFrame) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """The last user message, the bot message before it, and the user's earlier messages."""
+    messages = frame.context.get_messages()
+    if not messages or messages[-1].get("role") != "user":
+        return None, None, []
+    assistant = next(
+        (
+            _text(m)
+            for m in reversed(messages[:-1])
+            if isinstance(m, dict) and m.get("role") == "assistant"
+        ),
+        None,
+    )
+    earlier = [
+        text
+        for m in messages[:-1]
+        if isinstance(m, dict) and m.get("role") == "user" and (text := _text(m))
+    ]
+    return _text(messages[-1]), assistant, earlier
+
+
+def _strings(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            yield from _strings(item)
+
+
+def _caller_terms(texts: Iterable[str]) -> Set[str]:
+    """Words specific to one caller: what they said earlier and their flow state."""
+    words = set()
+    for text in texts:
+        words.update(normalize_utterance(text).split())
+    return {word for word in words if len(word) > 2 and word not in _STOP_WORDS}
+
+
+def _mentions_caller(answer: str, question: str, caller_terms: Set[str]) -> bool:
+    """Whether ``answer`` names something from ``caller_terms`` the question didn't ask about.
+
+    Only capitalized words count (names, places), so an answer reusing the
+    caller's ordinary words is still cached.
+    """
+    asked = set(normalize_utterance(question).split())
+    for word in re.findall(r"\b[A-Z][\w']+", answer):
+        word = word.lower()
+        if word in caller_terms and word not in asked:
+            return True
+    return False
+
+
+class SemanticCacheSession:
+    """One call's view of a ``SemanticCache``: a lookup tap and two recording taps."""
+
+    def __init__(
+        self,
+        cache: SemanticCache,
+        current_node: Callable[[], Optional[str]],
+        caller_state: Optional[Callable[[], Any]] = None,
+    ):
+        """Initialize the session. Use ``SemanticCache.session()`` instead."""
+        self._cache = cache
+        self._current_node = current_node
+        self._caller_state = caller_state
+
+        self._lookup_tap = _LookupTap(self)
+        self._responses_tap = _ResponsesTap(self)
+        self._audio_tap = _AudioTap(self)
+
+        # The answer being recorded after a miss, and its node.
+        self._pending: Optional[CachedAnswer] = None
+        self._pending_node: Optional[str] = None
+        self._caller_terms: Set[str] = set()
+        self._text_parts: List[str] = []
+        self._text_done = False
+        self._audio_done = False
+        self._recorded_bytes = 0
+        self._audio_too_long = False
+
+    def lookup(self) -> FrameProcessor:
+        """Processor to place right before the LLM."""
+        return self._lookup_tap
+
+    def responses(self) -> FrameProcessor:
+        """Processor to place right after the LLM."""
+        return self._responses_tap
+
+    def audio(self) -> FrameProcessor:
+        """Processor to place right after the TTS."""
+        return self._audio_tap
+
+    def _on_context(self, frame: LLMContextFrame) -> Optional[Tuple[CachedAnswer, float]]:
+        self._discard()
+        node = self._current_node()
+        text, assistant, earlier = _last_user_turn(frame)
+        if not self._cache.cacheable(node) or not text or not is_faq_question(text):
+            return None
+        utterance = normalize_utterance(text)
+        context = context_key(assistant)
+        hit = self._cache.lookup(node, utterance, context)
+        if hit is None:
+            self._pending = CachedAnswer(utterance=utterance, text="", context=context)
+            self._pending_node = node
+            state = self._caller_state() if self._caller_state else None
+            self._caller_terms = _caller_terms([*earlier, *_strings(state)])
+        return hit
+
+    def _on_llm_text(self, text: str):
+        if self._pending and not self._text_done:
+            self._text_parts.append(text)
+
+    def _on_llm_response_end(self):
+        if self._pending and self._text_parts:
+            self._pending.text = "".join(self._text_parts).strip()
+            self._text_done = True
+
+    def _on_audio(self, frame: TTSAudioRawFrame):
+        if self._pending and not self._audio_too_long:
+            self._recorded_bytes += len(frame.audio)
+            if self._recorded_bytes > MAX_ANSWER_AUDIO_BYTES:
+                # Too long to keep: the answer is cached as text only.
+                self._audio_too_long = True
+                self._pending.audio = []
+                return
+            self._pending.audio.append(frame.audio)
+            self._pending.sample_rate = frame.sample_rate
+            self._pending.num_channels = frame.num_channels
+
+    def _on_tts_stopped(self):
+        # TTS is done once it stops after the whole answer text has reached it.
+        if self._pending and self._text_done:
+            self._audio_done = True
+
+    def _on_bot_stopped_speaking(self):
+        # The answer has been spoken in full: cache it.
+        if self._pending and self._text_done and self._pending.text:
+            if _mentions_caller(self._pending.text, self._pending.utterance, self._caller_terms):
+                logger.debug(f"Not caching answer to '{self._pending.utterance}': it's personal")
+            else:
+                if not self._audio_done or self._audio_too_long:
+                    self._pending.audio = []
+                self._cache.store(self._pending_node, self._pending)
+                logger.debug(
+                    f"Cached answer to '{self._pending.utterance}' in {self._pending_node}"
+                )
+        self._discard()
+
+    def _discard(self):
+        self._pending = None
+        self._pending_node = None
+        self._caller_terms = set()
+        self._text_parts = []
+        self._text_done = False
+        self._audio_done = False
+        self._recorded_bytes = 0
+        self._audio_too_long = False
+
+
+class _LookupTap(FrameProcessor):
+    """Answers cached questions in place of the LLM."""
+
+    def __init__(self, session: SemanticCacheSession, **kwargs):
+        super().__init__(**kwargs)
+        self._session = session
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMContextFrame):
+            start_time = time.perf_counter()
+            hit = self._session._on_context(frame)
+            if hit:
+                answer, similarity = hit
+                await self._replay(answer)
+                logger.info(
+                    f"{self}: answered '{answer.utterance}' from cache "
+                    f"(similarity {similarity:.2f}, {len(answer.audio)} audio chunks) "
+                    f"in {(time.perf_counter() - start_time) * 1000:.1f}ms"
+                )
+                return
+        elif isinstance(frame, InterruptionFrame):
+            self._session._discard()
+
+        await self.push_frame(frame, direction)
+
+    async def _replay(self, answer: CachedAnswer):
+        await self.push_frame(LLMFullResponseStartFrame())
+        if answer.audio:
+            # The LLM resets skip_tts on LLM frames it forwards, so the text
+            # goes as a plain TextFrame: TTS skips it, the assistant aggregator
+            # still adds it to the context.
+            await self.push_frame(TTSStartedFrame())
+            for chunk in answer.audio:
+                await self.push_frame(
+                    TTSAudioRawFrame(chunk, answer.sample_rate, answer.num_channels)
+                )
+            await self.push_frame(TTSStoppedFrame())
+            text_frame = TextFrame(answer.text)
+            text_frame.skip_tts = True
+            await self.push_frame(text_frame)
+        else:
+            await self.push_frame(LLMTextFrame(answer.text))
+        await self.push_frame(LLMFullResponseEndFrame())
+
+
+class _ResponsesTap(FrameProcessor):
+    """Records the text of the LLM's answer after a cache miss."""
+
+    def __init__(self, session: SemanticCacheSession, **kwargs):
+        super().__init__(**kwargs)
+        self._session = session
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMTextFrame):
+            self._session._on_llm_text(frame.text)
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self._session._on_llm_response_end()
+        elif isinstance(frame, (FunctionCallsStartedFrame, InterruptionFrame)):
+            self._session._discard()
+
+        await self.push_frame(frame, direction)
+
+
+class _AudioTap(FrameProcessor):
+    """Records the audio of the answer and caches it once it's been spoken."""
+
+    def __init__(self, session: SemanticCacheSession, **kwargs):
+        super().__init__(**kwargs)
+        self._session = session
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TTSAudioRawFrame):
+            self._session._on_audio(frame)
+        elif isinstance(frame, TTSStoppedFrame):
+            self._session._on_tts_stopped()
+        elif isinstance(frame, BotStoppedSpeakingFrame):
+            self._session._on_bot_stopped_speaking()
+        elif isinstance(frame, InterruptionFrame):
+            self._session._discard()
+
+        await self.push_frame(frame, direction)
@@ -0,0 +1,412 @@
+"""Per-session memory accounting and leak checks for long-lived workers.
+
+A worker serves call after call in one process, so anything a call leaves
+behind shows up as RSS creeping up over the day. ``SessionMemory`` measures
+what one call holds while it runs:
+
+- ``context_bytes``: the LLM context's messages, as JSON;
+- ``audio_buffer_bytes``: bytes/arrays held by the pipeline's processors and
+  the transport (STT and output buffers, recordings, ...);
+- ``model_state_bytes``: the same, held by the call's VAD and turn analyzers;
+- ``pending_frames`` / ``pending_frame_bytes``: frames waiting in processor and
+  transport queues.
+
+These are Python-visible sizes, not RSS: native memory (ONNX sessions,
+websocket buffers) isn't counted. Every ``report_secs`` they're pushed down
+the pipeline as a ``MetricsFrame`` with ``SessionMemoryMetricsData``.
+
+When the session closes, everything the call owned (task, processors,
+transport, context, analyzers) is checked, ``LEAK_CHECK_SECS`` later, to have
+been garbage collected. Weak reference callbacks note each object as it's
+freed, so a call whose objects are all gone costs nothing to check. Objects
+still alive may only be waiting for the cycle collector: at most once every
+``COLLECT_SECS``, and only if some closed call still has survivors, one full
+collection runs for all of them. Survivors after that are logged with what
+still refers to them and added to ``memory_ledger``, whose ``snapshot()`` has
+live and leaked bytes for the whole process::
+
+    async def run_bot(transport, runner_args, session):
+        ...
+        task = PipelineTask(pipeline, ...)
+        SessionMemory(session, task, pipeline, context=context, transport=transport)
+"""
+
+import asyncio
+import gc
+import json
+import os
+import time
+import weakref
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from pipecat.frames.frames import Frame, MetricsFrame
+from pipecat.metrics.metrics import MetricsData
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.llm_context import LLMContext
+from pipecat.processors.frame_processor import FrameProcessor
+from pipecat.transports.base_transport import BaseTransport
+from pipecat.utils.base_object import BaseObject
+
+from utils.sessions import Session
+
+REPORT_SECS = 30.0
+
+# How long after a session closes its objects must be gone. Gives the runner
+# and transport time to finish tearing down.
+LEAK_CHECK_SECS = 10.0
+
+# Least time between forced full collections. One takes ~100ms with the bots'
+# modules loaded, stalling every call's audio, so it's shared by all the calls
+# closed meanwhile.
+COLLECT_SECS = 300.0
+
+# How deep to follow plain attributes from a processor looking for buffers.
+SCAN_DEPTH = 3
+
+
+class SessionMemoryMetricsData(MetricsData):
+    """What one session holds in memory right now.
+
+    Parameters:
+        context_bytes: Size of the LLM context's messages, as JSON.
+        audio_buffer_bytes: Buffers held by processors and the transport.
+        model_state_bytes: Buffers held by the VAD and turn analyzers.
+        pending_frames: Frames waiting in queues.
+        pending_frame_bytes: Audio and image payload of those frames.
+        total_bytes: Sum of the byte counts above.
+    """
+
+    context_bytes: int
+    audio_buffer_bytes: int
+    model_state_bytes: int
+    pending_frames: int
+    pending_frame_bytes: int
+    total_bytes: int
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _frames_in(item: Any) -> Iterable[Frame]:
+    # Queue items are a frame, (frame, direction, callback), or that tuple
+    # wrapped in (priority, counter, ...) by FrameProcessorQueue.
+    if isinstance(item, Frame):
+        yield item
+    elif isinstance(item, tuple):
+        for element in item:
+            yield from _frames_in(element)
+
+
+def _frame_bytes(frame: Frame) -> int:
+    payload = getattr(frame, "audio", None) or getattr(frame, "image", None)
+    return len(payload) if isinstance(payload, (bytes, bytearray)) else 0
+
+
+class _Usage:
+    """Buffer and queue totals found while scanning objects."""
+
+    def __init__(self):
+        self.buffer_bytes = 0
+        self.pending_frames = 0
+        self.pending_frame_bytes = 0
+        self._seen: set = set()
+
+    def scan(self, obj: Any, depth: int = SCAN_DEPTH):
+        """Add up buffers and queued frames reachable from ``obj``'s attributes."""
+        if id(obj) in self._seen:
+            return
+        self._seen.add(id(obj))
+        try:
+            attrs = vars(obj)
+        except TypeError:
+            return
+        for value in list(attrs.values()):
+            self._scan_value(value, depth)
+
+    def _scan_value(self, value: Any, depth: int):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            self.buffer_bytes += len(value)
+        elif isinstance(getattr(value, "nbytes", None), int):  # numpy arrays
+            self.buffer_bytes += value.nbytes
+        elif isinstance(value, asyncio.Queue):
+            if id(value) in self._seen:
+                return
+            self._seen.add(id(value))
+            for item in list(getattr(value, "_queue", ())):
+                for frame in _frames_in(item):
+                    self.pending_frames += 1
+                    self.pending_frame_bytes += _frame_bytes(frame)
+        elif isinstance(value, (list, tuple)) and depth > 0:
+            for element in value[:1000]:
+                self._scan_value(element, depth - 1)
+        elif (
+            depth > 0
+            and not isinstance(value, (BaseObject, type, asyncio.AbstractEventLoop))
+            and hasattr(value, "__dict__")
+        ):
+            # Follow helpers (media senders, model wrappers) but not other
+            # processors, transports or tasks: those are scanned on their own.
+            self.scan(value, depth - 1)
+
+
+class SessionMemory:
+    """Measures one session's memory while it runs and checks it's freed after."""
+
+    def __init__(
+        self,
+        session: Session,
+        task: PipelineTask,
+        pipeline: Pipeline,
+        *,
+        context: Optional[LLMContext] = None,
+        transport: Optional[BaseTransport] = None,
+        report_secs: float = REPORT_SECS,
+    ):
+        """Start accounting for ``session`` and attach to it for the leak check.
+
+        Args:
+            session: The call's session; the leak check runs when it closes.
+            task: The call's pipeline task. Metrics are queued into it.
+            pipeline: The call's pipeline. Nested pipelines are included.
+            context: The call's LLM context.
+            transport: The call's transport. Its VAD and turn analyzers count
+                as model state.
+            report_secs: How often metrics are pushed.
+        """
+        self._session_name = str(session)
+        self._report_secs = report_secs
+        self._context = weakref.ref(context) if context is not None else None
+
+        self._processors = weakref.WeakSet(_flatten(pipeline))
+        self._processors.add(pipeline)
+        params = getattr(transport, "_params", None)
+        self._analyzers = weakref.WeakSet(
+            analyzer
+            for analyzer in (
+                getattr(params, "vad_analyzer", None),
+                getattr(params, "turn_analyzer", None),
+            )
+            if analyzer is not None
+        )
+        if transport is not None:
+            self._processors.add(transport)
+
+        # Everything that should be gone once the call is over.
+        owned: List[Any] = [task, pipeline, *self._processors, *self._analyzers]
+        if context is not None:
+            owned.append(context)
+        if transport is not None:
+            owned.append(transport)
+        self._release = _ReleaseCheck(self._session_name, owned)
+
+        self._report_task: Optional[asyncio.Task] = None
+        self.latest: Optional[SessionMemoryMetricsData] = None
+
+        @task.event_handler("on_pipeline_started")
+        async def on_pipeline_started(task, frame):
+            self._report_task = asyncio.create_task(self._report(task))
+
+        session.add("memory", self, close=self.close)
+        memory_ledger._live[self._session_name] = self
+
+    def measure(self) -> SessionMemoryMetricsData:
+        """Size up what the session holds now."""
+        context = self._context() if self._context else None
+        context_bytes = (
+            len(json.dumps(context.get_messages(), default=str)) if context is not None else 0
+        )
+
+        processors = _Usage()
+        for processor in list(self._processors):
+            processors.scan(processor)
+        analyzers = _Usage()
+        for analyzer in list(self._analyzers):
+            analyzers.scan(analyzer)
+
+        pending_frame_bytes = processors.pending_frame_bytes + analyzers.pending_frame_bytes
+        self.latest = SessionMemoryMetricsData(
+            processor=self._session_name,
+            context_bytes=context_bytes,
+            audio_buffer_bytes=processors.buffer_bytes,
+            model_state_bytes=analyzers.buffer_bytes,
+            pending_frames=processors.pending_frames + analyzers.pending_frames,
+            pending_frame_bytes=pending_frame_bytes,
+            total_bytes=context_bytes
+            + processors.buffer_bytes
+            + analyzers.buffer_bytes
+            + pending_frame_bytes,
+        )
+        return self.latest
+
+    async def close(self):
+        """Stop reporting and schedule the leak check."""
+        if self._report_task:
+            self._report_task.cancel()
+            self._report_task = None
+        memory_ledger._live.pop(self._session_name, None)
+        memory_ledger._closed(self._release)
+
+    async def _report(self, task: PipelineTask):
+        while True:
+            await asyncio.sleep(self._report_secs)
+            await task.queue_frame(MetricsFrame(data=[self.measure()]))
+
+
+def _flatten(pipeline: Pipeline) -> List[FrameProcessor]:
+    processors = []
+    for processor in pipeline.processors:
+        processors.append(processor)
+        if processor.processors:
+            processors.extend(_flatten(processor))
+    return processors
+
+
+class _ReleaseCheck:
+    """Which of a session's objects are still alive, updated as they're freed."""
+
+    def __init__(self, session_name: str, owned: List[Any]):
+        self.session_name = session_name
+        self.closed_at: Optional[float] = None
+        self._refs: Dict[int, weakref.ref] = {}
+        for obj in owned:
+            ref = weakref.ref(obj, self._freed)
+            self._refs[id(ref)] = ref
+
+    def _freed(self, ref: weakref.ref):
+        self._refs.pop(id(ref), None)
+
+    @property
+    def released(self) -> bool:
+        return not self._refs
+
+    def survivors(self) -> List[Any]:
+        return [obj for obj in (ref() for ref in list(self._refs.values())) if obj is not None]
+
+
+def _referrers(obj: Any, survivors: List[Any], limit: int = 5) -> List[str]:
+    """Types of what's keeping ``obj`` alive, other than the session's own objects."""
+    ignore = {id(survivors), *map(id, survivors)}
+    names = []
+    for referrer in gc.get_referrers(obj):
+        if id(referrer) in ignore or type(referrer).__name__ == "frame":
+            continue
+        owner = referrer
+        if isinstance(referrer, dict):
+            # Most likely an instance's __dict__: name the instance instead.
+            owners = [
+                r for r in gc.get_referrers(referrer) if getattr(r, "__dict__", None) is referrer
+            ]
+            owner = owners[0] if owners else referrer
+            if id(owner) in ignore:
+                continue
+        names.append(type(owner).__qualname__)
+        if len(names) >= limit:
+            break
+    return names
+
+
+class MemoryLedger:
+    """Process-wide live and leaked session memory."""
+
+    def __init__(self):
+        """Initialize an empty ledger."""
+        self._live: Dict[str, SessionMemory] = {}
+        self._closing: List[_ReleaseCheck] = []
+        self._sweep_handle: Optional[asyncio.TimerHandle] = None
+        self._last_collect = float("-inf")
+        self._collections = 0
+        self._checked = 0
+        self._leaked_sessions = 0
+        self._leaked_bytes = 0
+        self._leaked_objects: Counter = Counter()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live bytes per session and what closed sessions left behind."""
+        live = {name: memory.measure().total_bytes for name, memory in list(self._live.items())}
+        return {
+            "rss_bytes": _rss_bytes(),
+            "live_sessions": len(live),
+            "live_bytes": sum(live.values()),
+            "live_bytes_by_session": live,
+            "checked_sessions": self._checked,
+            "pending_checks": len(self._closing),
+            "forced_collections": self._collections,
+            "leaked_sessions": self._leaked_sessions,
+            "leaked_bytes": self._leaked_bytes,
+            "leaked_objects": dict(self._leaked_objects.most_common(10)),
+        }
+
+    def _closed(self, check: _ReleaseCheck):
+        check.closed_at = time.monotonic()
+        self._closing.append(check)
+        if self._sweep_handle is None:
+            self._sweep_handle = asyncio.get_running_loop().call_later(LEAK_CHECK_SECS, self._sweep)
+
+    def _sweep(self):
+        self._sweep_handle = None
+        now = time.monotonic()
+        due = [c for c in self._closing if now - c.closed_at >= LEAK_CHECK_SECS]
+        for check in due:
+            if check.released:
+                self._done(check)
+                logger.debug(f"Session {check.session_name} released all its objects")
+
+        suspects = [c for c in due if not c.released]
+        if suspects and now - self._last_collect >= COLLECT_SECS:
+            # One collection for every closed session still holding objects:
+            # most are only waiting for their reference cycles to be collected.
+            gc.collect()
+            self._last_collect = now
+            self._collections += 1
+            leaks = 0
+            for check in suspects:
+                self._done(check)
+                if not check.released:
+                    # Walking the heap for referrers is costly: one session per sweep.
+                    self._report_leak(check, with_referrers=leaks == 0)
+                    leaks += 1
+
+        if self._closing:
+            self._sweep_handle = asyncio.get_running_loop().call_later(LEAK_CHECK_SECS, self._sweep)
+
+    def _done(self, check: _ReleaseCheck):
+        self._closing.remove(check)
+        self._checked += 1
+
+    def _report_leak(self, check: _ReleaseCheck, *, with_referrers: bool):
+        survivors = check.survivors()
+        usage = _Usage()
+        leaked_bytes = 0
+        for obj in survivors:
+            usage.scan(obj)
+            if isinstance(obj, LLMContext):
+                leaked_bytes += len(json.dumps(obj.get_messages(), default=str))
+        leaked_bytes += usage.buffer_bytes + usage.pending_frame_bytes
+
+        self._leaked_sessions += 1
+        self._leaked_bytes += leaked_bytes
+        self._leaked_objects.update(type(obj).__name__ for obj in survivors)
+        held_by: List[Tuple[str, List[str]]] = (
+            [(type(obj).__name__, _referrers(obj, survivors)) for obj in survivors[:3]]
+            if with_referrers
+            else []
+        )
+        logger.warning(
+            f"Session {check.session_name} leaked {len(survivors)} objects "
+            f"(~{leaked_bytes} bytes, {self._leaked_bytes} leaked in total) "
+            f"{time.monotonic() - check.closed_at:.0f}s after closing"
+            + (f"; held by: {held_by}" if held_by else "")
+        )
+        del survivors
+
+
+# The ledger for this worker process.
+memory_ledger = MemoryLedger()
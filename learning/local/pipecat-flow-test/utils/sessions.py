@@ -0,0 +1,229 @@
+"""Process-wide registry of live bot sessions and the resources they use.
+
+A worker process can host many calls at once as long as nothing per-call lives
+in a module global. ``SessionRegistry`` splits resources into two kinds:
+
+- Shared resources (model clients, HTTP sessions) are created once per process
+  with ``shared()`` and handed to every call. They must be safe to use from
+  concurrent calls.
+- Per-call resources (mute state, filters, flow state) are created inside
+  ``run_bot`` and attached to that call's ``Session`` with ``add()``. They are
+  released when the session closes.
+
+Every live session is tracked with its resource footprint, so
+``snapshot()`` shows how many calls the process is carrying and what each
+one holds: every resource's type, and its size where it has one (messages
+and bytes of an LLM context, bytes of a buffer, items of a container).
+Call ``close_shared()`` when the worker shuts down::
+
+    async def run_bot(transport, runner_args):
+        async with sessions.open("kpit") as session:
+            state = session.add("message_state", MessageState())
+            llm_temp = sessions.shared("llm_temp", create_llm_temp)
+            ...
+            await runner.run(task)
+"""
+
+import asyncio
+import inspect
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
+
+from loguru import logger
+
+T = TypeVar("T")
+
+Closer = Callable[[], Union[None, Awaitable[None]]]
+
+# Closes a shared resource, given the resource.
+SharedCloser = Callable[[Any], Union[None, Awaitable[None]]]
+
+
+async def _run_closer(name: str, close: Closer):
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.warning(f"Error closing {name}: {e}")
+
+
+def _measure(resource: Any) -> Dict[str, Any]:
+    """A resource's type, and its size where it has one."""
+    measure: Dict[str, Any] = {"type": type(resource).__name__}
+    # LLM contexts, directly or through what holds them (pipeline templates).
+    context = getattr(resource, "context", resource)
+    messages = getattr(context, "messages", None)
+    if isinstance(messages, list):
+        measure["messages"] = len(messages)
+        measure["bytes"] = len(json.dumps(messages, default=str))
+    elif isinstance(resource, (bytes, bytearray, memoryview)):
+        measure["bytes"] = len(resource)
+    elif isinstance(getattr(resource, "nbytes", None), int):  # numpy arrays
+        measure["bytes"] = resource.nbytes
+    elif hasattr(resource, "__len__"):
+        try:
+            measure["items"] = len(resource)
+        except TypeError:
+            pass
+    if isinstance(getattr(resource, "ready", None), int):  # pools
+        measure["ready"] = resource.ready
+    return measure
+
+
+class Session:
+    """One live call and the per-call resources attached to it."""
+
+    def __init__(self, bot: str, session_id: Optional[str] = None):
+        """Initialize the session.
+
+        Args:
+            bot: Name of the bot serving the call (e.g. "kpit").
+            session_id: Call identifier. Defaults to a random id.
+        """
+        self.bot = bot
+        self.session_id = session_id or uuid.uuid4().hex[:8]
+        self.started_at = time.monotonic()
+        self._resources: Dict[str, Any] = {}
+        self._closers: List[tuple[str, Closer]] = []
+
+    def add(self, name: str, resource: T, *, close: Optional[Closer] = None) -> T:
+        """Attach a per-call resource, optionally with a cleanup callback.
+
+        Returns:
+            The resource, so it can be created and attached in one line.
+        """
+        self._resources[name] = resource
+        if close:
+            self._closers.append((name, close))
+        return resource
+
+    def get(self, name: str) -> Any:
+        """Return a resource attached with ``add()``."""
+        return self._resources[name]
+
+    def footprint(self) -> Dict[str, Any]:
+        """What this session holds, for ``SessionRegistry.snapshot()``."""
+        return {
+            "session_id": self.session_id,
+            "bot": self.bot,
+            "age_secs": round(time.monotonic() - self.started_at, 1),
+            "resources": {name: _measure(res) for name, res in self._resources.items()},
+        }
+
+    async def close(self):
+        """Run cleanup callbacks (newest first) and drop all resources."""
+        for name, close in reversed(self._closers):
+            await _run_closer(f"{self.session_id}/{name}", close)
+        self._closers.clear()
+        self._resources.clear()
+
+    def __str__(self):
+        return f"{self.bot}#{self.session_id}"
+
+
+class SessionRegistry:
+    """Tracks live sessions and owns the process-wide shared resources."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._sessions: Dict[str, Session] = {}
+        self._shared: Dict[str, Any] = {}
+        self._shared_closers: Dict[str, SharedCloser] = {}
+        self._shared_lock = threading.Lock()
+        self._total_sessions = 0
+        self._peak_sessions = 0
+
+    @property
+    def live_sessions(self) -> int:
+        """Number of calls currently open in this process."""
+        return len(self._sessions)
+
+    def shared(
+        self, name: str, factory: Callable[[], T], *, close: Optional[SharedCloser] = None
+    ) -> T:
+        """Return the process-wide resource ``name``, creating it on first use.
+
+        Creation is guarded by a lock, so concurrent first uses (including from
+        worker threads) still build the resource only once.
+
+        Args:
+            name: Key the resource is shared under.
+            factory: Builds the resource the first time it is asked for.
+            close: Optional cleanup run by ``close_shared()``, called with the
+                resource (e.g. ``lambda session: session.close()``).
+        """
+        resource = self._shared.get(name)
+        if resource is not None:
+            return resource
+        with self._shared_lock:
+            if name not in self._shared:
+                self._shared[name] = factory()
+                if close:
+                    self._shared_closers[name] = close
+                logger.debug(f"Created shared resource {name}")
+            return self._shared[name]
+
+    @asynccontextmanager
+    async def open(self, bot: str, session_id: Optional[str] = None) -> AsyncIterator[Session]:
+        """Register a call for the duration of the ``async with`` block."""
+        session = Session(bot, session_id)
+        self._sessions[session.session_id] = session
+        self._total_sessions += 1
+        self._peak_sessions = max(self._peak_sessions, self.live_sessions)
+        logger.info(f"Session {session} opened ({self.live_sessions} live)")
+        try:
+            yield session
+        finally:
+            # Release the session's resources even if the call was cancelled.
+            await asyncio.shield(session.close())
+            self._sessions.pop(session.session_id, None)
+            logger.info(
+                f"Session {session} closed after "
+                f"{time.monotonic() - session.started_at:.0f}s ({self.live_sessions} live)"
+            )
+
+    def session_for_processor(self, processor: Any) -> Optional[Session]:
+        """Find the session running ``processor``.
+
+        Only sessions that attached their ``PipelineTask`` as ``"pipeline_task"``
+        can be found: processors share their pipeline task's task manager.
+        """
+        task_manager = getattr(processor, "_task_manager", None)
+        if task_manager is None:
+            return None
+        for session in list(self._sessions.values()):
+            task = session._resources.get("pipeline_task")
+            if task is not None and getattr(task, "_task_manager", None) is task_manager:
+                return session
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live sessions and their footprints, plus the shared resources in use."""
+        return {
+            "live_sessions": self.live_sessions,
+            "peak_sessions": self._peak_sessions,
+            "total_sessions": self._total_sessions,
+            "shared": {name: _measure(res) for name, res in self._shared.items()},
+            "sessions": [session.footprint() for session in self._sessions.values()],
+        }
+
+    async def close_shared(self):
+        """Close the shared resources, e.g. when the worker shuts down."""
+        with self._shared_lock:
+            closers = [
+                (name, close, self._shared[name]) for name, close in self._shared_closers.items()
+            ]
+            self._shared_closers.clear()
+            self._shared.clear()
+        for name, close, resource in closers:
+            await _run_closer(name, partial(close, resource))
+
+
+# The registry for this worker process.
+sessions = SessionRegistry()
@@ -0,0 +1,137 @@
+"""STT services whose streaming connection can be opened before the call starts.
+
+``DeepgramSTTService`` and ``CartesiaSTTService`` open their websocket when
+the pipeline starts, after the transport has connected; a user who speaks
+straight away is cut off until it's up. These subclasses add:
+
+- ``prewarm()``: open the connection now, with the settings the call will
+  most likely use;
+- ``is_warm()``: whether that connection is still open and fresh enough to
+  hand to a call;
+- ``close_warm()``: close it if it was never used.
+
+When the pipeline starts, the service keeps the warm connection if its
+settings still match the call's (sample rate), and reconnects otherwise, as
+it would have anyway. ``PipelineTemplatePool`` warms the STT of the templates
+it keeps ready and recycles stale ones (see ``utils.pipeline_pool``)::
+
+    stt = PrewarmedDeepgramSTTService(api_key=..., live_options=live_options)
+    await stt.prewarm()
+"""
+
+import time
+from typing import Optional
+
+from loguru import logger
+from pipecat.services.cartesia.stt import CartesiaSTTService
+from pipecat.services.deepgram.stt import DeepgramSTTService
+from websockets.protocol import State
+
+# Longest a warm connection waits for a call. Cartesia drops idle
+# connections after 5 minutes and has no keepalive, so stay well under that.
+WARM_TTL_SECS = 240
+
+# Sample rate of calls that don't set one (PipelineParams' default).
+DEFAULT_SAMPLE_RATE = 16000
+
+
+class PrewarmedDeepgramSTTService(DeepgramSTTService):
+    """Deepgram STT that can connect ahead of the call.
+
+    The Deepgram client sends KeepAlive messages while the connection waits.
+    """
+
+    def __init__(self, *, prewarm_sample_rate: int = DEFAULT_SAMPLE_RATE, **kwargs):
+        """Initialize the service.
+
+        Args:
+            prewarm_sample_rate: Sample rate to connect with ahead of the call.
+                Calls at another rate reconnect when they start.
+            **kwargs: Arguments for ``DeepgramSTTService``.
+        """
+        super().__init__(**kwargs)
+        self._prewarm_sample_rate = prewarm_sample_rate
+        self._warm_since: Optional[float] = None
+
+    async def prewarm(self) -> bool:
+        """Open the connection now. Returns whether it's open."""
+        self._settings["sample_rate"] = self._prewarm_sample_rate
+        await super()._connect()
+        if await self._connection.is_connected():
+            self._warm_since = time.monotonic()
+            return True
+        return False
+
+    async def is_warm(self) -> bool:
+        """Whether the connection opened by ``prewarm()`` can still be used."""
+        if self._warm_since is None or time.monotonic() - self._warm_since > WARM_TTL_SECS:
+            return False
+        return await self._connection.is_connected()
+
+    async def close_warm(self):
+        """Close the connection opened by ``prewarm()``, if the call never took it."""
+        if self._warm_since is not None:
+            self._warm_since = None
+            await self._disconnect()
+
+    async def _connect(self):
+        # Called from start() with the call's settings: keep the warm
+        # connection if it matches them.
+        if self._warm_since is not None:
+            warm = (
+                await self.is_warm() and self._settings["sample_rate"] == self._prewarm_sample_rate
+            )
+            self._warm_since = None
+            if warm:
+                logger.debug(f"{self}: using the prewarmed Deepgram connection")
+                return
+            await self._disconnect()
+        await super()._connect()
+
+
+class PrewarmedCartesiaSTTService(CartesiaSTTService):
+    """Cartesia STT that can connect ahead of the call.
+
+    Cartesia's connection settings don't depend on the call, so the warm
+    connection is always the one the call uses.
+    """
+
+    def __init__(self, **kwargs):
+        """Initialize the service.
+
+        Args:
+            **kwargs: Arguments for ``CartesiaSTTService``.
+        """
+        super().__init__(**kwargs)
+        self._warm_since: Optional[float] = None
+
+    async def prewarm(self) -> bool:
+        """Open the connection now. Returns whether it's open."""
+        # Only the websocket: the receive task starts with the pipeline.
+        await self._connect_websocket()
+        if self._websocket and self._websocket.state is State.OPEN:
+            self._warm_since = time.monotonic()
+            return True
+        return False
+
+    async def is_warm(self) -> bool:
+        """Whether the connection opened by ``prewarm()`` can still be used."""
+        if self._warm_since is None or time.monotonic() - self._warm_since > WARM_TTL_SECS:
+            return False
+        return bool(self._websocket and self._websocket.state is State.OPEN)
+
+    async def close_warm(self):
+        """Close the connection opened by ``prewarm()``, if the call never took it."""
+        if self._warm_since is not None:
+            self._warm_since = None
+            await self._disconnect_websocket()
+
+    async def _connect(self):
+        if self._warm_since is not None:
+            stale = not await self.is_warm()
+            self._warm_since = None
+            if stale:
+                await self._disconnect_websocket()
+            else:
+                logger.debug(f"{self}: using the prewarmed Cartesia connection")
+        await super()._connect()
@@ -0,0 +1,172 @@
+"""Native 8 kHz μ-law audio path for telephony transports.
+
+By default a Twilio call is decoded from μ-law, resampled up to the pipeline
+rate (16 kHz in, 24 kHz out) for VAD, STT and TTS, and resampled back down to
+8 kHz before being re-encoded. Phone audio never carries more than 8 kHz of
+bandwidth, so all of that work is wasted.
+
+This module keeps a telephony call at 8 kHz end to end:
+
+- ``telephony_audio_params()`` runs the pipeline (and therefore Silero VAD, the
+  STT and the TTS services) at 8 kHz, so no stage needs to resample.
+- ``use_native_telephony_audio()`` swaps the transport's Twilio serializer for
+  ``TelephonyFrameSerializer``, which encodes/decodes μ-law with NumPy lookup
+  tables and only touches its per-stream resampler if the rates still differ.
+
+Usage::
+
+    transport = await create_transport(runner_args, transport_params)
+    use_native_telephony_audio(transport)
+    ...
+    task = PipelineTask(
+        pipeline,
+        params=PipelineParams(allow_interruptions=True, **telephony_audio_params(transport)),
+    )
+"""
+
+import base64
+import json
+
+import numpy as np
+from pipecat.frames.frames import AudioRawFrame, Frame, InputAudioRawFrame
+from pipecat.serializers.twilio import TwilioFrameSerializer
+from pipecat.transports.base_transport import BaseTransport
+from pipecat.transports.websocket.fastapi import FastAPIWebsocketTransport
+
+TELEPHONY_SAMPLE_RATE = 8000
+
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 8159
+_ULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+
+def _build_ulaw_decode_table() -> np.ndarray:
+    """Build the 256-entry G.711 μ-law to 16-bit PCM table."""
+    ulaw = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (ulaw >> 4) & 0x07
+    mantissa = ulaw & 0x0F
+    magnitude = (((mantissa << 3) + _ULAW_BIAS) << exponent) - _ULAW_BIAS
+    return np.where(ulaw & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _build_ulaw_encode_table() -> np.ndarray:
+    """Build the 65536-entry 16-bit PCM to G.711 μ-law table.
+
+    The table is indexed by the sample reinterpreted as ``uint16`` and matches
+    ``audioop.lin2ulaw`` bit for bit (14-bit magnitude, segment search).
+    """
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), _ULAW_CLIP) + (_ULAW_BIAS >> 2)
+    segment = np.searchsorted(_ULAW_SEGMENT_ENDS, magnitude)
+    ulaw = (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    ulaw = np.where(segment >= 8, 0x7F, ulaw)  # clipped past the last segment
+    return (ulaw ^ mask).astype(np.uint8)
+
+
+_ULAW_TO_PCM = _build_ulaw_decode_table()
+_PCM_TO_ULAW = _build_ulaw_encode_table()
+
+
+def ulaw_decode(ulaw_bytes: bytes) -> bytes:
+    """Decode μ-law bytes into 16-bit little-endian PCM."""
+    return _ULAW_TO_PCM[np.frombuffer(ulaw_bytes, dtype=np.uint8)].tobytes()
+
+
+def ulaw_encode(pcm_bytes: bytes) -> bytes:
+    """Encode 16-bit little-endian PCM into μ-law bytes."""
+    return _PCM_TO_ULAW[np.frombuffer(pcm_bytes, dtype=np.uint16)].tobytes()
+
+
+class TelephonyFrameSerializer(TwilioFrameSerializer):
+    """Twilio serializer using lookup-table μ-law codecs.
+
+    Behaves exactly like ``TwilioFrameSerializer`` for every non-audio event.
+    Audio is only resampled when the pipeline does not already run at the
+    Twilio rate, and then through the serializer's own stream resamplers, so
+    each call keeps a single resampler per direction.
+    """
+
+    @classmethod
+    def from_twilio(cls, serializer: TwilioFrameSerializer) -> "TelephonyFrameSerializer":
+        """Take over the state of an already configured Twilio serializer.
+
+        ``create_transport()`` builds the Twilio serializer from the call data
+        Twilio sends on connect, so we reuse it rather than parsing it again.
+        """
+        native = cls.__new__(cls)
+        native.__dict__.update(serializer.__dict__)
+        return native
+
+    async def serialize(self, frame: Frame) -> str | bytes | None:
+        """Serialize a frame, encoding audio straight to 8 kHz μ-law."""
+        if not isinstance(frame, AudioRawFrame):
+            return await super().serialize(frame)
+
+        pcm = frame.audio
+        if frame.sample_rate != self._twilio_sample_rate:
+            pcm = await self._output_resampler.resample(
+                pcm, frame.sample_rate, self._twilio_sample_rate
+            )
+        if not pcm:
+            return None
+
+        payload = base64.b64encode(ulaw_encode(pcm)).decode("utf-8")
+        return json.dumps(
+            {"event": "media", "streamSid": self._stream_sid, "media": {"payload": payload}}
+        )
+
+    async def deserialize(self, data: str | bytes) -> Frame | None:
+        """Deserialize a Twilio event, decoding media payloads with the lookup table."""
+        message = json.loads(data)
+        if message["event"] != "media":
+            return await super().deserialize(data)
+
+        pcm = ulaw_decode(base64.b64decode(message["media"]["payload"]))
+        if self._sample_rate != self._twilio_sample_rate:
+            pcm = await self._input_resampler.resample(
+                pcm, self._twilio_sample_rate, self._sample_rate
+            )
+        if not pcm:
+            return None
+
+        return InputAudioRawFrame(audio=pcm, num_channels=1, sample_rate=self._sample_rate)
+
+
+def is_telephony(transport: BaseTransport) -> bool:
+    """Whether the transport is a telephony (Twilio media stream) connection."""
+    return isinstance(transport, FastAPIWebsocketTransport) and isinstance(
+        transport._params.serializer, TwilioFrameSerializer
+    )
+
+
+def use_native_telephony_audio(transport: BaseTransport) -> bool:
+    """Switch a Twilio transport to the lookup-table serializer.
+
+    The input and output transports share the same params object, so swapping
+    the serializer there covers both directions.
+
+    Returns:
+        True if the transport is a telephony transport, False otherwise.
+    """
+    if not is_telephony(transport):
+        return False
+
+    params = transport._params
+    if not isinstance(params.serializer, TelephonyFrameSerializer):
+        params.serializer = TelephonyFrameSerializer.from_twilio(params.serializer)
+    return True
+
+
+def telephony_audio_params(transport: BaseTransport) -> dict:
+    """``PipelineParams`` overrides that keep a telephony call at 8 kHz.
+
+    Returns an empty dict for non-telephony transports, so it can always be
+    splatted into ``PipelineParams``.
+    """
+    if not is_telephony(transport):
+        return {}
+    return {
+        "audio_in_sample_rate": TELEPHONY_SAMPLE_RATE,
+        "audio_out_sample_rate": TELEPHONY_SAMPLE_RATE,
+    }
@@ -0,0 +1,305 @@
+"""LLM token, request and latency accounting per flow node, session and process.
+
+With ``PipelineParams(enable_metrics=True, enable_usage_metrics=True)`` the
+LLM reports each request's token usage, TTFB and processing time as
+``MetricsFrame``\\ s. ``SessionUsage`` watches the call's task for them and adds
+each one to:
+
+- the call's totals, per flow node (``flow_manager.current_node``);
+- the process totals in ``usage_ledger``, per node and per bot.
+
+A ``UsageBudget`` caps what one call may use:
+
+- ``max_prompt_tokens``: when a request's prompt is bigger than this, the
+  context is compacted (older messages summarized, see
+  ``utils.context_compaction``);
+- ``max_session_tokens``: once the call has used this many tokens in total,
+  its LLM is switched to ``cheaper_model``.
+
+::
+
+    flow_manager = FlowManager(task=task, llm=llm, ...)
+    SessionUsage(
+        session,
+        task,
+        flow_manager=flow_manager,
+        context=context,
+        llm=llm,
+        budget=UsageBudget.from_env(),
+    )
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from pipecat.frames.frames import LLMUpdateSettingsFrame, MetricsFrame
+from pipecat.metrics.metrics import LLMUsageMetricsData, ProcessingMetricsData, TTFBMetricsData
+from pipecat.observers.base_observer import BaseObserver, FramePushed
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.llm_context import LLMContext
+from pipecat.services.llm_service import LLMService
+from pipecat_flows import FlowManager
+
+from utils.context_compaction import KEEP_LAST, compact_context
+from utils.sessions import Session
+
+# Node name for requests made outside a flow, or before it starts.
+NO_NODE = "-"
+
+MAX_PROMPT_TOKENS = 8000
+
+
+class UsageTotals:
+    """Requests, tokens and LLM latency added up."""
+
+    def __init__(self):
+        """Initialize empty totals."""
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.max_prompt_tokens = 0
+        self._ttfb_secs = 0.0
+        self._ttfb_count = 0
+        self._max_ttfb_secs = 0.0
+        self._processing_secs = 0.0
+        self._processing_count = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int):
+        """Add one request's token usage."""
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+
+    def add_ttfb(self, secs: float):
+        """Add one request's time to first byte."""
+        self._ttfb_secs += secs
+        self._ttfb_count += 1
+        self._max_ttfb_secs = max(self._max_ttfb_secs, secs)
+
+    def add_processing(self, secs: float):
+        """Add one request's total processing time."""
+        self._processing_secs += secs
+        self._processing_count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The totals, with mean latencies in milliseconds."""
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "avg_ttfb_ms": round(self._ttfb_secs / self._ttfb_count * 1000)
+            if self._ttfb_count
+            else None,
+            "max_ttfb_ms": round(self._max_ttfb_secs * 1000),
+            "avg_processing_ms": round(self._processing_secs / self._processing_count * 1000)
+            if self._processing_count
+            else None,
+        }
+
+
+class _Usage:
+    """Totals overall and per node."""
+
+    def __init__(self):
+        self.total = UsageTotals()
+        self.nodes: Dict[str, UsageTotals] = defaultdict(UsageTotals)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.total.snapshot(),
+            "by_node": {node: totals.snapshot() for node, totals in self.nodes.items()},
+        }
+
+
+@dataclass
+class UsageBudget:
+    """Limits on one call's LLM usage.
+
+    Parameters:
+        max_prompt_tokens: Compact the context when a request's prompt is
+            bigger than this.
+        max_session_tokens: Switch to ``cheaper_model`` once the call has used
+            this many tokens.
+        cheaper_model: Model to switch to.
+        keep_last: Messages kept as they are when compacting.
+    """
+
+    max_prompt_tokens: Optional[int] = None
+    max_session_tokens: Optional[int] = None
+    cheaper_model: Optional[str] = None
+    keep_last: int = KEEP_LAST
+
+    @classmethod
+    def from_env(cls) -> "UsageBudget":
+        """Budget from ``LLM_MAX_PROMPT_TOKENS`` (default ``MAX_PROMPT_TOKENS``),
+        ``LLM_MAX_SESSION_TOKENS`` and ``LLM_CHEAPER_MODEL``.
+        """
+        session_tokens = os.getenv("LLM_MAX_SESSION_TOKENS")
+        return cls(
+            max_prompt_tokens=int(os.getenv("LLM_MAX_PROMPT_TOKENS", MAX_PROMPT_TOKENS)),
+            max_session_tokens=int(session_tokens) if session_tokens else None,
+            cheaper_model=os.getenv("LLM_CHEAPER_MODEL"),
+        )
+
+
+class UsageLedger:
+    """Process-wide LLM usage, per node and per bot."""
+
+    def __init__(self):
+        """Initialize an empty ledger."""
+        self._usage = _Usage()
+        self._bots: Dict[str, UsageTotals] = defaultdict(UsageTotals)
+        self._live: Dict[str, "SessionUsage"] = {}
+        self.compactions = 0
+        self.downgrades = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Process totals, per node, per bot and per live session."""
+        return {
+            **self._usage.snapshot(),
+            "by_bot": {bot: totals.snapshot() for bot, totals in self._bots.items()},
+            "live_sessions": {
+                name: usage.total.total_tokens for name, usage in list(self._live.items())
+            },
+            "compactions": self.compactions,
+            "downgrades": self.downgrades,
+        }
+
+
+# The ledger for this worker process.
+usage_ledger = UsageLedger()
+
+
+class SessionUsage(BaseObserver):
+    """Accounts one call's LLM usage and enforces its budget."""
+
+    def __init__(
+        self,
+        session: Session,
+        task: PipelineTask,
+        *,
+        flow_manager: Optional[FlowManager] = None,
+        context: Optional[LLMContext] = None,
+        llm: Optional[LLMService] = None,
+        budget: Optional[UsageBudget] = None,
+    ):
+        """Start accounting for ``session``.
+
+        Args:
+            session: The call's session. The accounting is attached to it.
+            task: The call's pipeline task, watched for LLM metrics.
+            flow_manager: The call's flow manager, to attribute usage to nodes.
+            context: The call's LLM context, compacted when over budget.
+            llm: The call's LLM. Writes summaries and is switched to the
+                cheaper model when over budget.
+            budget: Limits for the call. Defaults to none.
+        """
+        super().__init__()
+        self._session_name = str(session)
+        self._bot = session.bot
+        self._flow_manager = flow_manager
+        self._context = context
+        self._llm = llm
+        self._task = task
+        self._budget = budget or UsageBudget()
+        self._usage = _Usage()
+        self._compacting: Optional[asyncio.Task] = None
+        self._downgraded = False
+
+        task.add_observer(self)
+        session.add("usage", self, close=self.close)
+        usage_ledger._live[self._session_name] = self
+
+    @property
+    def total(self) -> UsageTotals:
+        """The call's totals over all nodes."""
+        return self._usage.total
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The call's totals, overall and per node."""
+        return self._usage.snapshot()
+
+    async def close(self):
+        """Log the call's usage and drop it from the live sessions."""
+        usage_ledger._live.pop(self._session_name, None)
+        if self._compacting:
+            self._compacting.cancel()
+        if self.total.requests:
+            logger.info(f"LLM usage for {self._session_name}: {self.snapshot()}")
+
+    async def on_push_frame(self, data: FramePushed):
+        """Account the LLM's metrics frames."""
+        # Only the LLM's own push: the same frame is pushed again at every hop.
+        if not isinstance(data.frame, MetricsFrame) or not isinstance(data.source, LLMService):
+            return
+        node = (self._flow_manager.current_node if self._flow_manager else None) or NO_NODE
+        for metric in data.frame.data:
+            # Upstream services' metrics (STT TTFB) are forwarded by the LLM too.
+            if metric.processor != data.source.name:
+                continue
+            if isinstance(metric, LLMUsageMetricsData):
+                usage = metric.value
+                for totals in self._totals(node):
+                    totals.add_usage(usage.prompt_tokens, usage.completion_tokens)
+                await self._enforce_budget(usage.prompt_tokens)
+            elif isinstance(metric, TTFBMetricsData) and metric.value:
+                for totals in self._totals(node):
+                    totals.add_ttfb(metric.value)
+            elif isinstance(metric, ProcessingMetricsData) and metric.value:
+                for totals in self._totals(node):
+                    totals.add_processing(metric.value)
+
+    def _totals(self, node: str):
+        return (
+            self._usage.total,
+            self._usage.nodes[node],
+            usage_ledger._usage.total,
+            usage_ledger._usage.nodes[node],
+            usage_ledger._bots[self._bot],
+        )
+
+    async def _enforce_budget(self, prompt_tokens: int):
+        budget = self._budget
+        if (
+            budget.max_prompt_tokens
+            and prompt_tokens > budget.max_prompt_tokens
+            and self._context is not None
+            and self._llm is not None
+            and not (self._compacting and not self._compacting.done())
+        ):
+            logger.info(
+                f"{self._session_name}: prompt of {prompt_tokens} tokens is over "
+                f"{budget.max_prompt_tokens}, compacting the context"
+            )
+            self._compacting = asyncio.create_task(self._compact())
+
+        if (
+            budget.max_session_tokens
+            and budget.cheaper_model
+            and not self._downgraded
+            and self.total.total_tokens > budget.max_session_tokens
+        ):
+            self._downgraded = True
+            usage_ledger.downgrades += 1
+            logger.info(
+                f"{self._session_name}: used {self.total.total_tokens} tokens, over "
+                f"{budget.max_session_tokens}; switching to {budget.cheaper_model}"
+            )
+            await self._task.queue_frame(
+                LLMUpdateSettingsFrame(settings={"model": budget.cheaper_model})
+            )
+
+    async def _compact(self):
+        if await compact_context(self._context, self._llm, keep_last=self._budget.keep_last):
+            usage_ledger.compactions += 1
@@ -0,0 +1,155 @@
+"""Per-agent load and latency stats for the warm-pool controller.
+
+Each agent process records:
+
+- ``startup_secs``: how long importing and loading the models took, i.e. what a
+  call pays when it lands on a cold agent;
+- concurrency: calls running now and the most seen at once;
+- time to first audio (TTFA): from ``bot()`` being called to the bot first
+  speaking;
+- turn latency: from the user stopping speaking to the bot starting to speak.
+
+``agent_stats.snapshot()`` is logged after every call and, when
+``AGENT_STATS_FILE`` is set, written there as JSON so ``warm_pool.py`` (or any
+other scaler) can read it::
+
+    async def bot(runner_args):
+        with agent_stats.session() as call:
+            ...
+            task = PipelineTask(..., observers=[AgentStatsObserver(call)])
+"""
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from loguru import logger
+from pipecat.frames.frames import BotStartedSpeakingFrame
+from pipecat.observers.base_observer import FramePushed
+from pipecat.observers.loggers.user_bot_latency_log_observer import UserBotLatencyLogObserver
+from pipecat.processors.frame_processor import FrameDirection
+
+# Recent samples kept for the percentiles.
+SAMPLE_WINDOW = 200
+
+
+def _percentile(samples: Deque[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+
+class CallStats:
+    """Timing for one call, handed to ``AgentStatsObserver``."""
+
+    def __init__(self, stats: "AgentStats"):
+        self._stats = stats
+        self.started_at = time.monotonic()
+        self.ttfa_secs: Optional[float] = None
+
+    def first_audio(self):
+        """Record time to first audio (only the first call counts)."""
+        if self.ttfa_secs is None:
+            self.ttfa_secs = time.monotonic() - self.started_at
+            self._stats._ttfa.append(self.ttfa_secs)
+
+    def turn_latency(self, latency: float):
+        """Record a user-stopped to bot-started latency."""
+        self._stats._turn_latency.append(latency)
+
+
+class AgentStats:
+    """Startup time, concurrency and latency of this agent process."""
+
+    def __init__(self, stats_file: Optional[str] = None):
+        """Initialize the stats.
+
+        Args:
+            stats_file: Where to publish snapshots as JSON. Defaults to the
+                ``AGENT_STATS_FILE`` environment variable, if set.
+        """
+        self._stats_file = stats_file or os.getenv("AGENT_STATS_FILE")
+        self.startup_secs: Optional[float] = None
+        self.active_calls = 0
+        self.peak_calls = 0
+        self.total_calls = 0
+        self._ttfa: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+        self._turn_latency: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def mark_ready(self, startup_secs: float):
+        """Record how long the agent took to become ready to take calls."""
+        self.startup_secs = startup_secs
+        logger.info(f"Agent ready after {startup_secs:.1f}s")
+        self.publish()
+
+    @contextmanager
+    def session(self) -> Iterator[CallStats]:
+        """Count a call as active for the duration of the ``with`` block."""
+        self.active_calls += 1
+        self.total_calls += 1
+        self.peak_calls = max(self.peak_calls, self.active_calls)
+        try:
+            yield CallStats(self)
+        finally:
+            self.active_calls -= 1
+            self.publish()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current stats, in the shape ``warm_pool.AgentProfile.from_stats()`` reads."""
+        return {
+            "startup_secs": self.startup_secs,
+            "active_calls": self.active_calls,
+            "peak_calls": self.peak_calls,
+            "total_calls": self.total_calls,
+            "ttfa_p50_secs": _percentile(self._ttfa, 0.5),
+            "ttfa_p95_secs": _percentile(self._ttfa, 0.95),
+            "turn_latency_p50_secs": _percentile(self._turn_latency, 0.5),
+            "turn_latency_p95_secs": _percentile(self._turn_latency, 0.95),
+        }
+
+    def publish(self):
+        """Log the snapshot and write it to the stats file, if configured."""
+        snapshot = self.snapshot()
+        logger.info(f"Agent stats: {snapshot}")
+        if not self._stats_file:
+            return
+        try:
+            tmp_path = f"{self._stats_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({**snapshot, "timestamp": time.time()}, f)
+            os.replace(tmp_path, self._stats_file)
+        except OSError as e:
+            logger.warning(f"Couldn't write agent stats: {e}")
+
+
+class AgentStatsObserver(UserBotLatencyLogObserver):
+    """Feeds a call's TTFA and turn latencies into ``AgentStats``."""
+
+    def __init__(self, call: CallStats):
+        """Initialize the observer.
+
+        Args:
+            call: The call's stats, from ``AgentStats.session()``.
+        """
+        super().__init__()
+        self._call = call
+
+    async def on_push_frame(self, data: FramePushed):
+        """Record the first bot audio, then track turn latency as usual."""
+        if data.direction == FrameDirection.DOWNSTREAM and isinstance(
+            data.frame, BotStartedSpeakingFrame
+        ):
+            self._call.first_audio()
+        await super().on_push_frame(data)
+
+    def _log_latency(self, latency: float):
+        super()._log_latency(latency)
+        self._call.turn_latency(latency)
+
+
+# The stats for this agent process.
+agent_stats = AgentStats()
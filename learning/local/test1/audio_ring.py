@@ -0,0 +1,313 @@
+"""Per-session audio ring shared by the VAD and turn analyzers.
+
+Out of the box every 20 ms input frame gets copied several times on its way
+through ``transport.input()``: the VAD analyzer appends it to a ``bytes``
+buffer and slices it back out, and the smart turn analyzer converts each
+frame to a new float32 array and keeps a list of them around for up to
+~10 seconds.
+
+``AudioRing`` is a preallocated int16 ring. Each input frame is written into
+it once, and both analyzers read NumPy views out of it:
+
+- ``RingSileroVADAnalyzer`` runs Silero over views of the ring instead of a
+  growing ``bytes`` buffer.
+- ``RingSmartTurnAnalyzerV3`` only tracks ring positions per frame and converts
+  the turn segment to float32 once, when the turn is actually analyzed.
+
+The STT service doesn't need the ring: it forwards the frame's own ``bytes``
+object to its websocket without copying it.
+
+Usage::
+
+    "daily": lambda: DailyParams(
+        audio_in_enabled=True,
+        audio_out_enabled=True,
+        **ring_audio_analyzers(vad_params=VADParams(stop_secs=0.2)),
+    ),
+
+Call ``ring_audio_analyzers()`` inside the params factory so every session gets
+its own ring.
+"""
+
+import time
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+from pipecat.audio.turn.base_turn_analyzer import EndOfTurnState
+from pipecat.audio.turn.smart_turn.base_smart_turn import SmartTurnParams
+from pipecat.audio.turn.smart_turn.local_smart_turn_v3 import LocalSmartTurnAnalyzerV3
+from pipecat.audio.vad.silero import SileroOnnxModel, SileroVADAnalyzer
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams, VADState
+
+from model_cache import baked_model_path
+
+# Enough for smart turn's pre-speech + max duration (8 s) + stop_secs window.
+RING_SECONDS = 12
+
+
+class AudioRing:
+    """Preallocated mono int16 ring buffer addressed by absolute sample position.
+
+    Samples are stored twice (at ``i`` and ``i + capacity``), so any window of
+    up to ``capacity`` samples is a contiguous slice and ``view()`` never has
+    to copy, even across the wrap point.
+    """
+
+    def __init__(self, seconds: float = RING_SECONDS):
+        """Initialize the ring.
+
+        Args:
+            seconds: How much audio the ring holds. Storage is allocated once the
+                sample rate is known.
+        """
+        self._seconds = seconds
+        self._sample_rate = 0
+        self._capacity = 0
+        self._data = np.zeros(0, dtype=np.int16)
+        self._end = 0
+        self._last_audio: Optional[bytes] = None
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate the ring was allocated for."""
+        return self._sample_rate
+
+    @property
+    def end(self) -> int:
+        """Absolute position one past the newest sample."""
+        return self._end
+
+    @property
+    def start(self) -> int:
+        """Absolute position of the oldest sample still held."""
+        return max(0, self._end - self._capacity)
+
+    def set_sample_rate(self, sample_rate: int):
+        """Allocate storage for ``sample_rate``. A no-op if it's already allocated."""
+        if sample_rate == self._sample_rate:
+            return
+        self._sample_rate = sample_rate
+        self._capacity = int(self._seconds * sample_rate)
+        self._data = np.zeros(2 * self._capacity, dtype=np.int16)
+        self._end = 0
+        self._last_audio = None
+
+    def write(self, audio: bytes) -> int:
+        """Write an input frame's audio into the ring.
+
+        The analyzers all see the same frame, so writing the same ``bytes``
+        object twice in a row is a no-op.
+
+        Returns:
+            The absolute position one past the frame's last sample.
+        """
+        if audio is self._last_audio:
+            return self._end
+        self._last_audio = audio
+
+        samples = np.frombuffer(audio, dtype=np.int16)
+        count = len(samples)
+        if count > self._capacity:
+            self._end += count - self._capacity
+            samples = samples[-self._capacity :]
+            count = self._capacity
+
+        offset = self._end % self._capacity
+        head = min(count, self._capacity - offset)
+        self._data[offset : offset + head] = samples[:head]
+        self._data[offset + self._capacity : offset + self._capacity + head] = samples[:head]
+        tail = count - head
+        if tail:
+            self._data[:tail] = samples[head:]
+            self._data[self._capacity : self._capacity + tail] = samples[head:]
+
+        self._end += count
+        return self._end
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        """Read-only int16 view of samples in ``[start, end)``.
+
+        ``start`` is clamped to the oldest sample still in the ring.
+        """
+        start = max(start, self.start)
+        if end <= start:
+            return self._data[:0]
+        offset = start % self._capacity
+        window = self._data[offset : offset + (end - start)]
+        window.flags.writeable = False
+        return window
+
+
+def ring_audio_analyzers(
+    *,
+    ring_seconds: float = RING_SECONDS,
+    vad_params: Optional[VADParams] = None,
+    turn_params: Optional[SmartTurnParams] = None,
+) -> dict:
+    """Build a VAD and turn analyzer sharing one new ``AudioRing``.
+
+    Returns:
+        ``vad_analyzer`` and ``turn_analyzer`` kwargs for ``TransportParams``.
+    """
+    ring = AudioRing(ring_seconds)
+    return {
+        "vad_analyzer": RingSileroVADAnalyzer(ring=ring, params=vad_params),
+        "turn_analyzer": RingSmartTurnAnalyzerV3(ring=ring, params=turn_params),
+    }
+
+
+class RingSileroVADAnalyzer(SileroVADAnalyzer):
+    """Silero VAD that reads its analysis windows straight from an ``AudioRing``."""
+
+    def __init__(self, *, ring: AudioRing, **kwargs):
+        """Initialize the analyzer.
+
+        Args:
+            ring: The session's audio ring.
+            **kwargs: Additional arguments passed to SileroVADAnalyzer.
+        """
+        baked_path = baked_model_path("silero_vad.onnx")
+        if baked_path:
+            # SileroVADAnalyzer always loads the bundled model; load the baked one instead.
+            VADAnalyzer.__init__(self, **kwargs)
+            self._model = SileroOnnxModel(baked_path, force_onnx_cpu=True)
+            self._last_reset_time = 0
+        else:
+            super().__init__(**kwargs)
+        self._ring = ring
+        self._read_pos = 0
+
+    def set_sample_rate(self, sample_rate: int):
+        """Set the sample rate and allocate the ring for it."""
+        super().set_sample_rate(sample_rate)
+        self._ring.set_sample_rate(self.sample_rate)
+        self._read_pos = self._ring.end
+
+    def _run_analyzer(self, buffer: bytes) -> VADState:
+        """Analyze every complete window now in the ring and return the VAD state."""
+        end = self._ring.write(buffer)
+        self._read_pos = max(self._read_pos, self._ring.start)
+
+        while end - self._read_pos >= self._vad_frames:
+            audio_frames = self._ring.view(self._read_pos, self._read_pos + self._vad_frames)
+            self._read_pos += self._vad_frames
+
+            confidence = self.voice_confidence(audio_frames)
+            volume = self._get_smoothed_volume(audio_frames)
+            self._prev_volume = volume
+
+            speaking = confidence >= self._params.confidence and volume >= self._params.min_volume
+            self._advance_state(speaking)
+
+        if (
+            self._vad_state == VADState.STARTING
+            and self._vad_starting_count >= self._vad_start_frames
+        ):
+            self._vad_state = VADState.SPEAKING
+            self._vad_starting_count = 0
+
+        if (
+            self._vad_state == VADState.STOPPING
+            and self._vad_stopping_count >= self._vad_stop_frames
+        ):
+            self._vad_state = VADState.QUIET
+            self._vad_stopping_count = 0
+
+        return self._vad_state
+
+    def _advance_state(self, speaking: bool):
+        """Same per-window transitions as ``VADAnalyzer._run_analyzer``."""
+        if speaking:
+            match self._vad_state:
+                case VADState.QUIET:
+                    self._vad_state = VADState.STARTING
+                    self._vad_starting_count = 1
+                case VADState.STARTING:
+                    self._vad_starting_count += 1
+                case VADState.STOPPING:
+                    self._vad_state = VADState.SPEAKING
+                    self._vad_stopping_count = 0
+        else:
+            match self._vad_state:
+                case VADState.STARTING:
+                    self._vad_state = VADState.QUIET
+                    self._vad_starting_count = 0
+                case VADState.SPEAKING:
+                    self._vad_state = VADState.STOPPING
+                    self._vad_stopping_count = 1
+                case VADState.STOPPING:
+                    self._vad_stopping_count += 1
+
+
+class RingSmartTurnAnalyzerV3(LocalSmartTurnAnalyzerV3):
+    """Smart Turn v3 whose audio history is a pair of positions in an ``AudioRing``.
+
+    The ring already holds more than ``pre_speech_ms + max_duration_secs`` of
+    audio, so there is nothing to trim per frame.
+    """
+
+    def __init__(self, *, ring: AudioRing, **kwargs):
+        """Initialize the analyzer.
+
+        Args:
+            ring: The session's audio ring.
+            **kwargs: Additional arguments passed to LocalSmartTurnAnalyzerV3.
+        """
+        kwargs.setdefault("smart_turn_model_path", baked_model_path("smart-turn-v3.0.onnx"))
+        super().__init__(**kwargs)
+        self._ring = ring
+        self._segment_start = 0
+        self._speech_start = 0
+
+    def set_sample_rate(self, sample_rate: int):
+        """Set the sample rate and allocate the ring for it."""
+        super().set_sample_rate(sample_rate)
+        self._ring.set_sample_rate(self.sample_rate)
+        self._segment_start = self._ring.end
+
+    def append_audio(self, buffer: bytes, is_speech: bool) -> EndOfTurnState:
+        """Record the frame in the ring and track speech/silence for the turn."""
+        end = self._ring.write(buffer)
+        num_samples = len(buffer) // 2
+
+        state = EndOfTurnState.INCOMPLETE
+
+        if is_speech:
+            self._silence_ms = 0
+            self._speech_triggered = True
+            if self._speech_start_time == 0:
+                self._speech_start_time = time.time()
+                self._speech_start = end - num_samples
+        elif self._speech_triggered:
+            self._silence_ms += num_samples / (self._sample_rate / 1000)
+            if self._silence_ms >= self._stop_ms:
+                logger.debug(
+                    f"End of Turn complete due to stop_secs. Silence in ms: {self._silence_ms}"
+                )
+                state = EndOfTurnState.COMPLETE
+                self._clear(state)
+
+        return state
+
+    def _clear(self, turn_state: EndOfTurnState):
+        """Clear turn state and start the next segment at the ring's write position."""
+        super()._clear(turn_state)
+        self._segment_start = self._ring.end
+        self._speech_start = 0
+
+    def _process_speech_segment(self, audio_buffer):
+        """Convert the current turn segment to float32 once and run the model on it."""
+        start = self._segment_start
+        if self._speech_start_time:
+            pre_speech = int(self._params.pre_speech_ms / 1000 * self.sample_rate)
+            start = max(start, self._speech_start - pre_speech)
+        end = self._ring.end
+        max_samples = int(self._params.max_duration_secs * self.sample_rate)
+        start = max(start, end - max_samples)
+
+        segment = self._ring.view(start, end).astype(np.float32)
+        if not len(segment):
+            return super()._process_speech_segment([])
+        segment *= 1 / 32768.0
+        return super()._process_speech_segment([(self._speech_start_time, segment)])
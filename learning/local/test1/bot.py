@@ -20,10 +20,13 @@ Run the bot using::
 """
 
 import os
+import time
 
 from dotenv import load_dotenv
 from loguru import logger
 
+startup_began = time.monotonic()
+
 print("🚀 Starting Pipecat bot...")
 print("⏳ Loading models and imports (20 seconds, first run only)\n")
 
@@ -56,12 +59,21 @@ from pipecat.services.google.llm import GoogleLLMService  # or GeminiLiveLLMServ
 from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.daily.transport import DailyParams
 
+from agent_stats import AgentStatsObserver, CallStats, agent_stats
+from audio_ring import ring_audio_analyzers
+from sampling_profiler import profiler
+from speculative_llm import SpeculativeLLM
+from stage_metrics import StageMetrics
+
 logger.info("✅ All components loaded successfully!")
+# Build one set of analyzers so ONNX Runtime is loaded before the first call.
+ring_audio_analyzers()
+agent_stats.mark_ready(time.monotonic() - startup_began)
 
 load_dotenv(override=True)
 
 
-async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
+async def run_bot(transport: BaseTransport, runner_args: RunnerArguments, call: CallStats):
     logger.info(f"Starting bot")
     print('--------INSIDE run_bot()')
 
@@ -91,12 +103,17 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
 
     rtvi = RTVIProcessor(config=RTVIConfig(config=[]))
 
+    # Starts the LLM on interim transcripts when SPECULATIVE_LLM=1.
+    speculation = SpeculativeLLM(llm, context)
+
     pipeline = Pipeline(
         [
             transport.input(),  # Transport user input
             rtvi,  # RTVI processor
             stt,
+            speculation.transcripts(),  # Speculates when VAD hears the user stop
             context_aggregator.user(),  # User responses
+            speculation.gate(),  # Speculative answer if the final transcript matches
             llm,  # LLM
             tts,  # TTS
             transport.output(),  # Transport bot output
@@ -110,8 +127,10 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
             enable_metrics=True,
             enable_usage_metrics=True,
         ),
-        observers=[RTVIObserver(rtvi)],
+        observers=[RTVIObserver(rtvi), AgentStatsObserver(call)],
     )
+    profiler.track(task, f"call-{agent_stats.total_calls}", transport)
+    StageMetrics(pipeline).attach(task)
 
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
@@ -133,24 +152,24 @@ async def run_bot(transport: BaseTransport, runner_args: RunnerArguments):
 async def bot(runner_args: RunnerArguments):
     """Main bot entry point for the bot starter."""
     print('---------INSIDE bot()')
+    profiler.start()
     transport_params = {
         "daily": lambda: DailyParams(
             audio_in_enabled=True,
             audio_out_enabled=True,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.2)),
-            turn_analyzer=LocalSmartTurnAnalyzerV3(),
+            **ring_audio_analyzers(vad_params=VADParams(stop_secs=0.2)),
         ),
         "webrtc": lambda: TransportParams(
             audio_in_enabled=True,
             audio_out_enabled=True,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.2)),
-            turn_analyzer=LocalSmartTurnAnalyzerV3(),
+            **ring_audio_analyzers(vad_params=VADParams(stop_secs=0.2)),
         ),
     }
 
-    transport = await create_transport(runner_args, transport_params)
+    with agent_stats.session() as call:
+        transport = await create_transport(runner_args, transport_params)
 
-    await run_bot(transport, runner_args)
+        await run_bot(transport, runner_args, call)
 
 
 if __name__ == "__main__":
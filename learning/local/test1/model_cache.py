@@ -0,0 +1,138 @@
+"""Bake optimized ONNX models into the image and benchmark agent startup.
+
+The Silero VAD and Smart Turn v3 weights ship inside the ``pipecat-ai`` wheel,
+so there's nothing to download, but every analyzer ONNX Runtime builds
+re-runs graph optimization on load. ``bake`` does that once, at image build
+time, and saves the optimized graphs to ``MODEL_CACHE_DIR``. When the
+directory is set and holds a baked model, ``audio_ring.py``'s analyzers load
+it instead of the bundled one.
+
+Graphs are optimized at the ``EXTENDED`` level: ``ALL`` adds layout
+transforms tied to the build machine's CPU, which the agent's host may not
+share. ONNX Runtime still applies those at load time.
+
+``benchmark`` times container-start-to-ready: how long ``import bot`` takes
+(imports, model loads and the warm-up analyzers), which is what a call
+landing on a cold agent waits for. It runs locally or, with ``--image``, in
+``docker run`` of a built image::
+
+    uv run model_cache.py bake models
+    uv run model_cache.py benchmark --runs 5 --image your_username/quickstart:0.1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from importlib import resources
+from typing import Dict, List, Optional
+
+# Bundled model file -> package it ships in.
+BUNDLED_MODELS: Dict[str, str] = {
+    "silero_vad.onnx": "pipecat.audio.vad.data",
+    "smart-turn-v3.0.onnx": "pipecat.audio.turn.smart_turn.data",
+}
+
+
+def _baked_name(model: str) -> str:
+    return model.replace(".onnx", ".optimized.onnx")
+
+
+def bundled_model_path(model: str) -> str:
+    """Path of ``model`` as shipped in the ``pipecat-ai`` wheel."""
+    return str(resources.files(BUNDLED_MODELS[model]).joinpath(model))
+
+
+def baked_model_path(model: str) -> Optional[str]:
+    """Path of the baked ``model`` in ``MODEL_CACHE_DIR``, if there is one."""
+    cache_dir = os.getenv("MODEL_CACHE_DIR")
+    if not cache_dir:
+        return None
+    path = os.path.join(cache_dir, _baked_name(model))
+    return path if os.path.isfile(path) else None
+
+
+def bake(cache_dir: str):
+    """Optimize every bundled model and save the result to ``cache_dir``."""
+    import onnxruntime as ort
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for model in BUNDLED_MODELS:
+        start_time = time.perf_counter()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        options.optimized_model_filepath = os.path.join(cache_dir, _baked_name(model))
+        ort.InferenceSession(
+            bundled_model_path(model), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        print(
+            f"Baked {model} -> {options.optimized_model_filepath} "
+            f"in {time.perf_counter() - start_time:.2f}s"
+        )
+
+
+def _time_to_ready(image: Optional[str], env: Dict[str, str]) -> float:
+    if image:
+        env_args = [arg for name, value in env.items() for arg in ("-e", f"{name}={value}")]
+        command = ["docker", "run", "--rm", *env_args, "--entrypoint", "python", image]
+    else:
+        command = [sys.executable]
+    start_time = time.monotonic()
+    subprocess.run(
+        [*command, "-c", "import bot"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=None if image else {**os.environ, **env},
+    )
+    return time.monotonic() - start_time
+
+
+def benchmark(runs: int, image: Optional[str] = None, baked: bool = True) -> List[float]:
+    """Start the agent ``runs`` times and return each start-to-ready time.
+
+    Args:
+        runs: How many starts to time.
+        image: Docker image to start. Defaults to running here.
+        baked: Whether to use the baked models. ``False`` sets an empty
+            ``MODEL_CACHE_DIR``, for comparison.
+    """
+    env = {} if baked else {"MODEL_CACHE_DIR": ""}
+    return [_time_to_ready(image, env) for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake models and benchmark agent startup")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bake_parser = commands.add_parser("bake", help="Optimize and save the bundled models")
+    bake_parser.add_argument("cache_dir", nargs="?", default=os.getenv("MODEL_CACHE_DIR"))
+
+    benchmark_parser = commands.add_parser("benchmark", help="Time start-to-ready")
+    benchmark_parser.add_argument("--runs", type=int, default=5)
+    benchmark_parser.add_argument("--image", help="Docker image to start instead of running here")
+    benchmark_parser.add_argument(
+        "--compare", action="store_true", help="Also time starts without the baked models"
+    )
+    args = parser.parse_args()
+
+    if args.command == "bake":
+        if not args.cache_dir:
+            parser.error("give a cache directory or set MODEL_CACHE_DIR")
+        bake(args.cache_dir)
+        return
+
+    variants = [("baked", True), ("bundled", False)] if args.compare else [("baked", True)]
+    for label, baked in variants:
+        times = benchmark(args.runs, args.image, baked)
+        print(
+            f"Start-to-ready ({label}, {len(times)} runs): "
+            f"median {statistics.median(times):.2f}s, "
+            f"min {min(times):.2f}s, max {max(times):.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
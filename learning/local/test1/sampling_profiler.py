@@ -0,0 +1,255 @@
+"""In-process sampling profiler that attributes CPU to pipeline stages and calls.
+
+With many calls in one agent, a plain profile says "asyncio" and "onnxruntime"
+but not which pipeline stage is eating the cores. ``SamplingProfiler``
+samples every thread's Python stack ``hz`` times a second from a background
+thread, and labels each sample with:
+
+- the stage: the processor whose asyncio task is running on the loop thread
+  (``DeepgramSTTService``, ``LLMUserAggregator``, ``GoogleLLMService``,
+  ``CartesiaTTSService``, ``DailyInputTransport``, ...). For executor threads
+  it's the VAD or turn analyzer they're running for.
+- the call: the session the ``PipelineTask`` was registered under with
+  ``track()``.
+
+Threads parked in ``select()`` or waiting on a queue are skipped, so the counts
+approximate CPU rather than wall time. Stacks are keyed by code object only
+(no line numbers and no string formatting while sampling), which keeps the
+sampler cheap enough to leave on; its own cost is reported as
+``overhead_percent``.
+
+Every ``flush_secs`` it writes, to ``SAMPLING_PROFILER_DIR`` (default
+``profiles``):
+
+- ``<pid>-<time>.collapsed``: ``stage;frame;frame count`` lines, for
+  flamegraph.pl or speedscope;
+- ``<pid>-<time>.json``: samples per stage and per call/stage.
+
+It's off unless ``SAMPLING_PROFILER_HZ`` is set (e.g. ``100``)::
+
+    async def run_bot(transport, runner_args):
+        ...
+        task = PipelineTask(pipeline, ...)
+        profiler.track(task, session_id, transport)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Optional, Tuple
+
+from loguru import logger
+from pipecat.pipeline.task import PipelineTask
+from pipecat.transports.base_transport import BaseTransport
+
+FLUSH_SECS = 60.0
+
+# (file name suffix, function) pairs that mean a thread is idle, not on CPU.
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("concurrent/futures/thread.py", "_worker"),
+}
+
+# Executor threads run the submitted callable from ``_WorkItem.run``.
+_WORK_ITEM_RUN = ("concurrent/futures/thread.py", "run")
+
+_UNKNOWN = "-"
+
+
+def _matches(code, patterns) -> bool:
+    return any(
+        code.co_name == name and code.co_filename.endswith(suffix) for suffix, name in patterns
+    )
+
+
+def _stage_name(task_name: str) -> str:
+    """Processor class from a task name such as ``CartesiaTTSService#3::<method>``."""
+    return task_name.split("::", 1)[0].split("#", 1)[0]
+
+
+def _format_code(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler:
+    """Samples all thread stacks and attributes them to pipeline stages and calls."""
+
+    def __init__(
+        self,
+        *,
+        hz: Optional[float] = None,
+        flush_secs: float = FLUSH_SECS,
+        output_dir: Optional[str] = None,
+    ):
+        """Initialize the profiler.
+
+        Args:
+            hz: Samples per second. Defaults to ``SAMPLING_PROFILER_HZ``; 0 disables.
+            flush_secs: How often profiles are written out.
+            output_dir: Where profiles go. Defaults to ``SAMPLING_PROFILER_DIR``
+                or ``profiles``.
+        """
+        self._hz = hz if hz is not None else float(os.getenv("SAMPLING_PROFILER_HZ", "0"))
+        self._flush_secs = flush_secs
+        self._output_dir = output_dir or os.getenv("SAMPLING_PROFILER_DIR", "profiles")
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # Task manager -> session, analyzer -> (session, stage), task -> (session, stage).
+        self._task_managers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._analyzers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._task_labels: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+        self._reset()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether sampling is configured on."""
+        return self._hz > 0
+
+    def start(self):
+        """Start sampling from the running loop's thread. A no-op if disabled or started."""
+        if not self.enabled or self._thread:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler on at {self._hz:g} Hz, writing to {self._output_dir}")
+
+    def track(self, task: PipelineTask, session: str, transport: Optional[BaseTransport] = None):
+        """Attribute samples from the task's processors and transport's analyzers to ``session``."""
+        if not self.enabled:
+            return
+        self._task_managers[task._task_manager] = session
+        params = getattr(transport, "_params", None)
+        for attr, stage in (("vad_analyzer", "VADAnalyzer"), ("turn_analyzer", "TurnAnalyzer")):
+            analyzer = getattr(params, attr, None)
+            if analyzer is not None:
+                self._analyzers[analyzer] = (session, stage)
+
+    def _reset(self):
+        self._stacks: Counter = Counter()
+        self._by_session: Counter = Counter()
+        self._samples = 0
+        self._sampling_secs = 0.0
+        self._window_start = time.monotonic()
+
+    def _run(self):
+        interval = 1.0 / self._hz
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            try:
+                self._sample(own_id)
+            except Exception as e:
+                logger.debug(f"Sampling profiler error: {e}")
+            self._sampling_secs += time.perf_counter() - start
+
+            if time.monotonic() - self._window_start >= self._flush_secs:
+                self._flush()
+
+    def _sample(self, own_id: int):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or _matches(frame.f_code, _IDLE_LEAVES):
+                continue
+
+            codes = []
+            work_item_child = None
+            child = None
+            while frame is not None:
+                if work_item_child is None and _matches(frame.f_code, (_WORK_ITEM_RUN,)):
+                    work_item_child = child
+                codes.append(frame.f_code)
+                child = frame
+                frame = frame.f_back
+            codes.reverse()
+
+            if thread_id == self._loop_thread_id:
+                session, stage = self._loop_label()
+            elif work_item_child is not None:
+                session, stage = self._executor_label(work_item_child)
+            else:
+                session, stage = _UNKNOWN, "other-thread"
+
+            self._stacks[(stage, tuple(codes))] += 1
+            self._by_session[(session, stage)] += 1
+            self._samples += 1
+
+    def _loop_label(self) -> Tuple[str, str]:
+        task = asyncio.tasks._current_tasks.get(self._loop)
+        if task is None:
+            return _UNKNOWN, "event-loop"
+        label = self._task_labels.get(task)
+        if label is None:
+            label = (self._session_for_task(task), _stage_name(task.get_name()))
+            self._task_labels[task] = label
+        return label
+
+    def _session_for_task(self, task: asyncio.Task) -> str:
+        for task_manager, session in list(self._task_managers.items()):
+            if task in task_manager.current_tasks():
+                return session
+        return _UNKNOWN
+
+    def _executor_label(self, frame) -> Tuple[str, str]:
+        # The callable submitted to the executor; its ``self`` is the analyzer.
+        owner = frame.f_locals.get("self")
+        label = self._analyzers.get(owner) if owner is not None else None
+        if label:
+            return label
+        return _UNKNOWN, type(owner).__name__ if owner is not None else "executor"
+
+    def _flush(self):
+        elapsed = time.monotonic() - self._window_start
+        stacks, by_session = self._stacks, self._by_session
+        samples, sampling_secs = self._samples, self._sampling_secs
+        self._reset()
+        if not samples:
+            return
+
+        by_stage: Counter = Counter()
+        for (stage, _), count in stacks.items():
+            by_stage[stage] += count
+
+        summary = {
+            "window_secs": round(elapsed, 1),
+            "hz": self._hz,
+            "samples": samples,
+            "overhead_percent": round(sampling_secs / elapsed * 100, 2),
+            "by_stage": dict(by_stage.most_common()),
+            "by_session": {
+                f"{session};{stage}": count for (session, stage), count in by_session.most_common()
+            },
+        }
+        top = ", ".join(
+            f"{stage} {count / samples:.0%}" for stage, count in by_stage.most_common(5)
+        )
+        logger.info(
+            f"Sampling profiler: {samples} samples, overhead {summary['overhead_percent']}%: {top}"
+        )
+
+        try:
+            os.makedirs(self._output_dir, exist_ok=True)
+            prefix = os.path.join(self._output_dir, f"{os.getpid()}-{int(time.time())}")
+            with open(f"{prefix}.collapsed", "w") as f:
+                for (stage, codes), count in stacks.items():
+                    f.write(";".join([stage, *map(_format_code, codes)]) + f" {count}\n")
+            with open(f"{prefix}.json", "w") as f:
+                json.dump(summary, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Couldn't write profile: {e}")
+
+
+# The profiler for this agent process.
+profiler = SamplingProfiler()
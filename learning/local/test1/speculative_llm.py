@@ -0,0 +1,349 @@
+"""Speculative LLM generation on interim transcripts.
+
+``context_aggregator.user()`` only sends the context to the LLM once the final
+transcript is in and the turn analyzer has decided the user is done, so the
+LLM's whole response time is added on top of end-of-turn detection.
+``SpeculativeLLM`` starts generating earlier: as soon as VAD hears the user
+stop (``VADUserStoppedSpeakingFrame``, before the turn analyzer has decided
+the turn is over) it runs the LLM out of band (``run_inference()``) on the
+transcript so far, and restarts it if later transcripts change the text.
+
+When the real context reaches the LLM, the gate compares its last user
+message with the speculated one. If they match closely enough and the
+speculative answer is already complete, it's pushed instead of calling the
+LLM again. A speculation still running is cancelled rather than waited for:
+``run_inference()`` doesn't stream, so waiting for it would be slower than
+letting the LLM stream its first sentence. Each turn reports a
+``SpeculationMetricsData`` and the running totals are logged; the latency
+saved by a used speculation is the LLM's recent time to first byte, what the
+turn would have waited for otherwise.
+
+``run_inference()`` doesn't stream and ignores tools, so speculation is
+skipped for contexts with tools. It's off unless ``SPECULATIVE_LLM=1``, as
+every mismatch costs an extra LLM request::
+
+    speculation = SpeculativeLLM(llm, context)
+    pipeline = Pipeline(
+        [
+            transport.input(),
+            stt,
+            speculation.transcripts(),  # Starts speculating when the user stops
+            context_aggregator.user(),
+            speculation.gate(),  # Uses the speculation if the final text matches
+            llm,
+            ...,
+        ]
+    )
+"""
+
+import asyncio
+import os
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from loguru import logger
+from pipecat.frames.frames import (
+    Frame,
+    InterimTranscriptionFrame,
+    LLMContextFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMTextFrame,
+    MetricsFrame,
+    TranscriptionFrame,
+    VADUserStartedSpeakingFrame,
+    VADUserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import MetricsData, TTFBMetricsData
+from pipecat.processors.aggregators.llm_context import NOT_GIVEN, LLMContext
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.llm_service import LLMService
+
+# Word-level similarity between speculated and final user text to reuse the answer.
+MATCH_THRESHOLD = 0.9
+
+# Rough characters per token, for token estimates without usage data.
+CHARS_PER_TOKEN = 4
+
+# Weight of the newest sample in the LLM's running time to first byte.
+TTFB_SMOOTHING = 0.3
+
+
+class SpeculationMetricsData(MetricsData):
+    """Outcome of one turn's speculation.
+
+    Parameters:
+        used: Whether the speculative answer replaced the LLM call.
+        speculations: LLM requests started for the turn (restarts included).
+        latency_saved_ms: The LLM's recent time to first byte, if the
+            speculative answer was used; 0 otherwise.
+        wasted_tokens: Estimated tokens of speculative requests that weren't used.
+    """
+
+    used: bool
+    speculations: int
+    latency_saved_ms: float
+    wasted_tokens: int
+
+
+def _words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def _similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, _words(a), _words(b)).ratio()
+
+
+def _estimate_tokens(*texts: str) -> int:
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN
+
+
+class _Speculation:
+    """One out-of-band LLM request for a candidate user text."""
+
+    def __init__(self, llm: LLMService, context: LLMContext, user_text: str):
+        self.user_text = user_text
+        self.prompt_chars = sum(len(str(m.get("content", ""))) for m in context.get_messages())
+        self.task = asyncio.create_task(llm.run_inference(context))
+
+    def cost_tokens(self) -> int:
+        result = self.task.result() if self.task.done() and not self.task.cancelled() else None
+        completion = result if isinstance(result, str) else ""
+        return _estimate_tokens(" " * self.prompt_chars, completion)
+
+
+class SpeculativeLLM:
+    """Starts LLM requests on interim transcripts and reuses them when they match."""
+
+    def __init__(
+        self,
+        llm: LLMService,
+        context: LLMContext,
+        *,
+        enabled: Optional[bool] = None,
+        match_threshold: float = MATCH_THRESHOLD,
+    ):
+        """Initialize speculation for one call.
+
+        Args:
+            llm: The call's LLM service; speculation uses its ``run_inference()``.
+            context: The call's LLM context.
+            enabled: Whether to speculate. Defaults to ``SPECULATIVE_LLM=1``.
+            match_threshold: Word similarity needed to reuse a speculative answer.
+        """
+        self._llm = llm
+        self._context = context
+        self._enabled = enabled if enabled is not None else os.getenv("SPECULATIVE_LLM") == "1"
+        self._match_threshold = match_threshold
+
+        self._transcripts_tap = _TranscriptsTap(self)
+        self._gate = _SpeculationGate(self)
+
+        # The LLM's running time to first byte, from its own metrics.
+        self._llm_ttfb_secs: Optional[float] = None
+        llm.add_event_handler("on_after_push_frame", self._on_llm_frame)
+
+        # The current turn: final transcript segments, the latest interim, and
+        # the speculation running for it.
+        self._finals: List[str] = []
+        self._interim = ""
+        self._user_speaking = False
+        self._speculation: Optional[_Speculation] = None
+        self._turn_speculations = 0
+        self._turn_wasted_tokens = 0
+
+        # Totals for the call.
+        self._turns = 0
+        self._used = 0
+        self._requests = 0
+        self._tokens = 0
+        self._wasted_tokens = 0
+        self._saved_secs = 0.0
+
+    def transcripts(self) -> FrameProcessor:
+        """Processor to place right after the STT service."""
+        return self._transcripts_tap
+
+    def gate(self) -> FrameProcessor:
+        """Processor to place right before the LLM."""
+        return self._gate
+
+    @property
+    def _candidate(self) -> str:
+        return " ".join(part for part in [*self._finals, self._interim] if part).strip()
+
+    def _on_llm_frame(self, llm: LLMService, frame: Frame):
+        if not isinstance(frame, MetricsFrame):
+            return
+        for metric in frame.data:
+            # The LLM forwards other processors' metrics too; only its own count.
+            if (
+                isinstance(metric, TTFBMetricsData)
+                and metric.value
+                and metric.processor == llm.name
+            ):
+                if self._llm_ttfb_secs is None:
+                    self._llm_ttfb_secs = metric.value
+                else:
+                    self._llm_ttfb_secs += TTFB_SMOOTHING * (metric.value - self._llm_ttfb_secs)
+
+    def _on_user_started_speaking(self):
+        self._user_speaking = True
+
+    def _on_user_stopped_speaking(self):
+        self._user_speaking = False
+        self._maybe_speculate()
+
+    def _on_interim(self, text: str):
+        self._interim = text
+        if not self._user_speaking:
+            self._maybe_speculate()
+
+    def _on_final(self, text: str):
+        self._finals.append(text)
+        self._interim = ""
+        if not self._user_speaking:
+            self._maybe_speculate()
+
+    def _maybe_speculate(self):
+        candidate = self._candidate
+        if not self._enabled or not candidate or self._context.tools is not NOT_GIVEN:
+            return
+        if self._speculation and _words(self._speculation.user_text) == _words(candidate):
+            return
+        self._discard_speculation()
+
+        messages = [*self._context.get_messages(), {"role": "user", "content": candidate}]
+        system_instruction = getattr(self._llm, "_system_instruction", None)
+        if system_instruction and not any(m.get("role") == "system" for m in messages):
+            # The LLM adds its own system instruction in the pipeline, not in run_inference().
+            messages.insert(0, {"role": "system", "content": system_instruction})
+        self._speculation = _Speculation(self._llm, LLMContext(messages), candidate)
+        self._turn_speculations += 1
+        self._requests += 1
+
+    def _discard_speculation(self):
+        speculation = self._speculation
+        self._speculation = None
+        if not speculation:
+            return
+        speculation.task.cancel()
+        # A cancelled request may still have been billed for its prompt.
+        wasted = speculation.cost_tokens()
+        self._turn_wasted_tokens += wasted
+        self._wasted_tokens += wasted
+        self._tokens += wasted
+
+    def _answer(self, frame: LLMContextFrame) -> Tuple[Optional[str], float]:
+        """The speculative answer for the context's user text if it's ready, and the time saved."""
+        final_text = _last_user_text(frame.context)
+        speculation = self._speculation
+        if not speculation or final_text is None:
+            return None, 0.0
+        if _similarity(speculation.user_text, final_text) < self._match_threshold:
+            logger.debug(f"Speculation missed: '{speculation.user_text}' vs '{final_text}'")
+            return None, 0.0
+        if not speculation.task.done():
+            # Waiting would be slower than the LLM streaming: let it run instead.
+            logger.debug(f"Speculation for '{speculation.user_text}' not ready in time")
+            return None, 0.0
+        if speculation.task.cancelled() or speculation.task.exception():
+            logger.warning(f"Speculative LLM request failed: {speculation.task.exception()}")
+            return None, 0.0
+        answer = speculation.task.result()
+        if not answer:
+            return None, 0.0
+
+        # The answer is pushed at once, instead of after the LLM's first byte.
+        saved_secs = self._llm_ttfb_secs or 0.0
+        self._saved_secs += saved_secs
+        self._speculation = None
+        self._used += 1
+        self._tokens += speculation.cost_tokens()
+        return answer, saved_secs
+
+    def _end_turn(self, used: bool, saved_secs: float) -> SpeculationMetricsData:
+        self._discard_speculation()
+        data = SpeculationMetricsData(
+            processor=str(self._gate),
+            used=used,
+            speculations=self._turn_speculations,
+            latency_saved_ms=round(saved_secs * 1000, 1),
+            wasted_tokens=self._turn_wasted_tokens,
+        )
+        self._turns += 1
+        self._finals = []
+        self._interim = ""
+        self._turn_speculations = 0
+        self._turn_wasted_tokens = 0
+        if data.speculations:
+            logger.info(
+                f"Speculation: {'used' if used else 'missed'} ({data.latency_saved_ms}ms saved); "
+                f"{self._used}/{self._turns} turns used, "
+                f"{self._saved_secs / max(self._used, 1) * 1000:.0f}ms saved per used turn, "
+                f"{self._wasted_tokens / max(self._tokens, 1):.0%} of speculative tokens wasted"
+            )
+        return data
+
+
+def _last_user_text(context: LLMContext) -> Optional[str]:
+    messages = context.get_messages()
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    content = messages[-1].get("content")
+    return content if isinstance(content, str) else None
+
+
+class _TranscriptsTap(FrameProcessor):
+    """Follows the user's transcript and speaking state to start speculations."""
+
+    def __init__(self, speculation: SpeculativeLLM, **kwargs):
+        super().__init__(**kwargs)
+        self._speculation = speculation
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, InterimTranscriptionFrame):
+            self._speculation._on_interim(frame.text)
+        elif isinstance(frame, TranscriptionFrame):
+            self._speculation._on_final(frame.text)
+        elif isinstance(frame, VADUserStartedSpeakingFrame):
+            self._speculation._on_user_started_speaking()
+        elif isinstance(frame, VADUserStoppedSpeakingFrame):
+            # VAD's stop, not the turn's: speculation runs while the turn
+            # analyzer decides whether the user is done.
+            self._speculation._on_user_stopped_speaking()
+
+        await self.push_frame(frame, direction)
+
+
+class _SpeculationGate(FrameProcessor):
+    """Answers a turn with its speculation, or lets the context through to the LLM."""
+
+    def __init__(self, speculation: SpeculativeLLM, **kwargs):
+        super().__init__(**kwargs)
+        self._speculation = speculation
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMContextFrame) and direction == FrameDirection.DOWNSTREAM:
+            answer, saved_secs = None, 0.0
+            try:
+                answer, saved_secs = self._speculation._answer(frame)
+            finally:
+                # Always close the turn, so its transcript and speculation
+                # don't leak into the next one.
+                data = self._speculation._end_turn(answer is not None, saved_secs)
+            if answer is not None:
+                await self.push_frame(LLMFullResponseStartFrame())
+                await self.push_frame(LLMTextFrame(answer))
+                await self.push_frame(LLMFullResponseEndFrame())
+                await self.push_frame(MetricsFrame(data=[data]))
+                return
+            if data.speculations:
+                await self.push_frame(MetricsFrame(data=[data]))
+
+        await self.push_frame(frame, direction)
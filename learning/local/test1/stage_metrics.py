@@ -0,0 +1,198 @@
+"""Per-stage queue depth, frame rate and processing time for every processor.
+
+Pipecat's built-in metrics cover TTFB and usage for the services, but not
+where frames pile up between them. ``StageMetrics`` hooks every processor in
+a pipeline through its ``on_before_process_frame`` / ``on_after_process_frame``
+events (no subclassing or patching) and keeps, per stage:
+
+- queue depth: frames waiting in the processor's input and process queues,
+  now and the most seen in the window;
+- frames per second, by frame type;
+- a histogram of how long ``process_frame`` took, plus mean and max.
+
+Every ``report_secs`` the window is pushed down the pipeline as one
+``MetricsFrame`` of ``StageMetricsData`` (one per stage, so observers and
+``MetricsLogObserver`` see it next to TTFB and usage) and logged as a one-line
+summary of the busiest stages::
+
+    async def run_bot(transport, runner_args):
+        pipeline = Pipeline([...])
+        task = PipelineTask(pipeline, ...)
+        StageMetrics(pipeline).attach(task)
+"""
+
+import asyncio
+import bisect
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from loguru import logger
+from pipecat.frames.frames import Frame, MetricsFrame
+from pipecat.metrics.metrics import MetricsData
+from pipecat.pipeline.pipeline import Pipeline, PipelineSink, PipelineSource
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameProcessor
+
+REPORT_SECS = 10.0
+
+# Upper bounds of the processing-time histogram buckets, in milliseconds.
+PROCESSING_BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+_BUCKET_LABELS = [f"<={ms}ms" for ms in PROCESSING_BUCKETS_MS] + [f">{PROCESSING_BUCKETS_MS[-1]}ms"]
+
+
+class StageMetricsData(MetricsData):
+    """One stage's numbers for one reporting window.
+
+    Parameters:
+        queue_depth: Frames waiting in the stage's queues at report time.
+        max_queue_depth: Most frames seen waiting during the window.
+        frames_per_sec: Frames processed per second, by frame type.
+        processing_histogram: Frames per ``process_frame`` duration bucket.
+        processing_avg_ms: Mean ``process_frame`` duration.
+        processing_max_ms: Longest ``process_frame`` duration.
+    """
+
+    queue_depth: int
+    max_queue_depth: int
+    frames_per_sec: Dict[str, float]
+    processing_histogram: Dict[str, int]
+    processing_avg_ms: float
+    processing_max_ms: float
+
+
+def _queue_depth(processor: FrameProcessor) -> int:
+    # Both queues are private to FrameProcessor and don't exist in direct mode.
+    depth = 0
+    for attr in ("_FrameProcessor__input_queue", "_FrameProcessor__process_queue"):
+        queue = getattr(processor, attr, None)
+        if queue is not None:
+            depth += queue.qsize()
+    return depth
+
+
+def _stages(processors: List[FrameProcessor]) -> List[FrameProcessor]:
+    """Leaf processors, with nested pipelines flattened and their edges skipped."""
+    stages = []
+    for processor in processors:
+        if isinstance(processor, (PipelineSource, PipelineSink)):
+            continue
+        if processor.processors:
+            stages.extend(_stages(processor.processors))
+        else:
+            stages.append(processor)
+    return stages
+
+
+class _Stage:
+    """The running window for one processor."""
+
+    def __init__(self, processor: FrameProcessor):
+        self.processor = processor
+        self._started: Dict[int, float] = {}
+        self._window_started = time.perf_counter()
+        self._reset()
+
+    def _reset(self):
+        self.frames: Counter = Counter()
+        self.histogram = [0] * (len(PROCESSING_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+        self.max_queue_depth = 0
+
+    def before(self, processor: FrameProcessor, frame: Frame):
+        self._started[frame.id] = time.perf_counter()
+        self.max_queue_depth = max(self.max_queue_depth, _queue_depth(processor))
+
+    def after(self, processor: FrameProcessor, frame: Frame):
+        started = self._started.pop(frame.id, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.frames[type(frame).__name__] += 1
+        self.histogram[bisect.bisect_left(PROCESSING_BUCKETS_MS, elapsed * 1000)] += 1
+        self.count += 1
+        self.total_secs += elapsed
+        self.max_secs = max(self.max_secs, elapsed)
+
+    def collect(self, window_secs: float) -> StageMetricsData:
+        """Close the window and return its numbers."""
+        queue_depth = _queue_depth(self.processor)
+        data = StageMetricsData(
+            processor=self.processor.name,
+            queue_depth=queue_depth,
+            max_queue_depth=max(self.max_queue_depth, queue_depth),
+            frames_per_sec={
+                name: round(count / window_secs, 2) for name, count in self.frames.most_common()
+            },
+            processing_histogram={
+                label: count for label, count in zip(_BUCKET_LABELS, self.histogram) if count
+            },
+            processing_avg_ms=round(self.total_secs / self.count * 1000, 3) if self.count else 0.0,
+            processing_max_ms=round(self.max_secs * 1000, 3),
+        )
+        # Frames whose process_frame raised, or that were dropped or cancelled,
+        # never see "after": forget the ones started before this window.
+        cutoff = self._window_started
+        self._started = {
+            frame_id: started for frame_id, started in self._started.items() if started >= cutoff
+        }
+        self._window_started = time.perf_counter()
+        self._reset()
+        return data
+
+
+class StageMetrics:
+    """Collects queue depth and processing time for every stage of a pipeline."""
+
+    def __init__(self, pipeline: Pipeline, *, report_secs: float = REPORT_SECS):
+        """Hook every processor in ``pipeline``.
+
+        Args:
+            pipeline: The pipeline to measure. Nested pipelines are included.
+            report_secs: How often the window is reported and reset.
+        """
+        self._report_secs = report_secs
+        self._stages = [_Stage(processor) for processor in _stages(pipeline.processors)]
+        for stage in self._stages:
+            stage.processor.add_event_handler("on_before_process_frame", stage.before)
+            stage.processor.add_event_handler("on_after_process_frame", stage.after)
+        self._window_start = time.monotonic()
+        self._report_task: Optional[asyncio.Task] = None
+
+    def attach(self, task: PipelineTask):
+        """Report into ``task`` while its pipeline runs."""
+
+        @task.event_handler("on_pipeline_started")
+        async def on_pipeline_started(task, frame):
+            self._window_start = time.monotonic()
+            self._report_task = asyncio.create_task(self._report(task))
+
+        @task.event_handler("on_pipeline_finished")
+        async def on_pipeline_finished(task, frame):
+            if self._report_task:
+                self._report_task.cancel()
+                self._report_task = None
+
+    def collect(self) -> List[StageMetricsData]:
+        """Close the current window and return every stage's numbers."""
+        now = time.monotonic()
+        window_secs = max(now - self._window_start, 1e-6)
+        self._window_start = now
+        return [stage.collect(window_secs) for stage in self._stages]
+
+    async def _report(self, task: PipelineTask):
+        while True:
+            await asyncio.sleep(self._report_secs)
+            data = self.collect()
+            busiest = sorted(data, key=lambda d: d.processing_avg_ms, reverse=True)[:3]
+            logger.info(
+                "Stage metrics: "
+                + ", ".join(
+                    f"{d.processor} q={d.queue_depth}/{d.max_queue_depth} "
+                    f"avg={d.processing_avg_ms}ms max={d.processing_max_ms}ms"
+                    for d in busiest
+                )
+            )
+            await task.queue_frame(MetricsFrame(data=data))
@@ -0,0 +1,352 @@
+"""Predictive warm-agent pool sizing for Pipecat Cloud deployments.
+
+``pcc-deploy.toml`` keeps a fixed ``min_agents`` warm. When traffic spikes past
+that, calls land on cold agents and wait ``startup_secs`` (model imports and
+loads) before hearing anything.
+
+``WarmPoolController`` sizes the warm pool from recent demand instead:
+
+1. Arrivals are counted per ``bucket_secs`` and smoothed with Holt's linear
+   method (level + trend). A rising trend is extrapolated, so the pool grows
+   ahead of a ramp; a falling one isn't, so it shrinks only as the level does.
+2. A new agent takes ``startup_secs`` to become warm, so the pool must cover
+   the calls expected over that lead time. The controller provisions for a
+   Poisson quantile of that forecast on top of the calls already running.
+3. The quantile comes from the TTFA target: if a cold start alone would miss
+   ``target_ttfa_secs``, ``target_percentile`` of calls need a warm agent.
+
+The agent profile (startup time, concurrency, warm TTFA) comes from the
+``AGENT_STATS_FILE`` snapshots written by ``agent_stats.py``.
+
+The controller is tested by replaying an arrival trace through ``simulate()``.
+Run it on a trace (CSV of ``arrival_secs,duration_secs``) or on a synthetic
+spike, comparing against the static ``min_agents`` setting::
+
+    uv run warm_pool.py [trace.csv] [--stats agent_stats.json]
+"""
+
+import argparse
+import csv
+import json
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (arrival time, call duration) in seconds.
+Call = Tuple[float, float]
+
+
+@dataclass
+class AgentProfile:
+    """What one agent costs to start and how much it can carry.
+
+    Parameters:
+        startup_secs: Time for a cold agent to become ready.
+        concurrency: Calls one agent handles at once.
+        warm_ttfa_secs: Time to first audio on an already warm agent.
+    """
+
+    startup_secs: float = 20.0
+    concurrency: int = 1
+    warm_ttfa_secs: float = 1.5
+
+    @classmethod
+    def from_stats(cls, stats: Dict) -> "AgentProfile":
+        """Build a profile from an ``agent_stats.py`` snapshot."""
+        profile = cls()
+        if stats.get("startup_secs"):
+            profile.startup_secs = stats["startup_secs"]
+        if stats.get("peak_calls"):
+            profile.concurrency = max(1, int(stats["peak_calls"]))
+        if stats.get("ttfa_p50_secs"):
+            profile.warm_ttfa_secs = stats["ttfa_p50_secs"]
+        return profile
+
+
+def poisson_quantile(mean: float, fraction: float) -> int:
+    """Smallest ``k`` with ``P(X <= k) >= fraction`` for ``X ~ Poisson(mean)``."""
+    if mean <= 0:
+        return 0
+    k = 0
+    term = math.exp(-mean)
+    cumulative = term
+    while cumulative < fraction:
+        k += 1
+        term *= mean / k
+        cumulative += term
+    return k
+
+
+@dataclass
+class WarmPoolController:
+    """Forecasts call arrivals and sizes the warm agent pool to meet a TTFA target.
+
+    Parameters:
+        profile: Startup time, concurrency and warm TTFA of an agent.
+        target_ttfa_secs: Time to first audio calls should get.
+        target_percentile: Share of calls that should meet the target.
+        bucket_secs: Arrival counting interval for the forecast.
+        level_alpha: Holt smoothing factor for the arrival rate.
+        trend_beta: Holt smoothing factor for the rate's trend.
+        min_agents: Floor on the warm pool.
+        max_agents: Ceiling on the warm pool.
+    """
+
+    profile: AgentProfile = field(default_factory=AgentProfile)
+    target_ttfa_secs: float = 3.0
+    target_percentile: float = 0.95
+    bucket_secs: float = 30.0
+    level_alpha: float = 0.3
+    trend_beta: float = 0.2
+    min_agents: int = 1
+    max_agents: int = 50
+
+    def __post_init__(self):
+        self._bucket_start = 0.0
+        self._bucket_count = 0
+        self._rate: Optional[float] = None  # calls per second
+        self._trend = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Smoothed arrival rate, calls per second."""
+        return self._rate or 0.0
+
+    def record_arrival(self, now: float):
+        """Count a call that arrived at ``now``."""
+        self._advance(now)
+        self._bucket_count += 1
+
+    def forecast_rate(self, horizon_secs: float) -> float:
+        """Arrival rate expected ``horizon_secs`` from now.
+
+        Only a rising trend is extrapolated: scaling down too early costs cold
+        starts, scaling down late only costs idle agents.
+        """
+        trend_per_sec = max(0.0, self._trend) / self.bucket_secs
+        return self.rate + trend_per_sec * horizon_secs
+
+    def desired_agents(self, now: float, active_calls: int) -> int:
+        """Warm agents to keep, given the calls running now.
+
+        Args:
+            now: Current time, on the same clock as ``record_arrival()``.
+            active_calls: Calls currently running across the pool.
+        """
+        self._advance(now)
+
+        # Only calls that arrive before a newly started agent is ready can be hurt.
+        lead_secs = self.profile.startup_secs + self.bucket_secs
+        expected = self.forecast_rate(lead_secs) * lead_secs
+
+        cold_ttfa = self.profile.startup_secs + self.profile.warm_ttfa_secs
+        percentile = self.target_percentile if cold_ttfa > self.target_ttfa_secs else 0.0
+        spare_calls = poisson_quantile(expected, percentile)
+
+        agents = math.ceil((active_calls + spare_calls) / self.profile.concurrency)
+        return max(self.min_agents, min(self.max_agents, agents))
+
+    def _advance(self, now: float):
+        """Close out every full bucket before ``now`` and update the forecast."""
+        if self._rate is None and self._bucket_count == 0 and not self._bucket_start:
+            self._bucket_start = now
+        while now - self._bucket_start >= self.bucket_secs:
+            observed = self._bucket_count / self.bucket_secs
+            if self._rate is None:
+                self._rate = observed
+            else:
+                previous = self._rate
+                self._rate = max(
+                    0.0,
+                    self.level_alpha * observed + (1 - self.level_alpha) * (previous + self._trend),
+                )
+                self._trend = (
+                    self.trend_beta * (self._rate - previous) + (1 - self.trend_beta) * self._trend
+                )
+            self._bucket_count = 0
+            self._bucket_start += self.bucket_secs
+
+
+@dataclass
+class SimulationResult:
+    """Outcome of replaying a trace against a pool policy.
+
+    Parameters:
+        calls: Calls in the trace.
+        cold_starts: Calls that had to wait for an agent to start.
+        ttfa_p50_secs: Median time to first audio.
+        ttfa_p95_secs: 95th percentile time to first audio.
+        met_target: Share of calls within the TTFA target.
+        mean_agents: Average agents running (warm or starting), i.e. cost.
+    """
+
+    calls: int
+    cold_starts: int
+    ttfa_p50_secs: float
+    ttfa_p95_secs: float
+    met_target: float
+    mean_agents: float
+
+    def __str__(self):
+        return (
+            f"calls={self.calls} cold_starts={self.cold_starts} "
+            f"ttfa_p50={self.ttfa_p50_secs:.1f}s ttfa_p95={self.ttfa_p95_secs:.1f}s "
+            f"met_target={self.met_target:.1%} mean_agents={self.mean_agents:.1f}"
+        )
+
+
+@dataclass
+class _Agent:
+    ready_at: float
+    call_ends: List[float] = field(default_factory=list)
+
+    def active(self, now: float) -> int:
+        self.call_ends = [end for end in self.call_ends if end > now]
+        return len(self.call_ends)
+
+
+def simulate(
+    trace: Sequence[Call],
+    profile: AgentProfile,
+    *,
+    controller: Optional[WarmPoolController] = None,
+    static_agents: int = 1,
+    target_ttfa_secs: float = 3.0,
+    tick_secs: float = 1.0,
+) -> SimulationResult:
+    """Replay ``trace`` against a warm pool and measure time to first audio.
+
+    With a ``controller`` the pool is resized every ``tick_secs``; without one
+    it stays at ``static_agents`` (what ``min_agents`` does today). Either way,
+    a call that finds no free warm agent starts one on demand and waits for it.
+    """
+    trace = sorted(trace)
+    agents = [_Agent(ready_at=0.0) for _ in range(static_agents)]
+    ttfas: List[float] = []
+    cold_starts = 0
+    agent_secs = 0.0
+
+    end_time = max((arrival + duration for arrival, duration in trace), default=0.0)
+    now = 0.0
+    next_call = 0
+    while now <= end_time:
+        # Calls arriving during this tick.
+        while next_call < len(trace) and trace[next_call][0] < now + tick_secs:
+            arrival, duration = trace[next_call]
+            next_call += 1
+            if controller:
+                controller.record_arrival(arrival)
+
+            agent = min(
+                (a for a in agents if a.active(arrival) < profile.concurrency),
+                key=lambda a: a.ready_at,
+                default=None,
+            )
+            if agent is None:
+                agent = _Agent(ready_at=arrival + profile.startup_secs)
+                agents.append(agent)
+            wait = max(0.0, agent.ready_at - arrival)
+            if wait > 0:
+                cold_starts += 1
+            ttfa = wait + profile.warm_ttfa_secs
+            ttfas.append(ttfa)
+            agent.call_ends.append(arrival + wait + duration)
+
+        now += tick_secs
+        active = sum(a.active(now) for a in agents)
+        target = controller.desired_agents(now, active) if controller else static_agents
+
+        if len(agents) < target:
+            agents.extend(
+                _Agent(ready_at=now + profile.startup_secs) for _ in range(target - len(agents))
+            )
+        elif len(agents) > target:
+            # Retire idle agents, newest first; busy ones finish their calls.
+            idle = [a for a in agents if a.active(now) == 0]
+            idle.sort(key=lambda a: a.ready_at, reverse=True)
+            for agent in idle[: len(agents) - target]:
+                agents.remove(agent)
+
+        agent_secs += len(agents) * tick_secs
+
+    ordered = sorted(ttfas) or [0.0]
+    return SimulationResult(
+        calls=len(trace),
+        cold_starts=cold_starts,
+        ttfa_p50_secs=ordered[len(ordered) // 2],
+        ttfa_p95_secs=ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        met_target=sum(t <= target_ttfa_secs for t in ttfas) / max(1, len(ttfas)),
+        mean_agents=agent_secs / max(now, tick_secs),
+    )
+
+
+def synthetic_trace(
+    *,
+    duration_secs: float = 3600,
+    base_rate_per_min: float = 2.0,
+    spike_at_secs: float = 1800,
+    spike_rate_per_min: float = 12.0,
+    spike_secs: float = 600,
+    mean_call_secs: float = 180,
+    seed: int = 7,
+) -> List[Call]:
+    """Poisson arrivals with a ramped spike and exponential call durations."""
+    rng = random.Random(seed)
+    trace: List[Call] = []
+    now = 0.0
+    while now < duration_secs:
+        rate = base_rate_per_min
+        if spike_at_secs <= now < spike_at_secs + spike_secs:
+            ramp = min(1.0, (now - spike_at_secs) / 120)  # two-minute ramp up
+            rate += ramp * (spike_rate_per_min - base_rate_per_min)
+        now += rng.expovariate(rate / 60)
+        trace.append((now, rng.expovariate(1 / mean_call_secs)))
+    return trace
+
+
+def load_trace(path: str) -> List[Call]:
+    """Read a trace CSV with ``arrival_secs`` and ``duration_secs`` columns."""
+    with open(path) as f:
+        return [
+            (float(row["arrival_secs"]), float(row["duration_secs"])) for row in csv.DictReader(f)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a call trace against warm pool policies")
+    parser.add_argument("trace", nargs="?", help="CSV with arrival_secs,duration_secs columns")
+    parser.add_argument(
+        "--stats", help="agent_stats.py snapshot (AGENT_STATS_FILE) for the profile"
+    )
+    parser.add_argument("--min-agents", type=int, default=1, help="Static pool to compare against")
+    parser.add_argument("--target-ttfa", type=float, default=3.0, help="TTFA target in seconds")
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace()
+    profile = AgentProfile()
+    if args.stats:
+        with open(args.stats) as f:
+            profile = AgentProfile.from_stats(json.load(f))
+
+    static = simulate(
+        trace, profile, static_agents=args.min_agents, target_ttfa_secs=args.target_ttfa
+    )
+    controller = WarmPoolController(
+        profile=profile, target_ttfa_secs=args.target_ttfa, min_agents=args.min_agents
+    )
+    predictive = simulate(
+        trace,
+        profile,
+        controller=controller,
+        static_agents=args.min_agents,
+        target_ttfa_secs=args.target_ttfa,
+    )
+
+    print(f"Profile:     {profile}")
+    print(f"Static pool: {static}")
+    print(f"Predictive:  {predictive}")
+
+
+if __name__ == "__main__":
+    main()